@@ -0,0 +1,84 @@
+import argparse
+import random
+import time
+from unittest.mock import patch
+
+from setlexsem.generate.sample import DeceptiveWordSampler
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time the draws of DeceptiveWordSampler against drawing by "
+            "removing the sampled set from a copy of the options (the "
+            "previous implementation), and check that the draws match."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--n-draws", type=int, default=10_000, help="Number of draws"
+    )
+    parser.add_argument("--m-A", type=int, default=8)
+    parser.add_argument("--m-B", type=int, default=8)
+    parser.add_argument(
+        "--n-groups",
+        type=int,
+        default=None,
+        help="Use this many synthetic hyponym groups instead of "
+        "data/hyponyms.json",
+    )
+    parser.add_argument("--seed-value", type=int, default=292)
+    return parser
+
+
+def make_synthetic_groups(n_groups, seed_value):
+    rng = random.Random(seed_value)
+    return [
+        [f"word{i}-{j}" for j in range(rng.randint(8, 40))]
+        for i in range(n_groups)
+    ]
+
+
+def sample_by_removal(sampler):
+    possible_options = list(sampler.possible_options)
+    A = sampler.choose_hyponyms(possible_options, sampler.m_A)
+    B = sampler.choose_hyponyms(possible_options, sampler.m_B)
+    return A, B
+
+
+def time_draws(draw, n_draws):
+    start = time.perf_counter()
+    draws = [draw() for _ in range(n_draws)]
+    return time.perf_counter() - start, draws
+
+
+def make_sampler(args):
+    return DeceptiveWordSampler(
+        m_A=args.m_A,
+        m_B=args.m_B,
+        random_state=random.Random(args.seed_value),
+    )
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    if args.n_groups is None:
+        indexed, reference = make_sampler(args), make_sampler(args)
+    else:
+        groups = make_synthetic_groups(args.n_groups, args.seed_value)
+        with patch(
+            "setlexsem.generate.sample.get_hyponym_sets", return_value=groups
+        ):
+            indexed, reference = make_sampler(args), make_sampler(args)
+
+    print(f"{len(indexed.possible_options)} hyponym sets to sample from")
+    time_indexed, draws_indexed = time_draws(indexed, args.n_draws)
+    time_removal, draws_removal = time_draws(
+        lambda: sample_by_removal(reference), args.n_draws
+    )
+    print(f"indexed: {time_indexed:.3f} s for {args.n_draws} draws")
+    print(f"removal: {time_removal:.3f} s for {args.n_draws} draws")
+    print(f"speedup: {time_removal / time_indexed:.1f}x")
+    print(f"same draws: {draws_indexed == draws_removal}")
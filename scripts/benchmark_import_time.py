@@ -0,0 +1,61 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "setlexsem.generate.sample",
+    "setlexsem.generate.prompt",
+    "setlexsem.generate.generate_sets",
+    "setlexsem.generate.generate_prompts",
+]
+
+# import the module in a fresh interpreter and report whether NLTK was loaded
+IMPORT_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, "nltk" in sys.modules)
+"""
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure the cold-start import time of the setlexsem generators "
+            "(each import runs in a new Python process)."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of imports per module"
+    )
+    parser.add_argument(
+        "--modules", nargs="+", default=MODULES, help="Modules to import"
+    )
+    return parser
+
+
+def time_import(module):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_CODE.format(module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(output[0]), output[1] == "True"
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    print(f"{'module':<40} {'median (s)':>10} {'min (s)':>8}  nltk loaded")
+    for module in args.modules:
+        timings, nltk_loaded = zip(
+            *(time_import(module) for _ in range(args.repeat))
+        )
+        print(
+            f"{module:<40} {statistics.median(timings):>10.3f} "
+            f"{min(timings):>8.3f}  {any(nltk_loaded)}"
+        )
@@ -0,0 +1,134 @@
+import argparse
+import random
+import time
+
+from setlexsem.generate.prompt import (
+    OPS,
+    PROMPT_TEMPLATES,
+    PROMPT_TEMPLATES_ENDING,
+    PromptConfig,
+    get_prompt,
+    get_prompts,
+    make_k_shot,
+)
+from setlexsem.generate.sample import BasicNumberSampler
+from setlexsem.utils import DEMONSTRATION_TYPES
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time the rendering of prompts with the compiled templates "
+            "(one by one and in a batch) against building them by "
+            "concatenation (the previous implementation), and check that "
+            "the prompts are the same."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--n-prompts", type=int, default=10_000, help="Number of prompts"
+    )
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--m-A", type=int, default=8)
+    parser.add_argument("--m-B", type=int, default=8)
+    parser.add_argument("--k-shot", type=int, default=4)
+    parser.add_argument("--seed-value", type=int, default=292)
+    return parser
+
+
+def get_prompt_by_concatenation(A, B, prompt_config, add_roles=False):
+    """`get_prompt` before the compiled templates"""
+    assert (
+        prompt_config.approach in PROMPT_TEMPLATES.keys()
+    ), f"the prompt approach of ({prompt_config.approach}) is not defined."
+    A_str = ", ".join([str(a) for a in A])
+    B_str = ", ".join([str(b) for b in B])
+    if add_roles:
+        prompt = "\n\nHuman: "
+    else:
+        prompt = ""
+    prompt += (
+        f"You are given two sets. Set A is ({A_str}). Set B is ({B_str})."
+    )
+    prompt += " You are given the following task:\n"
+    prompt += f"<task> {prompt_config.get_instruction()} </task>"
+    prompt += make_k_shot(prompt_config)
+    prompt += PROMPT_TEMPLATES[prompt_config.approach]
+    if add_roles:
+        prompt += f"\n\nAssistant: {PROMPT_TEMPLATES_ENDING[prompt_config.approach]}"
+    else:
+        prompt += f"\n\n{PROMPT_TEMPLATES_ENDING[prompt_config.approach]}"
+    return prompt
+
+
+def make_prompt_config(args, prompt_type, approach, operation):
+    k_shot_sampler = BasicNumberSampler(
+        n=args.n,
+        m_A=args.m_A,
+        m_B=args.m_B,
+        random_state=random.Random(args.seed_value),
+    )
+    return PromptConfig(
+        k_shot=args.k_shot,
+        type=prompt_type,
+        approach=approach,
+        sampler=k_shot_sampler,
+        operation=operation,
+    )
+
+
+def time_prompts(make_prompts):
+    start = time.perf_counter()
+    prompts = make_prompts()
+    return time.perf_counter() - start, prompts
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    sampler = BasicNumberSampler(
+        n=args.n,
+        m_A=args.m_A,
+        m_B=args.m_B,
+        random_state=random.Random(args.seed_value),
+    )
+    pairs = [sampler() for _ in range(args.n_prompts)]
+
+    # same prompts for all the types, approaches, operations and roles
+    same_prompts = all(
+        get_prompt(A, B, prompt_config, add_roles)
+        == get_prompt_by_concatenation(A, B, prompt_config, add_roles)
+        for prompt_type in DEMONSTRATION_TYPES
+        for approach in PROMPT_TEMPLATES
+        for operation in sorted(OPS)
+        for prompt_config in [
+            make_prompt_config(args, prompt_type, approach, operation)
+        ]
+        for add_roles in [False, True]
+        for A, B in pairs[:10]
+    )
+
+    prompt_config = make_prompt_config(
+        args, "formal_language", "baseline", "symmetric difference"
+    )
+    time_concat, prompts_concat = time_prompts(
+        lambda: [
+            get_prompt_by_concatenation(A, B, prompt_config) for A, B in pairs
+        ]
+    )
+    time_template, prompts_template = time_prompts(
+        lambda: [get_prompt(A, B, prompt_config) for A, B in pairs]
+    )
+    time_batch, prompts_batch = time_prompts(
+        lambda: get_prompts(pairs, prompt_config)
+    )
+    print(f"concatenation: {time_concat:.3f} s for {args.n_prompts} prompts")
+    print(f"template: {time_template:.3f} s for {args.n_prompts} prompts")
+    print(f"batch: {time_batch:.3f} s for {args.n_prompts} prompts")
+    print(f"speedup (template): {time_concat / time_template:.1f}x")
+    print(f"speedup (batch): {time_concat / time_batch:.1f}x")
+    print(
+        "same prompts: "
+        f"{same_prompts and prompts_concat == prompts_template == prompts_batch}"
+    )
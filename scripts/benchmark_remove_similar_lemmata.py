@@ -0,0 +1,89 @@
+import argparse
+import random
+import time
+
+from setlexsem.generate.sample import (
+    make_edit_distance_queue,
+    remove_similar_lemmata,
+    remove_substring_lemmata,
+)
+from setlexsem.generate.vocabulary import get_wordnet
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time remove_similar_lemmata on the lemma names of the WordNet "
+            "synsets, against recomputing the edit-distance queue after "
+            "each removal (the previous implementation), and check that "
+            "the results match."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--min-lemmata",
+        type=int,
+        default=2,
+        help="Only use synsets with at least this many lemma names",
+    )
+    parser.add_argument(
+        "--max-synsets",
+        type=int,
+        default=None,
+        help="Number of synsets to use (all by default)",
+    )
+    parser.add_argument("--seed-value", type=int, default=292)
+    return parser
+
+
+def remove_similar_lemmata_by_queue(
+    lemma_names, random_state, min_distance=3, max_iteration=4
+):
+    lemma_names = remove_substring_lemmata(list(lemma_names))
+    queue = make_edit_distance_queue(lemma_names)
+    iteration = 0
+    while len(queue) and (queue[0][0] < min_distance):
+        if iteration > max_iteration:
+            raise StopIteration()
+        lemmata_pair = random_state.choice(queue[0][1])
+        lemma_names.remove(random_state.choice(lemmata_pair))
+        queue = make_edit_distance_queue(lemma_names)
+        iteration += 1
+    return lemma_names
+
+
+def run(remove, lemma_sets, seed_value):
+    random_state = random.Random(seed_value)
+    results = []
+    start = time.perf_counter()
+    for lemma_names in lemma_sets:
+        try:
+            results.append(remove(lemma_names, random_state))
+        except StopIteration:
+            results.append(None)
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    lemma_sets = []
+    for synset in get_wordnet().all_synsets():
+        lemma_names = synset.lemma_names()
+        if len(lemma_names) >= args.min_lemmata:
+            lemma_sets.append(lemma_names)
+        if len(lemma_sets) == args.max_synsets:
+            break
+    print(f"{len(lemma_sets)} lemma sets")
+
+    time_new, results_new = run(
+        remove_similar_lemmata, lemma_sets, args.seed_value
+    )
+    time_queue, results_queue = run(
+        remove_similar_lemmata_by_queue, lemma_sets, args.seed_value
+    )
+    print(f"incremental: {time_new:.3f} s")
+    print(f"queue:       {time_queue:.3f} s")
+    print(f"speedup:     {time_queue / time_new:.1f}x")
+    print(f"same results: {results_new == results_queue}")
@@ -1,9 +1,9 @@
 #!/bin/bash
 
-scripts/download-google-ngrams.sh
+python scripts/make_frequency_table.py --output-path frequencies.tsv
 mkdir -p data
 python scripts/make_percentiles.py \
     --k 10 \
-    --google-ngrams-path frequencies.txt \
+    --google-ngrams-path frequencies.tsv \
     --output-path data/deciles.json
-rm -i frequencies.txt
+rm -i frequencies.tsv
@@ -0,0 +1,59 @@
+import os
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+
+from setlexsem.generate.vocabulary import load_english_words_from_nltk
+from setlexsem.prepare.download import (
+    GOOGLE_NGRAMS_URL,
+    make_term_frequencies_file,
+)
+
+
+def get_parser():
+    parser = ArgumentParser(
+        description=(
+            "Download the English unigrams of the Google Books Ngram corpus "
+            "and write the frequency of each NLTK English word as a table "
+            "(one `word<TAB>count` line per word)."
+        ),
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--source",
+        type=str,
+        default=GOOGLE_NGRAMS_URL,
+        help="Base URL of the corpus, or a folder with the same files",
+    )
+    parser.add_argument(
+        "--output-path",
+        type=str,
+        default="frequencies.tsv",
+        help="Path to which to write the frequency table.",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of files processed at once",
+    )
+    parser.add_argument("--start-year", type=int, default=2008)
+    parser.add_argument("--end-year", type=int, default=2008)
+    parser.add_argument(
+        "--all-terms",
+        action="store_true",
+        help="Count all the terms, not only the NLTK English words",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    make_term_frequencies_file(
+        output_path=args.output_path,
+        source=args.source,
+        words=None if args.all_terms else set(load_english_words_from_nltk()),
+        n_jobs=args.n_jobs,
+        start_year=args.start_year,
+        end_year=args.end_year,
+    )
@@ -1,5 +1,6 @@
 import random
 import argparse
+import os
 
 from setlexsem.generate.sample import get_clean_hyponyms
 
@@ -21,6 +22,13 @@ def get_parser():
         default="data/hyponyms.json",
         help="Path to which to write the hyponyms."
     )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes that clean the hyponym sets (the output "
+        "does not depend on it)."
+    )
     return parser
 
 
@@ -29,5 +37,8 @@ if __name__ == "__main__":
     args = parser.parse_args()
     random_state = random.Random(args.seed)
     get_clean_hyponyms(
-        random_state, save_json=1, filename=args.output_path
+        random_state,
+        save_json=1,
+        filename=args.output_path,
+        n_jobs=args.n_jobs,
     )
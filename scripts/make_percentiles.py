@@ -1,11 +1,10 @@
 import json
 from argparse import ArgumentParser
 
-from nltk.corpus import words
-
+from setlexsem.generate.vocabulary import load_english_words_from_nltk
 from setlexsem.prepare.percentiles import (
-    get_counts_dict_from_google_books,
-    make_percentiles,
+    get_counts_from_google_books,
+    make_percentile_partitions,
 )
 
 
@@ -22,22 +21,28 @@ def get_parser():
         "-k",
         "--k",
         type=int,
+        nargs="+",
         required=True,
         help=(
-            "The k-th percentile to use (1 is percentile, 10 is decile, etc.)"
+            "The k-th percentile to use (1 is percentile, 10 is decile, "
+            "etc.). Several values make one file each, from a single read "
+            "of the frequencies."
         ),
     )
     parser.add_argument(
         "--google-ngrams-path",
         type=str,
         required=True,
-        help="Path to Google Books Ngram file (e.g. frequencies.txt)",
+        help="Path to the frequency table (e.g. frequencies.tsv)",
     )
     parser.add_argument(
         "--output-path",
         type=str,
         required=True,
-        help="Path to which to write the percentiles dictionary.",
+        help=(
+            "Path to which to write the percentiles dictionary. With several "
+            "k, it must contain '{k}' (e.g. data/percentiles-{k}.json)."
+        ),
     )
     return parser
 
@@ -46,15 +51,18 @@ if __name__ == "__main__":
     parser = get_parser()
     args = parser.parse_args()
 
-    if not 1 <= args.k <= 50:
+    if not all(1 <= k <= 50 for k in args.k):
         raise ValueError("-k argument should be >= 1 and <= 50")
+    if len(args.k) > 1 and "{k}" not in args.output_path:
+        raise ValueError("--output-path should contain '{k}' for several k")
 
-    words = set(w.lower() for w in words.words())
-    words_to_counts = get_counts_dict_from_google_books(
+    words = set(load_english_words_from_nltk())
+    words, counts = get_counts_from_google_books(
         words, args.google_ngrams_path
     )
 
-    percentiles = make_percentiles(words_to_counts, args.k)
+    partitions = make_percentile_partitions(words, counts, args.k)
 
-    with open(args.output_path, "wt") as fh:
-        json.dump(percentiles, fh)
+    for k, percentiles in partitions.items():
+        with open(args.output_path.format(k=k), "wt") as fh:
+            json.dump(percentiles, fh)
@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+
+from setlexsem.constants import PATH_DATA_ROOT
+from setlexsem.generate.vocabulary import load_english_words_from_nltk
+from setlexsem.prepare.vocabulary_artifact import (
+    PATH_VOCABULARY_ARTIFACT,
+    compile_vocabulary_artifact,
+)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compile the English words, deciles and hyponyms into the binary "
+            "vocabulary artifact that the word samplers load at runtime."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--deciles-path",
+        default=os.path.join(PATH_DATA_ROOT, "deciles.json"),
+        help="Path to the deciles (skipped if it does not exist)",
+    )
+    parser.add_argument(
+        "--hyponyms-path",
+        default=os.path.join(PATH_DATA_ROOT, "hyponyms.json"),
+        help="Path to the hyponyms (skipped if it does not exist)",
+    )
+    parser.add_argument(
+        "--output-path",
+        default=PATH_VOCABULARY_ARTIFACT,
+        help="Path to which to write the artifact.",
+    )
+    return parser
+
+
+def read_json_if_exists(path):
+    if not os.path.exists(path):
+        print(f"Skipping {path} (not found)")
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+
+    compile_vocabulary_artifact(
+        args.output_path,
+        english_words=load_english_words_from_nltk(),
+        deciles=read_json_if_exists(args.deciles_path),
+        hyponyms=read_json_if_exists(args.hyponyms_path),
+        sources={
+            name: path
+            for name, path in [
+                ("deciles", args.deciles_path),
+                ("hyponyms", args.hyponyms_path),
+            ]
+            if os.path.exists(path)
+        },
+    )
+    print(f"Vocabulary artifact saved at {args.output_path}")
@@ -17,6 +17,7 @@ PATH_ROOT = get_path_root(__file__)
 PATH_DATA_ROOT = os.path.join(PATH_ROOT, "data")
 PATH_PROMPTS_ROOT = os.path.join(PATH_ROOT, "prompts")
 PATH_RESULTS_ROOT = os.path.join(PATH_ROOT, "results")
+PATH_CACHE_ROOT = os.path.join(PATH_ROOT, "cache")
 PATH_CONFIG_ROOT = os.path.join(PATH_ROOT, "configs")
 PATH_ANALYSIS_CONFIG_ROOT = os.path.join(PATH_CONFIG_ROOT, "post_analysis")
 PATH_HYPOTHESIS_CONFIG_ROOT = os.path.join(
@@ -0,0 +1,192 @@
+# coding: utf-8
+
+"""
+Bedrock batch inference for large studies.
+
+Instead of calling `invoke_model` once per prompt, the prompts of a whole
+config grid are exported as batch-inference JSONL files (one file per
+experiment). The layout of a batch directory mirrors the S3 prefixes of a
+batch-inference job:
+
+    <path_batch>/manifest.json       experiments, model and number of records
+    <path_batch>/input/<name>.jsonl  upload as the job's input prefix
+    <path_batch>/output/...          download the job's output prefix here
+
+Once the job is done, the `<name>.jsonl.out` files are imported into the same
+per-config results that `run_experiment` produces.
+"""
+
+import json
+import logging
+import os
+
+from setlexsem.experiment.experiment import make_experiment_log
+from setlexsem.experiment.lmapi import (
+    BEDROCK_MODELS,
+    make_bedrock_body,
+    parse_bedrock_response,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_INPUT_FOLDER = "input"
+BATCH_OUTPUT_FOLDER = "output"
+BATCH_MANIFEST = "manifest.json"
+
+
+def make_record_id(run):
+    """Bedrock expects record IDs made of 11 alphanumeric characters"""
+    return f"{run:011d}"
+
+
+def make_batch_name(path_results, path_results_root):
+    """Name the batch file of an experiment after its results file"""
+    relative_path = os.path.relpath(path_results, path_results_root)
+    return os.path.splitext(relative_path)[0].replace(os.path.sep, "__")
+
+
+def make_batch_records(samples, model_id, temperature, top_k, top_p):
+    """Create the batch-inference records of the (A, B, prompt) samples"""
+    for run, (_, _, prompt) in enumerate(samples):
+        body = make_bedrock_body(
+            model_id=model_id,
+            prompt=prompt,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+        )
+        yield {
+            "recordId": make_record_id(run),
+            "modelInput": json.loads(body),
+        }
+
+
+def read_manifest(path_batch):
+    path_manifest = os.path.join(path_batch, BATCH_MANIFEST)
+    if not os.path.exists(path_manifest):
+        return {"experiments": {}}
+    with open(path_manifest, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(path_batch, manifest):
+    path_manifest = os.path.join(path_batch, BATCH_MANIFEST)
+    with open(path_manifest + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path_manifest + ".tmp", path_manifest)
+
+
+def export_batch_experiment(path_batch, name, samples, lm, metadata=None):
+    """Write the prompts of one experiment as a batch-inference input file
+
+    Returns the number of records written.
+    """
+    model_id = lm.get_model_name()
+    if model_id not in BEDROCK_MODELS:
+        raise ValueError(f"Batch inference is only for Bedrock: {model_id}")
+
+    path_input = os.path.join(path_batch, BATCH_INPUT_FOLDER)
+    os.makedirs(path_input, exist_ok=True)
+    n_records = 0
+    with open(os.path.join(path_input, f"{name}.jsonl"), "w") as f:
+        for record in make_batch_records(
+            samples,
+            model_id=model_id,
+            temperature=lm.temperature,
+            top_k=lm.top_k,
+            top_p=lm.top_p,
+        ):
+            f.write(json.dumps(record) + "\n")
+            n_records += 1
+
+    manifest = read_manifest(path_batch)
+    manifest["model_id"] = model_id
+    manifest["experiments"][name] = {
+        "num_records": n_records,
+        **(metadata or {}),
+    }
+    write_manifest(path_batch, manifest)
+    return n_records
+
+
+def find_batch_output(path_batch, name):
+    """Find `<name>.jsonl.out` anywhere in the output folder (Bedrock nests
+    the outputs in a folder named after the job ID)"""
+    filename = f"{name}.jsonl.out"
+    for root, _, files in os.walk(
+        os.path.join(path_batch, BATCH_OUTPUT_FOLDER)
+    ):
+        if filename in files:
+            return os.path.join(root, filename)
+    return None
+
+
+def read_batch_output(path_output, model_id):
+    """Read the responses of a batch-inference output file by record ID
+
+    Records that failed are logged and left out.
+    """
+    responses = {}
+    with open(path_output, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "modelOutput" not in record:
+                LOGGER.warning(
+                    f"Record {record.get('recordId')} failed: "
+                    f"{record.get('error')}"
+                )
+                continue
+            responses[record["recordId"]] = parse_bedrock_response(
+                model_id, record["modelOutput"]
+            )
+    return responses
+
+
+def import_batch_experiment(path_batch, name, samples, lm, prompt_config):
+    """Score the batch-inference responses of one experiment
+
+    `samples` must be the same (A, B, prompt) samples that were exported.
+    Returns the same (results, experiment_logs) as `run_experiment`.
+    """
+    model_id = lm.get_model_name()
+    manifest = read_manifest(path_batch)
+    if manifest.get("model_id", model_id) != model_id:
+        raise ValueError(
+            f"The batch was exported for {manifest['model_id']}, "
+            f"not {model_id}"
+        )
+
+    path_output = find_batch_output(path_batch, name)
+    if path_output is None:
+        raise FileNotFoundError(f"No batch output for {name} in {path_batch}")
+    responses = read_batch_output(path_output, model_id)
+
+    results = 0
+    experiment_logs = []
+    missing_runs = []
+    for run, (A, B, prompt) in enumerate(samples):
+        result = responses.get(make_record_id(run))
+        if result is None:
+            missing_runs.append(run)
+            continue
+        experiment_log = make_experiment_log(
+            prompt_config,
+            A,
+            B,
+            prompt,
+            result,
+            lm.get_model_owner(),
+            model_id,
+        )
+        results += int(experiment_log["llm_vs_gt"])
+        experiment_logs.append(experiment_log)
+
+    if missing_runs:
+        raise ValueError(
+            f"{len(missing_runs)} runs of {name} have no response "
+            f"(e.g., run #{missing_runs[0]})"
+        )
+
+    return results, experiment_logs
@@ -1,8 +1,11 @@
 # coding: utf-8
 
-import ast
+import json
 import logging
+import os
+from collections import deque
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 
 from tqdm import tqdm
 
@@ -15,29 +18,40 @@ LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(level=logging.WARNING)
 
 
-def run_experiment(
-    lm,
-    sampler,
-    prompt_config,
-    num_runs=100,
-    debug_no_lm=False,
-):
-    results = 0
-    experiment_logs = []
-    lm_model_owner = lm.get_model_owner()
-    lm_model_name = lm.get_model_name()
-    add_roles = False
-    if "anthropic" in lm_model_name:
-        if "claude-3" not in lm_model_name:
-            add_roles = True
+def map_in_order(func, items, max_in_flight=1):
+    """Apply `func` to every item and yield the results in input order.
+
+    At most `max_in_flight` calls run concurrently on a thread pool. Items are
+    pulled from `items` lazily in the calling thread, so any work done by the
+    iterable itself (e.g., sampling sets) stays sequential.
+    """
+    if max_in_flight <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
-    for i in tqdm(range(num_runs)):
+def needs_roles(lm_model_name):
+    """Old Claude models expect the Human/Assistant roles in the prompt"""
+    return "anthropic" in lm_model_name and "claude-3" not in lm_model_name
+
+
+def iter_prompts(sampler, prompt_config, num_runs, add_roles=False):
+    """Sample the sets and build the prompts sequentially"""
+    for i in range(num_runs):
         # create two sets from the sampler
         if isinstance(sampler, Iterable):
             # get next set from generator
             A, B = next(sampler)
-            A = ast.literal_eval(A)
-            B = ast.literal_eval(B)
         else:
             # generate next set
             A, B = sampler()
@@ -49,52 +63,301 @@ def run_experiment(
             prompt_config,
             add_roles=add_roles,
         )
+        yield A, B, prompt
+
+
+def make_experiment_log(
+    prompt_config, A, B, prompt, result, lm_model_owner, lm_model_name
+):
+    """Score the LM response and log the run"""
+    dict_context_length = get_context_length(
+        prompt_in=prompt,
+        prompt_out=result,
+        model_owner=lm_model_owner,
+        model_name=lm_model_name,
+    )
+    ground_truth = get_ground_truth(prompt_config.operation, A, B)
+    # log the conversation
+    LOGGER.info(
+        f"\n{prompt}\n"
+        f"LM Response: {result}\n"
+        f"GT Response: {ground_truth}"
+    )
+    try:
+        # postprocess lm response
+        result_obj = parse_lm_response(result)
+        # compare with groundtruth
+        ok = is_correct(ground_truth, result_obj)
+    except Exception as e:
+        result_obj = {-1}  # did not follow guideline
+        ok = False
+        LOGGER.warning(
+            f"op {prompt_config.operation} failed:\n"
+            f"--> result {result}\n"
+            f"------> exception {e}"
+        )
+
+    # log all experiments
+    experiment_log = {
+        "op_name": prompt_config.operation,
+        "prompt": prompt,
+        "ground_truth": ground_truth,
+        "result_obj": result_obj,
+        "llm_vs_gt": ok,
+        "set_A": A,
+        "set_B": B,
+        "context_length_in": dict_context_length["in"],
+        "context_length_out": dict_context_length["out"],
+        "log_context": prompt + result,
+    }
+    return experiment_log
+
+
+class CheckpointLog:
+    """Append-only JSONL log of the completed runs of an experiment.
+
+    Each line holds the sets, the prompt and the LM response of one run, in
+    run order, so the experiment logs can be rebuilt without calling the LM
+    again. Lines are flushed as they are written and fsync-ed every
+    `fsync_every` runs; a line torn by a crash is dropped on `read`.
+
+    At every fsync, the state of the samplers after the last run (if given to
+    `append`) is saved next to the log, so that sampling can resume there.
+    """
+
+    def __init__(self, path, fsync_every=100):
+        self.path = path
+        self.path_state = f"{path}.state.json"
+        self.fsync_every = fsync_every
+        self.n_records = 0
+        self._file = None
+        self._n_unsynced = 0
+        self._state = None
+
+    def read(self):
+        """Return the records of the completed runs"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Torn line")
+                    records.append(json.loads(line))
+                except ValueError:
+                    LOGGER.warning(
+                        f"Dropping the torn end of {self.path} (run "
+                        f"#{len(records)})"
+                    )
+                    break
+                offset += len(line)
+        # the next runs are appended right after the last complete one
+        if offset != os.path.getsize(self.path):
+            os.truncate(self.path, offset)
+        self.n_records = len(records)
+        return records
+
+    def read_state(self):
+        """Return the last saved sampler state and its number of runs"""
+        return read_sampler_states(self.path_state)
+
+    def append(self, record, state=None):
+        if self._file is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self.n_records += 1
+        self._state = state
+        self._n_unsynced += 1
+        if self._n_unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._n_unsynced:
+            os.fsync(self._file.fileno())
+            self._n_unsynced = 0
+            # the state is saved only once the runs before it are on disk
+            if self._state is not None:
+                save_sampler_states(
+                    self.path_state, self.n_records, self._state
+                )
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Remove the log once the results are saved"""
+        self.close()
+        for path in (self.path, self.path_state):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def make_checkpoint_record(A, B, prompt, result):
+    return {
+        "set_A": list(A),
+        "set_B": list(B),
+        "prompt": prompt,
+        "result": result,
+    }
+
+
+def get_sampler_states(sampler, prompt_config):
+    """State of the samplers of the sets and of the k-shot examples
+
+    Returns None if the sets are read from generated data.
+    """
+    if isinstance(sampler, Iterable):
+        return None
+    return {
+        "sampler": sampler.get_state(),
+        "k_shot_sampler": prompt_config.sampler.get_state(),
+    }
+
+
+def set_sampler_states(sampler, prompt_config, states):
+    sampler.set_state(states["sampler"])
+    prompt_config.sampler.set_state(states["k_shot_sampler"])
+
+
+def save_sampler_states(path_state, n_records, states):
+    """Save the sampler states after `n_records` runs (atomically)"""
+    path_tmp = f"{path_state}.{os.getpid()}.tmp"
+    with open(path_tmp, "w") as f:
+        json.dump({"n_records": n_records, "state": states}, f)
+    os.replace(path_tmp, path_state)
+
+
+def read_sampler_states(path_state):
+    """Return the saved sampler states and their number of runs (None if
+    they were not saved)"""
+    if not os.path.exists(path_state):
+        return None
+    with open(path_state, "r") as f:
+        return json.load(f)
+
+
+def iter_prompts_with_states(samples, sampler, prompt_config):
+    """Pair each sample with the sampler states right after it was drawn"""
+    for sample in samples:
+        yield sample, get_sampler_states(sampler, prompt_config)
+
+
+def run_experiment(
+    lm,
+    sampler,
+    prompt_config,
+    num_runs=100,
+    debug_no_lm=False,
+    max_workers=1,
+    progress=True,
+    checkpoint_path=None,
+    fsync_every=100,
+):
+    """Run the experiment and return the number of correct responses and
+    the experiment logs
+
+    With `checkpoint_path`, every completed run is appended to a
+    `CheckpointLog`; if the log already exists, the experiment resumes after
+    its last complete run. The samplers are restored from the state saved in
+    the checkpoint, so only the few runs logged after it are sampled again.
+    """
+    results = 0
+    experiment_logs = []
+    lm_model_owner = lm.get_model_owner()
+    lm_model_name = lm.get_model_name()
+    add_roles = needs_roles(lm_model_name)
+    samples = iter_prompts(
+        sampler, prompt_config, num_runs, add_roles=add_roles
+    )
+
+    checkpoint = None
+    if checkpoint_path is not None:
+        checkpoint = CheckpointLog(checkpoint_path, fsync_every=fsync_every)
+        records = checkpoint.read()[:num_runs]
+        n_skipped = len(records)
+        saved = checkpoint.read_state()
+        if records:
+            LOGGER.warning(
+                f"Resuming from run #{len(records)} of {checkpoint_path}"
+            )
+        if (
+            records
+            and saved is not None
+            and saved["n_records"] <= len(records)
+            and not isinstance(sampler, Iterable)
+        ):
+            set_sampler_states(sampler, prompt_config, saved["state"])
+            samples = iter_prompts(
+                sampler,
+                prompt_config,
+                num_runs - saved["n_records"],
+                add_roles=add_roles,
+            )
+            n_skipped = len(records) - saved["n_records"]
+        # skip the sampled sets and the prompts of the completed runs
+        for _ in zip(range(n_skipped), samples):
+            pass
+        for record in records:
+            experiment_log = make_experiment_log(
+                prompt_config,
+                set(record["set_A"]),
+                set(record["set_B"]),
+                record["prompt"],
+                record["result"],
+                lm_model_owner,
+                lm_model_name,
+            )
+            results += int(experiment_log["llm_vs_gt"])
+            experiment_logs.append(experiment_log)
+
+    def call_lm(sample_with_state):
+        (A, B, prompt), state = sample_with_state
         if debug_no_lm:
             result = "set()"
         else:
             result = lm(prompt)
+        return A, B, prompt, result, state
 
-        dict_context_length = get_context_length(
-            prompt_in=prompt,
-            prompt_out=result,
-            model_owner=lm_model_owner,
-            model_name=lm_model_name,
-        )
-        ground_truth = get_ground_truth(prompt_config.operation, A, B)
-        # log the conversation
-        LOGGER.info(
-            f"\n{prompt}\n"
-            f"LM Response: {result}\n"
-            f"GT Response: {ground_truth}"
-        )
-        try:
-            # postprocess lm response
-            result_obj = parse_lm_response(result)
-            # compare with groundtruth
-            ok = is_correct(ground_truth, result_obj)
-            results += int(ok)
-        except Exception as e:
-            result_obj = {-1}  # did not follow guideline
-            ok = False
-            LOGGER.warning(
-                f"op {prompt_config.operation} failed:\n"
-                f"--> result {result}\n"
-                f"------> exception {e}"
-            )
+    if checkpoint is not None:
+        samples = iter_prompts_with_states(samples, sampler, prompt_config)
+    else:
+        samples = ((sample, None) for sample in samples)
 
-        # log all experiments
-        experiment_log = {
-            "op_name": prompt_config.operation,
-            "prompt": prompt,
-            "ground_truth": ground_truth,
-            "result_obj": result_obj,
-            "llm_vs_gt": ok,
-            "set_A": A,
-            "set_B": B,
-            "context_length_in": dict_context_length["in"],
-            "context_length_out": dict_context_length["out"],
-            "log_context": prompt + result,
-        }
-        experiment_logs.append(experiment_log)
+    # only the LM calls are dispatched concurrently; the responses are
+    # consumed in run order
+    responses = map_in_order(call_lm, samples, max_in_flight=max_workers)
+    try:
+        for A, B, prompt, result, state in tqdm(
+            responses,
+            total=num_runs,
+            initial=len(experiment_logs),
+            disable=not progress,
+        ):
+            if checkpoint is not None:
+                checkpoint.append(
+                    make_checkpoint_record(A, B, prompt, result), state
+                )
+            experiment_log = make_experiment_log(
+                prompt_config,
+                A,
+                B,
+                prompt,
+                result,
+                lm_model_owner,
+                lm_model_name,
+            )
+            results += int(experiment_log["llm_vs_gt"])
+            experiment_logs.append(experiment_log)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
 
     return results, experiment_logs
@@ -1,19 +1,24 @@
 """ Language Model API """
 
 import ast
+import hashlib
 import json
 import logging
 import os
-import random
 import re
+import sqlite3
 import subprocess
+import threading
 import time
+from datetime import datetime, timedelta, timezone
 
 import boto3
 import tiktoken
+from botocore.config import Config
 from openai import OpenAI
 
 from setlexsem.constants import PATH_ROOT
+from setlexsem.experiment.rate_limit import RateLimiter, get_backoff_delay
 from setlexsem.utils import read_yaml
 
 LOGGER = logging.getLogger(__name__)
@@ -61,7 +66,18 @@ class LMClass:
 
     # Initialize with model name and optional account number
     def __init__(
-        self, model_name, account_number=None, temperature=0, top_k=1, top_p=1
+        self,
+        model_name,
+        account_number=None,
+        temperature=0,
+        top_k=1,
+        top_p=1,
+        credential_provider=None,
+        max_connections=None,
+        cache=None,
+        rate_limiter=None,
+        concurrency_budget=None,
+        rate_share=1,
     ):
         assert (
             model_name in SUPPORTED_MODELS
@@ -72,27 +88,69 @@ class LMClass:
         self.top_k = top_k
         self.top_p = top_p
         self.context_length_dict = -1
+        # optional ResponseCache that is checked before calling the LM
+        self.cache = cache
+        # throttling and retries are configured per model in models.yaml;
+        # the optional budget is shared with the LMs of other processes, and
+        # this LM gets `rate_share` of the requests per second of the model
+        if rate_limiter is None:
+            model_config = (PRICING_PER_TOKEN or {}).get(model_name, {})
+            rate_config = dict(model_config.get("rate_limit") or {})
+            if rate_config.get("requests_per_second"):
+                rate_config["requests_per_second"] *= rate_share
+            rate_limiter = RateLimiter.from_config(
+                rate_config, budget=concurrency_budget
+            )
+        self.rate_limiter = rate_limiter
 
         self.bedrock_model = 0
+        self.account_number = account_number
         if model_name in BEDROCK_MODELS:
             self.bedrock_model = 1
-            # get the AWS account number if not provided
-            if account_number is None:
-                print("Enter the AWS account number: ")
-                self.account_number = int(input())
-            else:
-                self.account_number = account_number
+            if credential_provider is None:
+                # get the AWS account number if not provided
+                if account_number is None:
+                    print("Enter the AWS account number: ")
+                    self.account_number = int(input())
+                credential_provider = AdaCredentialProvider(
+                    self.account_number
+                )
+            # one client is shared by all calls (and threads) of this LM
+            self.bedrock_clients = BedrockClientPool(
+                credential_provider, max_connections=max_connections
+            )
 
     # Define callable method to initiate conversation
     def __call__(self, prompt):
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(
+                model_id=self.model_name,
+                temperature=self.temperature,
+                top_k=self.top_k,
+                top_p=self.top_p,
+                prompt=prompt,
+            )
+            response = self.cache.get(cache_key)
+            if response is not None:
+                return response
+
+        response = self.rate_limiter(self.call_lm, prompt)
+
+        if self.cache is not None:
+            self.cache.put(cache_key, response)
+
+        return response
+
+    def call_lm(self, prompt):
+        """Get the response from the LM (without using the cache)"""
         if self.bedrock_model:
             response = call_bedrock_lm(
                 model_id=self.get_model_name(),
                 temperature=self.temperature,
                 top_k=self.top_k,
                 top_p=self.top_p,
-                account_number=self.account_number,
                 prompt=prompt,
+                bedrock=self.bedrock_clients.get_client(),
             )
         else:
             response = call_openai_lm(
@@ -121,27 +179,296 @@ class LMClass:
         return self.model_name.replace("openai.", "")
 
 
-def aws_auth(
-    account, service_name="bedrock-runtime", region_name="us-east-1"
-):
-    """Get the AWS client service (default: bedrock) for the account number"""
-    aws_cred = json.loads(
-        subprocess.check_output(
-            f"ada credentials print --account {account}  --provider conduit "
-            "--role IibsAdminAccess-DO-NOT-DELETE",
-            shell=True,
+class AdaCredentialProvider:
+    """Fetch temporary AWS credentials for the account number with `ada`"""
+
+    def __init__(
+        self,
+        account,
+        provider="conduit",
+        role="IibsAdminAccess-DO-NOT-DELETE",
+    ):
+        self.account = account
+        self.provider = provider
+        self.role = role
+
+    def __call__(self):
+        return json.loads(
+            subprocess.check_output(
+                f"ada credentials print --account {self.account}  "
+                f"--provider {self.provider} --role {self.role}",
+                shell=True,
+            )
         )
-    )
+
+
+class EnvCredentialProvider:
+    """Read AWS credentials from the standard AWS environment variables"""
+
+    def __call__(self):
+        return {
+            "AccessKeyId": os.environ["AWS_ACCESS_KEY_ID"],
+            "SecretAccessKey": os.environ["AWS_SECRET_ACCESS_KEY"],
+            "SessionToken": os.environ.get("AWS_SESSION_TOKEN"),
+        }
+
+
+class StaticCredentialProvider:
+    """Serve a fixed set of AWS credentials (e.g., for local tests)"""
+
+    def __init__(
+        self,
+        access_key_id,
+        secret_access_key,
+        session_token=None,
+        expiration=None,
+    ):
+        self.credentials = {
+            "AccessKeyId": access_key_id,
+            "SecretAccessKey": secret_access_key,
+            "SessionToken": session_token,
+            "Expiration": expiration,
+        }
+
+    def __call__(self):
+        return dict(self.credentials)
+
+
+def parse_expiration(expiration):
+    """Parse the expiration of AWS credentials (None if they never expire)"""
+    if expiration is None or isinstance(expiration, datetime):
+        return expiration
+    # e.g., "2024-05-08T21:39:01Z" as printed by `ada`
+    return datetime.fromisoformat(expiration.replace("Z", "+00:00"))
+
+
+def make_aws_client(
+    aws_cred,
+    service_name="bedrock-runtime",
+    region_name="us-east-1",
+    max_connections=None,
+):
+    """Create the AWS client service (default: bedrock) from credentials"""
+    config = None
+    if max_connections is not None:
+        config = Config(max_pool_connections=max_connections)
     aws_service = boto3.client(
         service_name=service_name,
         region_name=region_name,
         aws_access_key_id=aws_cred["AccessKeyId"],
         aws_secret_access_key=aws_cred["SecretAccessKey"],
-        aws_session_token=aws_cred["SessionToken"],
+        aws_session_token=aws_cred.get("SessionToken"),
+        config=config,
     )
     return aws_service
 
 
+def aws_auth(
+    account, service_name="bedrock-runtime", region_name="us-east-1"
+):
+    """Get the AWS client service (default: bedrock) for the account number"""
+    aws_cred = AdaCredentialProvider(account)()
+    return make_aws_client(
+        aws_cred, service_name=service_name, region_name=region_name
+    )
+
+
+class BedrockClientPool:
+    """Thread-safe cache of an authenticated AWS client.
+
+    The client is created on first use and shared by every caller; boto3
+    clients are thread-safe and keep their own HTTP connection pool (sized by
+    `max_connections`). Credentials are refreshed lazily, once they are within
+    `refresh_margin_secs` of their expiration.
+    """
+
+    def __init__(
+        self,
+        credential_provider,
+        service_name="bedrock-runtime",
+        region_name="us-east-1",
+        max_connections=None,
+        refresh_margin_secs=300,
+    ):
+        self.credential_provider = credential_provider
+        self.service_name = service_name
+        self.region_name = region_name
+        self.max_connections = max_connections
+        self.refresh_margin = timedelta(seconds=refresh_margin_secs)
+        self._client = None
+        self._expiration = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self):
+        if self._client is None:
+            return True
+        if self._expiration is None:
+            return False
+        now = datetime.now(timezone.utc)
+        return now >= self._expiration - self.refresh_margin
+
+    def get_client(self):
+        with self._lock:
+            if self.needs_refresh():
+                aws_cred = self.credential_provider()
+                self._expiration = parse_expiration(
+                    aws_cred.get("Expiration")
+                )
+                self._client = make_aws_client(
+                    aws_cred,
+                    service_name=self.service_name,
+                    region_name=self.region_name,
+                    max_connections=self.max_connections,
+                )
+                LOGGER.debug(
+                    "Created %s client (expires %s)",
+                    self.service_name,
+                    self._expiration,
+                )
+            return self._client
+
+
+class ResponseCache:
+    """Disk-backed cache of LM responses, stored in SQLite.
+
+    Responses are keyed on the model, its sampling parameters and the hash of
+    the prompt. Once the responses take more than `max_size_bytes`, the least
+    recently used entries are evicted. The cache counts its hits and misses.
+
+    The total size of the responses is kept up to date by triggers in a
+    one-row table (computed once, when the table is created), so checking
+    it on every `put` does not scan the cache, and it counts the writes of
+    all the processes that share the cache.
+    """
+
+    def __init__(self, path, max_size_bytes=2**30):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # several processes may share the cache (e.g., a parallel grid)
+        self._conn = sqlite3.connect(
+            path, timeout=60, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # in one transaction, so that no write is missed by the total
+        self._conn.executescript(
+            """
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, response TEXT NOT NULL,
+                size INTEGER NOT NULL, last_access REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS responses_last_access
+                ON responses (last_access);
+            CREATE TABLE IF NOT EXISTS total_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                size INTEGER NOT NULL);
+            INSERT OR IGNORE INTO total_size
+                SELECT 0, COALESCE(SUM(size), 0) FROM responses;
+            CREATE TRIGGER IF NOT EXISTS responses_insert
+                AFTER INSERT ON responses BEGIN
+                UPDATE total_size SET size = size + NEW.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_update
+                AFTER UPDATE OF size ON responses BEGIN
+                UPDATE total_size SET size = size - OLD.size + NEW.size
+                WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_delete
+                AFTER DELETE ON responses BEGIN
+                UPDATE total_size SET size = size - OLD.size WHERE id = 0;
+            END;
+            COMMIT;
+            """
+        )
+
+    @staticmethod
+    def make_key(*, model_id, temperature, top_k, top_p, prompt):
+        """Make the cache key of a prompt sent to the LM"""
+        prompt_hash = hashlib.sha256(prompt.encode("utf8")).hexdigest()
+        key = json.dumps([model_id, temperature, top_k, top_p, prompt_hash])
+        return hashlib.sha256(key.encode("utf8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response (None if it is not in the cache)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Store the response and evict old entries if the cache is full"""
+        size = len(response.encode("utf8"))
+        with self._lock, self._conn:
+            # an upsert rather than INSERT OR REPLACE, whose implicit
+            # delete does not fire the triggers
+            self._conn.execute(
+                "INSERT INTO responses "
+                "(key, response, size, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "response = excluded.response, size = excluded.size, "
+                "last_access = excluded.last_access",
+                (key, response, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits"""
+        total_size = self.get_total_size()
+        if total_size <= self.max_size_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        )
+        keys_to_remove = []
+        for key, size in rows:
+            if total_size <= self.max_size_bytes:
+                break
+            keys_to_remove.append((key,))
+            total_size -= size
+        self._conn.executemany(
+            "DELETE FROM responses WHERE key = ?", keys_to_remove
+        )
+
+    def get_total_size(self):
+        """Return the total size of the cached responses, in bytes"""
+        return self._conn.execute(
+            "SELECT size FROM total_size WHERE id = 0"
+        ).fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+    def stats(self):
+        """Return the hit/miss counters"""
+        n_lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / n_lookups if n_lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 def count_tokens(text: str, model_owner: str, model_name=None):
     """Count the number of tokens in a text"""
     if model_owner in ["amazon", "anthropic", "meta", "mistral"]:
@@ -308,11 +635,11 @@ def invoke_bedrock_streaming(bedrock, model_id, body, retries=1):
             if attempt >= retries:
                 raise e
             else:
-                backoff = attempt * (5 + int(5 * random.random()))
+                backoff = get_backoff_delay(attempt - 1, base_delay=5)
                 LOGGER.warning("Error on attempt %d: %s", attempt, str(e))
                 LOGGER.warning("Error occurred using body %s", body)
                 LOGGER.warning(
-                    "Sleeping for %d seconds before retrying.", backoff
+                    "Sleeping for %.1f seconds before retrying.", backoff
                 )
                 time.sleep(backoff)
                 attempt += 1
@@ -380,11 +707,19 @@ def get_bedrock_lm_response(
     )
     lm_output, _ = invoke_bedrock(bedrock, model_id, body)
 
+    raw_body = lm_output.get("body").read().decode("utf8")
     if "amazon" in model_id:
         # read byte string as string
-        bedrock_response = ast.literal_eval(
-            lm_output.get("body").read().decode("utf8")
-        )
+        bedrock_response = ast.literal_eval(raw_body)
+    else:
+        bedrock_response = json.loads(raw_body)
+
+    return parse_bedrock_response(model_id, bedrock_response, debug=debug)
+
+
+def parse_bedrock_response(model_id: str, bedrock_response, debug=False):
+    """Get the output text from the (decoded) response body of the model"""
+    if "amazon" in model_id:
         if debug:
             print(f'LM Stop Reason: {bedrock_response["stopReason"]}')
 
@@ -393,9 +728,6 @@ def get_bedrock_lm_response(
         ]
 
     elif "anthropic" in model_id:
-        bedrock_response = json.loads(
-            lm_output.get("body").read().decode("utf8")
-        )
         if "claude-3" in model_id:
             assert (
                 len(bedrock_response["content"]) == 1
@@ -406,7 +738,6 @@ def get_bedrock_lm_response(
                 print(f'Stop Reason: {bedrock_response["stop_reason"]}')
             output_text = bedrock_response["completion"]
     elif "mistral" in model_id:
-        bedrock_response = json.loads(lm_output.get("body").read())
         assert (
             len(bedrock_response["outputs"]) == 1
         ), "the response has to be 1 item only"
@@ -416,10 +747,11 @@ def get_bedrock_lm_response(
             )
         output_text = bedrock_response["outputs"][0]["text"]
     elif "meta" in model_id:
-        bedrock_response = json.loads(lm_output.get("body").read())
         if debug:
             print(f'Stop Reason: {bedrock_response["stop_reason"]}')
         output_text = bedrock_response["generation"]
+    else:
+        raise ValueError(f"Model {model_id} is not defined for this code.")
 
     return output_text
 
@@ -430,13 +762,15 @@ def call_bedrock_lm(
     top_k: int,
     top_p: float,
     prompt: str,
-    account_number: int,
+    account_number: int = None,
+    bedrock: object = None,
 ):
     """
     Invoke bedrock and get response from the LM model and return the output as
-    a string.
+    a string. A new client is authenticated unless `bedrock` is provided.
     """
-    bedrock = aws_auth(account=account_number)
+    if bedrock is None:
+        bedrock = aws_auth(account=account_number)
     try:
         lm_response = get_bedrock_lm_response(
             bedrock=bedrock,
@@ -483,12 +817,14 @@ def stream_bedrock_lm(
     top_p: float,
     retries: int,
     prompt: str,
-    account_number: int,
+    account_number: int = None,
+    bedrock: object = None,
 ):
     """
     Invoke Bedrock for STREAMING LM output and return the response in a stream.
     """
-    bedrock = aws_auth(account=account_number)
+    if bedrock is None:
+        bedrock = aws_auth(account=account_number)
     for i in range(retries):
         try:
             lm_response = stream_bedrock_lm_response(
@@ -0,0 +1,222 @@
+""" Rate limiting and retries shared by all LM providers """
+
+import logging
+import random
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# error codes (Bedrock) and HTTP statuses (OpenAI) that are worth retrying
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "InternalServerException",
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+THROTTLING_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException"}
+THROTTLING_STATUS_CODES = {429}
+
+
+def get_error_code(error):
+    """Return the provider error code (or HTTP status) of an exception"""
+    # botocore.exceptions.ClientError
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    # openai.APIStatusError
+    return getattr(error, "status_code", None)
+
+
+def is_retryable_error(error):
+    """Check whether the LM call failed for a transient reason"""
+    code = get_error_code(error)
+    return code in RETRYABLE_ERROR_CODES or code in RETRYABLE_STATUS_CODES
+
+
+def is_throttling_error(error):
+    """Check whether the LM provider asked us to slow down"""
+    code = get_error_code(error)
+    return code in THROTTLING_ERROR_CODES or code in THROTTLING_STATUS_CODES
+
+
+def get_backoff_delay(
+    attempt, base_delay=1.0, max_delay=60.0, random_state=random
+):
+    """Exponential backoff with full jitter for the (0-indexed) attempt"""
+    return random_state.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+class TokenBucket:
+    """Token bucket that allows `rate` requests per second on average,
+    with bursts of up to `capacity` requests."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limit the number of in-flight requests with AIMD.
+
+    The limit grows additively (by about one request per round-trip of the
+    whole window) while requests succeed, and shrinks multiplicatively when
+    the provider throttles us.
+    """
+
+    def __init__(
+        self,
+        max_concurrency,
+        initial_concurrency=None,
+        min_concurrency=1,
+        decrease_factor=0.5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.limit = float(
+            initial_concurrency
+            if initial_concurrency is not None
+            else max_concurrency
+        )
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(
+                self.max_concurrency, self.limit + 1 / max(self.limit, 1)
+            )
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(
+                self.min_concurrency, self.limit * self.decrease_factor
+            )
+            LOGGER.debug("Reduced the concurrency limit to %f", self.limit)
+
+
+class RateLimiter:
+    """Rate limiter with adaptive concurrency and jittered retries.
+
+    Parameters
+    ----------
+    requests_per_second : float, optional
+        Average request rate allowed by the token bucket (None: unlimited).
+    max_concurrency : int, optional
+        Upper bound of the adaptive concurrency limit.
+    max_retries : int, optional
+        Number of retries after a transient error.
+    base_delay : float, optional
+        Backoff of the first retry, in seconds (doubled for each retry).
+    max_delay : float, optional
+        Upper bound of the backoff, in seconds.
+    random_state : Random, optional
+        Random number generator for the jitter.
+    budget : Semaphore, optional
+        Semaphore shared with other rate limiters (e.g., of other processes)
+        that bounds their total number of calls in flight.
+    """
+
+    def __init__(
+        self,
+        requests_per_second=None,
+        max_concurrency=16,
+        max_retries=5,
+        base_delay=1.0,
+        max_delay=60.0,
+        random_state=None,
+        budget=None,
+    ):
+        self.bucket = (
+            TokenBucket(requests_per_second) if requests_per_second else None
+        )
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random_state = (
+            random.Random() if random_state is None else random_state
+        )
+        self.budget = budget
+        self.n_retries = 0
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create the rate limiter from a `rate_limit` block of models.yaml"""
+        return cls(**{**(config or {}), **kwargs})
+
+    def __call__(self, func, *args, **kwargs):
+        """Call `func` within the limits, retrying on transient errors"""
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            self.concurrency.acquire()
+            if self.budget is not None:
+                self.budget.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    raise e
+                if is_throttling_error(e):
+                    self.concurrency.on_throttle()
+                error = e
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                if self.budget is not None:
+                    self.budget.release()
+                self.concurrency.release()
+
+            backoff = get_backoff_delay(
+                attempt,
+                base_delay=self.base_delay,
+                max_delay=self.max_delay,
+                random_state=self.random_state,
+            )
+            LOGGER.warning("Error on attempt %d: %s", attempt + 1, str(error))
+            LOGGER.warning(
+                "Sleeping for %f seconds before retrying.", backoff
+            )
+            time.sleep(backoff)
+            self.n_retries += 1
+            attempt += 1
@@ -1,20 +1,46 @@
 import argparse
 import ast
-import itertools
 import logging
+import multiprocessing
+import multiprocessing.util
 import os
 import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import pandas as pd
-
-from setlexsem.constants import PATH_CONFIG_ROOT, PATH_RESULTS_ROOT, PATH_ROOT
-from setlexsem.experiment.experiment import run_experiment
-from setlexsem.experiment.lmapi import LMClass
+from tqdm import tqdm
+
+from setlexsem.constants import (
+    PATH_CACHE_ROOT,
+    PATH_CONFIG_ROOT,
+    PATH_RESULTS_ROOT,
+    PATH_ROOT,
+)
+from setlexsem.experiment.batch import (
+    export_batch_experiment,
+    import_batch_experiment,
+    make_batch_name,
+)
+from setlexsem.experiment.experiment import (
+    CheckpointLog,
+    get_sampler_states,
+    iter_prompts,
+    needs_roles,
+    read_sampler_states,
+    run_experiment,
+    save_sampler_states,
+    set_sampler_states,
+)
+from setlexsem.experiment.lmapi import LMClass, ResponseCache
 from setlexsem.generate.generate_prompts import make_hps_prompt, replace_none
 from setlexsem.generate.generate_sets import get_sampler, make_hps_set
 from setlexsem.generate.prompt import PromptConfig
 from setlexsem.generate.utils_io import load_generated_data
-from setlexsem.utils import get_study_paths, read_config
+from setlexsem.utils import get_study_paths, read_config, save_csv_atomically
+
+LOGGER = logging.getLogger(__name__)
 
 
 # define argparser
@@ -45,10 +71,382 @@ def parse_args():
         action="store_true",
         help="Debug model without calling language model",
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=1,
+        help="Maximum number of concurrent LM calls per experiment",
+    )
+    parser.add_argument(
+        "--response-cache",
+        type=str,
+        nargs="?",
+        const=os.path.join(PATH_CACHE_ROOT, "lm_responses.sqlite"),
+        default=None,
+        help="Path to the SQLite cache of LM responses (off by default)",
+    )
+    parser.add_argument(
+        "--grid-workers",
+        type=int,
+        default=1,
+        help="Number of processes that run the experiments of the grid",
+    )
+    parser.add_argument(
+        "--lm-concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of LM calls in flight across all grid workers",
+    )
+    batch_mode = parser.add_mutually_exclusive_group()
+    batch_mode.add_argument(
+        "--batch-export",
+        type=str,
+        default=None,
+        help="Write the prompts as Bedrock batch-inference inputs to this "
+        "directory instead of calling the LM",
+    )
+    batch_mode.add_argument(
+        "--batch-import",
+        type=str,
+        default=None,
+        help="Read the results from the Bedrock batch-inference outputs in "
+        "this directory instead of calling the LM",
+    )
     args = parser.parse_args()
     return args
 
 
+def prepare_experiment(
+    hp_set, hp_prompt, random_seed, use_generated_data, num_runs=None, start=0
+):
+    """Create the sampler (or the loaded data, runs `start` to `num_runs` of
+    the saved dataset) and the prompt config"""
+    # Initilize Seed for each combination
+    random_state = random.Random(random_seed)
+
+    # Create Sampler
+    sampler = get_sampler(hp=hp_set, random_state=random_state)
+    LOGGER.info(sampler)
+
+    # create k-shot sampler
+    k_shot_sampler = sampler.create_sampler_for_k_shot()
+
+    if use_generated_data:
+        # NOTE: k-shot sampler has to be defined before loading data
+        sampler = load_generated_data(
+            sampler, random_seed, start=start, stop=num_runs
+        )
+
+    # Create Prompt Config
+    prompt_config = PromptConfig(
+        operation=hp_prompt["op_list"],
+        k_shot=hp_prompt["k_shot"],
+        type=hp_prompt["prompt_type"],
+        approach=hp_prompt["prompt_approach"],
+        sampler=k_shot_sampler,
+        is_fixed_shots=hp_prompt["is_fix_shot"],
+    )
+    LOGGER.info(prompt_config)
+    return sampler, prompt_config
+
+
+# LM of the current process (see `init_worker`)
+WORKER_STATE = {}
+
+
+def make_lm(settings, concurrency_budget=None, rate_share=1):
+    """Create the LM (and its response cache) of one process, which may send
+    `rate_share` of the requests per second allowed for the model"""
+    lm_cache = None
+    if settings["response_cache"]:
+        lm_cache = ResponseCache(settings["response_cache"])
+        LOGGER.info(f"Caching LM responses in {settings['response_cache']}")
+    return LMClass(
+        settings["model_name"],
+        account_number=settings["account_number"],
+        max_connections=max(10, settings["max_workers"]),
+        cache=lm_cache,
+        concurrency_budget=concurrency_budget,
+        rate_share=rate_share,
+    )
+
+
+def init_worker(settings, concurrency_budget=None, rate_share=1):
+    """Create the LM once per process (the Bedrock clients are not picklable)"""
+    LOGGER.setLevel(level=logging.INFO)
+    WORKER_STATE["lm"] = make_lm(settings, concurrency_budget, rate_share)
+
+
+def init_grid_worker(settings, concurrency_budget=None, rate_share=1):
+    """Create the LM of a grid worker, and close its response cache when the
+    worker exits"""
+    init_worker(settings, concurrency_budget, rate_share)
+    lm_cache = WORKER_STATE["lm"].cache
+    if lm_cache is not None:
+        multiprocessing.util.Finalize(
+            lm_cache, lm_cache.close, exitpriority=10
+        )
+
+
+def run_config_in_worker(hp_set, hp_prompt, settings):
+    """Run `run_config` in a grid worker
+
+    Returns the status of the configuration and the hits and misses of the
+    response cache of the worker during the run.
+    """
+    lm_cache = WORKER_STATE["lm"].cache
+    before = Counter() if lm_cache is None else Counter(lm_cache.stats())
+    status = run_config(hp_set, hp_prompt, settings)
+    cache_counts = Counter()
+    if lm_cache is not None:
+        after = lm_cache.stats()
+        for name in ("hits", "misses"):
+            cache_counts[name] = after[name] - before[name]
+    return status, cache_counts
+
+
+def run_config(hp_set, hp_prompt, settings):
+    """Run the experiment of one configuration of the grid
+
+    Returns the status of the configuration: "saved", "exported", "skipped"
+    or "failed".
+    """
+    LM = WORKER_STATE["lm"]
+    N_RUN = settings["n_run"]
+    LOAD_GENERATED_DATA = settings["load_generated_data"]
+    RANDOM_SEED_VAL = settings["random_seed"]
+    BATCH_EXPORT = settings["batch_export"]
+    BATCH_IMPORT = settings["batch_import"]
+
+    # initilize the last run check
+    last_run_check = False
+    df_last_run = pd.DataFrame()  # it has to be empty to start withs
+    path_study, path_results = get_study_paths(
+        hp_set,
+        hp_prompt,
+        random_seed=RANDOM_SEED_VAL,
+        study_name=settings["study_name"],
+        path_root=settings["path_results"],
+    )
+    batch_name = make_batch_name(path_results, settings["path_results"])
+    # states of the samplers after the runs saved in `path_results`
+    path_state = f"{path_results}.state.json"
+    if os.path.exists(path_results) and (BATCH_EXPORT or BATCH_IMPORT):
+        LOGGER.error(f"--> Skipping, file exists: {path_results}")
+        return "skipped"
+    elif os.path.exists(path_results):
+        if settings["load_last_run"]:
+            df_last_run = pd.read_csv(path_results)
+            last_run_count = len(df_last_run)
+            last_run_check = last_run_count > 0
+            N_RUN_LEFT = N_RUN - last_run_count
+            if N_RUN <= last_run_count:
+                LOGGER.warning(
+                    f"--> Skipping, model is saved for all {N_RUN}-runs"
+                )
+                return "skipped"
+
+        else:
+            LOGGER.error(f"--> Skipping, file exists: {path_results}")
+            return "skipped"
+    else:
+        N_RUN_LEFT = N_RUN
+
+    if N_RUN_LEFT != N_RUN:
+        LOGGER.info(f"Adjusted the number of runs to {N_RUN_LEFT}")
+
+    # Create Sampler and Prompt Config
+    try:
+        sampler, prompt_config = prepare_experiment(
+            hp_set,
+            hp_prompt,
+            RANDOM_SEED_VAL,
+            LOAD_GENERATED_DATA,
+            N_RUN,
+            # the generated data are read from the last completed run on
+            start=last_run_count - 1 if last_run_check else 0,
+        )
+    except Exception as e:
+        LOGGER.warning(f"No sampler: {hp_set} | {e}")
+        return "failed"
+
+    if BATCH_EXPORT:
+        # write the prompts for Bedrock batch inference (no LM call)
+        samples = iter_prompts(
+            sampler,
+            prompt_config,
+            N_RUN,
+            add_roles=needs_roles(LM.get_model_name()),
+        )
+        n_records = export_batch_experiment(
+            BATCH_EXPORT,
+            batch_name,
+            samples,
+            LM,
+            metadata={"path_results": path_results},
+        )
+        LOGGER.info(f"--> {n_records} records saved for {batch_name}")
+        return "exported"
+
+    # skip the completed runs, and check that the last one matches
+    saved = None
+    if last_run_check and not LOAD_GENERATED_DATA:
+        saved = read_sampler_states(path_state)
+    if saved is not None and saved["n_records"] == last_run_count:
+        # the samplers resume right after the saved runs
+        set_sampler_states(sampler, prompt_config, saved["state"])
+    elif last_run_check:
+        if LOAD_GENERATED_DATA:
+            A, B = next(sampler)
+        else:
+            # the sets and the prompts (k-shot examples) are sampled again,
+            # but only the last run is compared
+            for A, B, _ in iter_prompts(
+                sampler,
+                prompt_config,
+                last_run_count,
+                add_roles=needs_roles(LM.get_model_name()),
+            ):
+                pass
+
+        check_A = ast.literal_eval(df_last_run.iloc[-1]["set_A"])
+        check_B = ast.literal_eval(df_last_run.iloc[-1]["set_B"])
+        if A != check_A or B != check_B:
+            LOGGER.error(
+                f"Run #{last_run_count - 1} is incompatible with last run "
+                f"--> {A}, {B} is not {check_A}, {check_B}.\n\n"
+                f"Check: {path_results}"
+            )
+            return "failed"
+
+    # completed runs are logged as they come, so a crash loses nothing
+    path_checkpoint = None
+    if settings["save_files"]:
+        path_checkpoint = f"{path_results}.partial.jsonl"
+
+    # Run Experiment
+    try:
+        if BATCH_IMPORT:
+            # the same prompts are rebuilt from the seeded sampler
+            samples = iter_prompts(
+                sampler,
+                prompt_config,
+                N_RUN,
+                add_roles=needs_roles(LM.get_model_name()),
+            )
+            results, exp_logs = import_batch_experiment(
+                BATCH_IMPORT, batch_name, samples, LM, prompt_config
+            )
+        else:
+            results, exp_logs = run_experiment(
+                LM,
+                sampler,
+                prompt_config,
+                num_runs=N_RUN_LEFT,
+                debug_no_lm=settings["debug_no_lm"],
+                max_workers=settings["max_workers"],
+                progress=settings["show_progress"],
+                checkpoint_path=path_checkpoint,
+            )
+    except Exception as e:
+        LOGGER.error(f"------> Error: Skipping this experiment | {e}")
+        return "failed"
+
+    df_results = pd.DataFrame(exp_logs)
+    # concatenate with last run data (if exists, if not, it's empty)
+    df_results = pd.concat([df_last_run, df_results], axis=0)
+
+    # Save Results
+    df_op = df_results.reset_index(drop=True).copy()
+
+    # save df_results
+    if settings["save_files"]:
+        os.makedirs(path_study, exist_ok=True)
+
+        # save results (a killed run never leaves a truncated file)
+        save_csv_atomically(df_op, path_results)
+        LOGGER.info(f"--> file saved at {path_results}")
+        # so that a longer run resumes without sampling these runs again
+        states = get_sampler_states(sampler, prompt_config)
+        if states is not None:
+            save_sampler_states(path_state, len(df_op), states)
+        elif os.path.exists(path_state):
+            os.remove(path_state)
+        if path_checkpoint:
+            CheckpointLog(path_checkpoint).remove()
+
+    return "saved"
+
+
+def run_grid(hps, settings, grid_workers=1, lm_concurrency=None):
+    """Run the experiments of all (hp_set, hp_prompt) configurations
+
+    The configurations are independent (each one is seeded separately), so
+    they can run in `grid_workers` processes. `lm_concurrency` bounds the
+    number of LM calls in flight across all of them, and the requests per
+    second allowed for the model are split between them. Returns the number
+    of configurations by status.
+    """
+    hps = list(hps)
+    statuses = Counter()
+    progress = tqdm(total=len(hps), desc="Experiments")
+
+    if grid_workers <= 1:
+        budget = None
+        if lm_concurrency:
+            budget = threading.BoundedSemaphore(lm_concurrency)
+        init_worker(settings, budget)
+        for counter_exp, (hp_set, hp_prompt) in enumerate(hps, start=1):
+            LOGGER.info(
+                f"-------- EXPERIMENT #{counter_exp} out of {len(hps)}"
+            )
+            statuses[run_config(hp_set, hp_prompt, settings)] += 1
+            progress.set_postfix(statuses)
+            progress.update()
+        lm_cache = WORKER_STATE["lm"].cache
+        if lm_cache is not None:
+            LOGGER.info(f"LM response cache: {lm_cache.stats()}")
+            lm_cache.close()
+    else:
+        # each worker has its own LM; the budget is shared by all of them
+        # and each one gets an equal share of the requests per second
+        n_workers = max(1, min(grid_workers, len(hps)))
+        with multiprocessing.Manager() as manager:
+            budget = None
+            if lm_concurrency:
+                budget = manager.BoundedSemaphore(lm_concurrency)
+            cache_counts = Counter()
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=init_grid_worker,
+                initargs=(settings, budget, 1 / n_workers),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        run_config_in_worker, hp_set, hp_prompt, settings
+                    )
+                    for hp_set, hp_prompt in hps
+                ]
+                for future in as_completed(futures):
+                    status, config_cache_counts = future.result()
+                    statuses[status] += 1
+                    cache_counts.update(config_cache_counts)
+                    progress.set_postfix(statuses)
+                    progress.update()
+            if settings["response_cache"]:
+                n_lookups = cache_counts["hits"] + cache_counts["misses"]
+                hit_rate = (
+                    cache_counts["hits"] / n_lookups if n_lookups else 0.0
+                )
+                LOGGER.info(
+                    "LM response cache: "
+                    f"{dict(cache_counts, hit_rate=hit_rate)}"
+                )
+
+    progress.close()
+    return statuses
+
+
 # init
 if __name__ == "__main__":
     # parse args
@@ -58,8 +456,13 @@ if __name__ == "__main__":
     DEBUG_MODEL_NO_LM_CALL = True if args.debug_model_no_lm_call else False
     SAVE_FILES = True if args.save_files else False
     LOAD_LAST_RUN = True if args.load_previous_run else False
+    MAX_WORKERS = args.max_workers
+    RESPONSE_CACHE = args.response_cache
+    GRID_WORKERS = args.grid_workers
+    LM_CONCURRENCY = args.lm_concurrency
+    BATCH_EXPORT = args.batch_export
+    BATCH_IMPORT = args.batch_import
 
-    LOGGER = logging.getLogger(__name__)
     LOGGER.setLevel(level=logging.INFO)
 
     # Read Config File and Assign Variables
@@ -105,145 +508,49 @@ if __name__ == "__main__":
         swap_status=SWAP_STATUS,
         overlap_fraction=OVERLAP_FRACTION,
     )
-    make_hps_set_generator, make_hps_set_generator_copy = itertools.tee(
-        make_hps_set_generator
-    )
-
-    # generator for prompts
-    make_hps_prompt_generator = make_hps_prompt(
-        OP_LIST, K_SHOT, PROMPT_TYPE, PROMPT_APPROACH, IS_FIX_SHOT
-    )
-    # report number of overall experiments
-    n_experiments = len(list(make_hps_set_generator_copy)) * len(
-        list(make_hps_prompt_generator)
-    )
-    LOGGER.info(f"Experiment will run for {n_experiments} times")
 
-    # create the LLM class
-    LM = LMClass(MODEL_NAME, account_number=ACCOUNT_NUMBER)
-
-    # go through hyperparameters and run the experiment
-    counter_exp = 1
-    for hp_set in make_hps_set_generator:
-        make_hps_prompt_generator = make_hps_prompt(
+    # (hp_set, hp_prompt) grid, in the same order as the serial runs
+    hps = [
+        (hp_set, hp_prompt)
+        for hp_set in make_hps_set_generator
+        for hp_prompt in make_hps_prompt(
             OP_LIST, K_SHOT, PROMPT_TYPE, PROMPT_APPROACH, IS_FIX_SHOT
         )
-        for hp_prompt in make_hps_prompt_generator:
-            LOGGER.info(
-                f"-------- EXPERIMENT #{counter_exp} out of {n_experiments}"
-            )
-            # initilize the last run check
-            last_run_check = False
-            df_last_run = pd.DataFrame()  # it has to be empty to start withs
-            path_study, path_results = get_study_paths(
-                hp_set,
-                hp_prompt,
-                random_seed=RANDOM_SEED_VAL,
-                study_name=STUDY_NAME,
-                path_root=PATH_RESULTS,
-            )
-            if os.path.exists(path_results):
-                if LOAD_LAST_RUN:
-                    last_run_check = True
-                    df_last_run = pd.read_csv(path_results)
-                    last_run_count = len(df_last_run)
-                    N_RUN_LEFT = N_RUN - last_run_count
-                    if N_RUN <= last_run_count:
-                        LOGGER.warning(
-                            f"--> Skipping, model is saved for all {N_RUN}-runs"
-                        )
-                        counter_exp += 1
-                        continue
-
-                else:
-                    LOGGER.error(f"--> Skipping, file exists: {path_results}")
-                    counter_exp += 1
-                    continue
-            else:
-                N_RUN_LEFT = N_RUN
-
-            if N_RUN_LEFT != N_RUN:
-                LOGGER.info(f"Adjusted the number of runs to {N_RUN_LEFT}")
-
-            # Initilize Seed for each combination
-            random_state = random.Random(RANDOM_SEED_VAL)
-
-            # Create Sampler
-            try:
-                sampler = get_sampler(hp=hp_set, random_state=random_state)
-            except Exception as e:
-                LOGGER.warning(f"No sampler: {hp_set} | {e}")
-                counter_exp += 1
-                continue
-            LOGGER.info(sampler)
-
-            # create k-shot sampler
-            k_shot_sampler = sampler.create_sampler_for_k_shot()
-
-            if LOAD_GENERATED_DATA:
-                # NOTE: k-shot sampler has to be defined before loading data
-                sampler = load_generated_data(sampler, RANDOM_SEED_VAL)
-
-            # Create Prompt Config
-            prompt_config = PromptConfig(
-                operation=hp_prompt["op_list"],
-                k_shot=hp_prompt["k_shot"],
-                type=hp_prompt["prompt_type"],
-                approach=hp_prompt["prompt_approach"],
-                sampler=k_shot_sampler,
-                is_fixed_shots=hp_prompt["is_fix_shot"],
-            )
-            LOGGER.info(prompt_config)
-
-            # generate samples from the sampler to reach the last run count
-            if last_run_check:
-                for i in range(last_run_count):
-                    if LOAD_GENERATED_DATA:
-                        A, B = next(sampler)
-                    else:
-                        A, B = sampler()
-
-                    check_A = ast.literal_eval(df_last_run.iloc[i]["set_A"])
-                    check_B = ast.literal_eval(df_last_run.iloc[i]["set_B"])
-                    assert ast.literal_eval(A) == check_A, (
-                        f"Run #{i} is incompatible with last run --> "
-                        f"{A} is not {check_A}.\n\nCheck: {path_results}"
-                    )
-                    assert ast.literal_eval(B) == check_B, (
-                        f"Run #{i} is incompatible with last run --> "
-                        "{B} is not {check_B}\n\nCheck: {path_results}"
-                    )
-
-            # Run Experiment
-            try:
-                results, exp_logs = run_experiment(
-                    LM,
-                    sampler,
-                    prompt_config,
-                    num_runs=N_RUN_LEFT,
-                    debug_no_lm=DEBUG_MODEL_NO_LM_CALL,
-                )
-            except Exception as e:
-                LOGGER.error("------> Error: Skipping this experiment")
-                counter_exp += 1
-                continue
-
-            df_results = pd.DataFrame(exp_logs)
-            # concatenate with last run data (if exists, if not, it's empty)
-            df_results = pd.concat([df_last_run, df_results], axis=0)
-
-            # Save Results
-            df_op = df_results.reset_index(drop=True).copy()
-
-            # save df_results
-            if SAVE_FILES:
-                if not os.path.exists(path_study):
-                    os.makedirs(path_study)
-
-                # save results
-                df_op.to_csv(path_results, index=False)
-                LOGGER.info(f"--> file saved at {path_results}")
+    ]
+    # report number of overall experiments
+    LOGGER.info(f"Experiment will run for {len(hps)} times")
+
+    if (BATCH_EXPORT or BATCH_IMPORT) and GRID_WORKERS > 1:
+        # the batch manifest is shared by all the experiments
+        LOGGER.warning("Batch mode runs the grid in a single process")
+        GRID_WORKERS = 1
+
+    settings = {
+        "account_number": ACCOUNT_NUMBER,
+        "model_name": MODEL_NAME,
+        "max_workers": MAX_WORKERS,
+        "response_cache": RESPONSE_CACHE,
+        "study_name": STUDY_NAME,
+        "path_results": PATH_RESULTS,
+        "n_run": N_RUN,
+        "random_seed": RANDOM_SEED_VAL,
+        "load_generated_data": LOAD_GENERATED_DATA,
+        "load_last_run": LOAD_LAST_RUN,
+        "debug_no_lm": DEBUG_MODEL_NO_LM_CALL,
+        "save_files": SAVE_FILES,
+        "batch_export": BATCH_EXPORT,
+        "batch_import": BATCH_IMPORT,
+        # one progress bar per experiment only when they run one by one
+        "show_progress": GRID_WORKERS <= 1,
+    }
 
-            counter_exp += 1
+    # go through hyperparameters and run the experiment
+    statuses = run_grid(
+        hps,
+        settings,
+        grid_workers=GRID_WORKERS,
+        lm_concurrency=LM_CONCURRENCY,
+    )
+    LOGGER.info(f"Experiments: {dict(statuses)}")
 
     LOGGER.info("Done!")
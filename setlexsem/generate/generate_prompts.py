@@ -1,7 +1,6 @@
 # coding: utf-8
 
 import argparse
-import ast
 import itertools
 import logging
 import os
@@ -129,8 +128,6 @@ def create_prompts_from_sampler(
             if isinstance(sampler, Iterable):
                 # get next set from generator
                 A, B = next(sampler)
-                A = ast.literal_eval(A)
-                B = ast.literal_eval(B)
             else:
                 # generate next set
                 A, B = sampler()
@@ -374,7 +371,9 @@ def main(config_file, save_data, overwrite):
             k_shot_sampler = sampler.create_sampler_for_k_shot()
 
             # load already created data
-            sampler = load_generated_data(sampler, RANDOM_SEED_VAL)
+            sampler = load_generated_data(
+                sampler, RANDOM_SEED_VAL, stop=number_of_data_points
+            )
 
             # Create prompts
             try:
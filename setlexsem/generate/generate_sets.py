@@ -1,8 +1,10 @@
 import argparse
 import ast
+import hashlib
 import itertools
 import logging
 import random
+from concurrent.futures import ProcessPoolExecutor
 from itertools import product
 from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
@@ -16,7 +18,12 @@ from setlexsem.generate.sample import (
     OverlapSampler,
     Sampler,
 )
-from setlexsem.generate.utils_io import save_generated_sets
+from setlexsem.generate.utils_io import (
+    SEQUENTIAL_SAMPLING,
+    find_dataset,
+    save_generated_sets,
+    save_generated_shards,
+)
 
 # add logger and line number
 logger = logging.getLogger(__name__)
@@ -42,6 +49,34 @@ def get_parser():
     parser.add_argument(
         "--overwrite", action="store_true", help="Overwrite data"
     )
+    parser.add_argument(
+        "--batch-sampling",
+        action="store_true",
+        help="Sample the sets of numbers (and the overlapping sets of "
+        "numbers or words) with NumPy, in one batch (faster, but different "
+        "sets than the default sampling)",
+    )
+    parser.add_argument(
+        "--data-format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Format of the saved sets (parquet requires pyarrow)",
+    )
+    parser.add_argument(
+        "--n-shards",
+        type=int,
+        default=None,
+        help="Split each configuration into this many shards, each with its "
+        "own seed derived from --seed-value (the sets depend on the number "
+        "of shards, but not on the number of workers)",
+    )
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=None,
+        help="Number of processes generating the shards (default: number of "
+        "CPUs)",
+    )
     return parser
 
 
@@ -55,7 +90,7 @@ def astype_set(raw_input):
 
         return set_out
     else:
-        return set_out
+        return raw_input
 
 
 def parse_set_pair(raw_set_a: str, raw_set_b: str) -> Tuple[set, set]:
@@ -145,6 +180,121 @@ def make_sets_from_sampler(
     return set_list
 
 
+def get_shard_seed(seed_value: int, shard: int) -> int:
+    """Derive the seed of a shard from the seed of the dataset"""
+    digest = hashlib.sha256(f"{seed_value}-{shard}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def get_shard_ranges(num_runs: int, n_shards: int) -> List[Tuple[int, int]]:
+    """Split the runs into contiguous ranges of (almost) equal size"""
+    bounds = [num_runs * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def supports_batch_sampling(sampler: Sampler) -> bool:
+    """Whether the sampler can sample its sets in one NumPy batch"""
+    return isinstance(sampler, BasicNumberSampler) or (
+        isinstance(sampler, OverlapSampler)
+        and sampler.get_population() is not None
+    )
+
+
+def make_shard(
+    hp_set: Dict[str, Any],
+    seed_value: int,
+    shard: int,
+    start: int,
+    stop: int,
+    batch_sampling: bool = False,
+) -> Dict[str, Any]:
+    """Generate the runs [start, stop) of a configuration, with the seed of
+    the shard (run in the worker processes of `make_shards`)"""
+    shard_seed = get_shard_seed(seed_value, shard)
+    sampler = get_sampler(hp_set, random.Random(shard_seed))
+    num_runs = stop - start
+    if batch_sampling and supports_batch_sampling(sampler):
+        columns = sampler.sample_batch(num_runs).to_dict()
+        synthetic_sets = [
+            {"experiment_run": i, "A": A, "B": B}
+            for i, A, B in zip(
+                columns["experiment_run"], columns["A"], columns["B"]
+            )
+        ]
+    else:
+        synthetic_sets = make_sets_from_sampler(sampler, num_runs)
+    for ds in synthetic_sets:
+        ds["experiment_run"] += start
+    return {
+        "index": shard,
+        "seed": shard_seed,
+        "start": start,
+        "stop": stop,
+        "sets": synthetic_sets,
+    }
+
+
+def make_shards(
+    hp_sets: Iterable[Dict[str, Any]],
+    num_runs: int,
+    seed_value: int,
+    n_shards: int,
+    n_workers: Optional[int] = None,
+    batch_sampling: bool = False,
+):
+    """Generate the shards of each configuration on a pool of processes.
+
+    The seed of a shard only depends on `seed_value` and on its index, and
+    the shards are returned in order, so the sets do not depend on
+    `n_workers`.
+
+    Yields:
+        The configuration and its shards (sorted by index), or the
+        configuration and the exception raised while generating it.
+    """
+    ranges = get_shard_ranges(num_runs, n_shards)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            (
+                hp_set,
+                [
+                    executor.submit(
+                        make_shard,
+                        hp_set,
+                        seed_value,
+                        shard,
+                        start,
+                        stop,
+                        batch_sampling,
+                    )
+                    for shard, (start, stop) in enumerate(ranges)
+                ],
+            )
+            for hp_set in hp_sets
+        ]
+        for hp_set, shard_futures in futures:
+            try:
+                yield hp_set, [future.result() for future in shard_futures]
+            except Exception as e:
+                yield hp_set, e
+
+
+def is_generated(
+    hp_set: Dict[str, Any], seed_value: int, num_runs: int, sampling: str
+) -> bool:
+    """Whether the registry already has the sets of a configuration, maybe
+    in a larger dataset or under another name (see `find_dataset`)"""
+    try:
+        sampler = get_sampler(hp_set, random.Random(seed_value))
+    except Exception:
+        # the generation reports the error
+        return False
+    dataset = find_dataset(sampler, seed_value, num_runs, sampling=sampling)
+    if dataset is not None:
+        logger.info(f"Already generated at {dataset['path']}, skipping...")
+    return dataset is not None
+
+
 def read_config_make_sets(config_path: str = "config.yaml"):
     """Read config file from YAML"""
     try:
@@ -317,6 +467,7 @@ if __name__ == "__main__":
     number_of_data_points = args.number_of_data_points
     seed_value = args.seed_value
     overwrite = args.overwrite
+    batch_sampling = args.batch_sampling
 
     # read config file
     config = read_config_make_sets(config_path=config_path)
@@ -329,27 +480,84 @@ if __name__ == "__main__":
     n_configurations = len(list(make_hps_generator_copy))
     logger.info(f"Creating sets for {n_configurations} configurations...")
 
-    for hp_set in make_hps_generator:
-        random_state = random.Random(seed_value)
-        try:
-            sampler = get_sampler(hp_set, random_state)
-
-            synthetic_sets = make_sets_from_sampler(
-                sample_set=sampler, num_runs=number_of_data_points
+    if args.n_shards is not None:
+        hp_sets_left = make_hps_generator
+        if save_data and not overwrite:
+            hp_sets_left = (
+                hp_set
+                for hp_set in make_hps_generator
+                if not is_generated(
+                    hp_set,
+                    seed_value,
+                    number_of_data_points,
+                    f"shards-{args.n_shards}",
+                )
             )
-
-            logger.info(f"Generated {sampler}")
+        for hp_set, shards in make_shards(
+            hp_sets_left,
+            number_of_data_points,
+            seed_value,
+            args.n_shards,
+            n_workers=args.n_workers,
+            batch_sampling=batch_sampling,
+        ):
+            if isinstance(shards, Exception):
+                logger.warning(f"Skipping: {shards} / {hp_set}")
+                continue
+            # the sampler of the dataset (for its parameters and filename)
+            sampler = get_sampler(hp_set, random.Random(seed_value))
+            logger.info(f"Generated {sampler} in {len(shards)} shards")
             if save_data:
-                save_generated_sets(
-                    synthetic_sets,
+                save_generated_shards(
+                    shards,
                     sampler,
                     seed_value,
                     number_of_data_points,
                     overwrite=overwrite,
+                    data_format=args.data_format,
                 )
-
-        except Exception as e:
-            logger.warning(f"Skipping: {e} / {sampler}")
-            continue
+    else:
+        for hp_set in make_hps_generator:
+            random_state = random.Random(seed_value)
+            try:
+                sampler = get_sampler(hp_set, random_state)
+                use_batch = batch_sampling and supports_batch_sampling(
+                    sampler
+                )
+                if (
+                    save_data
+                    and not overwrite
+                    and is_generated(
+                        hp_set,
+                        seed_value,
+                        number_of_data_points,
+                        "batch" if use_batch else SEQUENTIAL_SAMPLING,
+                    )
+                ):
+                    continue
+
+                if use_batch:
+                    synthetic_sets = sampler.sample_batch(
+                        number_of_data_points
+                    )
+                else:
+                    synthetic_sets = make_sets_from_sampler(
+                        sample_set=sampler, num_runs=number_of_data_points
+                    )
+
+                logger.info(f"Generated {sampler}")
+                if save_data:
+                    save_generated_sets(
+                        synthetic_sets,
+                        sampler,
+                        seed_value,
+                        number_of_data_points,
+                        overwrite=overwrite,
+                        data_format=args.data_format,
+                    )
+
+            except Exception as e:
+                logger.warning(f"Skipping: {e} / {sampler}")
+                continue
 
     logger.info("Dataset is created!")
@@ -1,13 +1,18 @@
 # coding: utf-8
 
+import copy
 import random
 from itertools import product
 
-from nltk.corpus import words
-
 from setlexsem.generate.sample import Sampler
+from setlexsem.generate.vocabulary import get_english_words
+
 
-ENGLISH_WORDS = list(set(w.lower() for w in words.words()))
+def __getattr__(name):
+    # `ENGLISH_WORDS` is loaded on first access (see `vocabulary`)
+    if name == "ENGLISH_WORDS":
+        return get_english_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # define prompt config class
@@ -30,6 +35,11 @@ class PromptConfig:
         self.operation = operation
         self.item_type = self.sampler.get_members_type()
         self.is_fixed_shots = is_fixed_shots
+        # fixed k-shot examples and their rendered block, by operation
+        self._fixed_k_shots = None
+        self._k_shot_blocks = {}
+        # compiled prompt templates (see `get_prompt_template`)
+        self._templates = {}
 
     def __str__(self):
         return (
@@ -60,16 +70,42 @@ class PromptConfig:
             return self.getDynamicKShot()
 
     def getFixedKShot(self):
-        """Create K-shot examples that are fixed across examples"""
-        new_sampler = self.sampler
-        new_sampler.random_state = random.Random(13121)
-        return self._define_kshots(new_sampler)
+        """Create K-shot examples that are fixed across examples
+
+        They are sampled once, with a random state seeded with 13121, and
+        the sampler is then restored: sampling them does not change the
+        sets that the sampler draws next.
+        """
+        if self._fixed_k_shots is None:
+            sampler = self.sampler
+            random_state = sampler.random_state
+            state = copy.deepcopy(sampler.get_state())
+            sampler.random_state = random.Random(13121)
+            try:
+                self._fixed_k_shots = self._define_kshots(sampler)
+            finally:
+                sampler.random_state = random_state
+                sampler.set_state(state)
+        return list(self._fixed_k_shots)
 
     def getDynamicKShot(self):
         """Create K-shot examples that are dynamic across examples"""
         new_sampler = self.sampler
         return self._define_kshots(new_sampler)
 
+    def get_k_shot_block(self):
+        """Rendered k-shot examples of the prompt (see `make_k_shot`). The
+        block of fixed examples is rendered once per operation."""
+        if self.k_shot == 0:
+            return ""
+        if not self.is_fixed_shots:
+            return render_k_shot(self.operation, self.getDynamicKShot())
+        block = self._k_shot_blocks.get(self.operation)
+        if block is None:
+            block = render_k_shot(self.operation, self.getFixedKShot())
+            self._k_shot_blocks[self.operation] = block
+        return block
+
     # return as dictionary
     def to_dict(self):
         return {
@@ -344,26 +380,21 @@ def make_shot(operation, A, B):
     return shot + rest_of_shot
 
 
+def render_k_shot(operation, examples):
+    """Renders the k-shot block of the examples (pairs of sets)"""
+    return "".join(
+        [
+            PROMPT_KSHOT_BEGIN,
+            *(f"- {make_shot(operation, A, B)}\n" for A, B in examples),
+            PROMPT_KSHOT_END,
+        ]
+    )
+
+
 def make_k_shot(prompt_config: PromptConfig):
     """Creates k-examples based on the operation and two sets
     (range of numbers are n, and the number of members are m)"""
-    # return empty strings when k is 0
-    if prompt_config.k_shot == 0:
-        return ""
-
-    # create the Sampler for k-shots
-    k_shot_sampler = prompt_config.getKShot()
-
-    shots = []
-    for i in range(prompt_config.k_shot):
-        A, B = k_shot_sampler[i]
-        shots.append(make_shot(prompt_config.operation, A, B))
-    k_shot = PROMPT_KSHOT_BEGIN
-    if len(shots):
-        for s in shots:
-            k_shot += f"- {s}\n"
-    k_shot += PROMPT_KSHOT_END
-    return k_shot
+    return prompt_config.get_k_shot_block()
 
 
 def make_instruction_generator(experiment_type):
@@ -394,34 +425,99 @@ def is_correct(ground_truth, result):
     return list(sorted(ground_truth)) == list(sorted(result))
 
 
+class PromptTemplate:
+    """Prompt of a PromptConfig, compiled for a k-shot block and roles:
+    only the sets A and B are left to format."""
+
+    def __init__(
+        self, type, approach, operation, k_shot_block="", add_roles=False
+    ):
+        assert (
+            approach in PROMPT_TEMPLATES.keys()
+        ), f"the prompt approach of ({approach}) is not defined."
+        # Add model-specific preamble
+        preamble = "\n\nHuman: " if add_roles else ""
+        # Add model-specific ending
+        ending = "\n\nAssistant: " if add_roles else "\n\n"
+        self.head = f"{preamble}You are given two sets. Set A is ("
+        self.middle = "). Set B is ("
+        self.tail = "".join(
+            [
+                ").",
+                " You are given the following task:\n",
+                f"<task> {make_instruction_generator(type)(operation)} </task>",
+                k_shot_block,
+                # test different capabilities (thinking, CoT, etc.)
+                PROMPT_TEMPLATES[approach],
+                ending,
+                PROMPT_TEMPLATES_ENDING[approach],
+            ]
+        )
+
+    def render(self, A, B):
+        """returns the prompt for two sets"""
+        return "".join(
+            (
+                self.head,
+                ", ".join(map(str, A)),
+                self.middle,
+                ", ".join(map(str, B)),
+                self.tail,
+            )
+        )
+
+    def render_batch(self, pairs):
+        """returns the prompts for pairs of sets"""
+        head, middle, tail = self.head, self.middle, self.tail
+        join = ", ".join
+        return [
+            f"{head}{join(map(str, A))}{middle}{join(map(str, B))}{tail}"
+            for A, B in pairs
+        ]
+
+
+def get_prompt_template(prompt_config, add_roles=False):
+    """returns the compiled template of the prompts of a PromptConfig. With
+    fixed (or no) k-shot examples, it is compiled once."""
+    if prompt_config.k_shot and not prompt_config.is_fixed_shots:
+        # new examples for every prompt
+        return PromptTemplate(
+            prompt_config.type,
+            prompt_config.approach,
+            prompt_config.operation,
+            make_k_shot(prompt_config),
+            add_roles=add_roles,
+        )
+    key = (
+        prompt_config.type,
+        prompt_config.approach,
+        prompt_config.operation,
+        prompt_config.k_shot,
+        add_roles,
+    )
+    template = prompt_config._templates.get(key)
+    if template is None:
+        template = PromptTemplate(
+            prompt_config.type,
+            prompt_config.approach,
+            prompt_config.operation,
+            make_k_shot(prompt_config),
+            add_roles=add_roles,
+        )
+        prompt_config._templates[key] = template
+    return template
+
+
 def get_prompt(A, B, prompt_config, add_roles=False):
     """returns the prompt for the given instruction and two sets"""
-    assert (
-        prompt_config.approach in PROMPT_TEMPLATES.keys()
-    ), f"the prompt approach of ({prompt_config.approach}) is not defined."
-    A_str = ", ".join([str(a) for a in A])
-    B_str = ", ".join([str(b) for b in B])
-
-    # Add model-specific preamble
-    if add_roles:
-        prompt = "\n\nHuman: "
-    else:
-        prompt = ""
+    return get_prompt_template(prompt_config, add_roles).render(A, B)
 
-    # define the inputs and instruction
-    prompt += (
-        f"You are given two sets. Set A is ({A_str}). Set B is ({B_str})."
-    )
-    prompt += " You are given the following task:\n"
-    prompt += f"<task> {prompt_config.get_instruction()} </task>"
-    # add k-shot examples
-    prompt += make_k_shot(prompt_config)
-    # modify the prompt to test different capabilities (thinking, CoT, etc.)
-    prompt += PROMPT_TEMPLATES[prompt_config.approach]
-    # add model-specific ending
-    if add_roles:
-        prompt += f"\n\nAssistant: {PROMPT_TEMPLATES_ENDING[prompt_config.approach]}"
-    else:
-        prompt += f"\n\n{PROMPT_TEMPLATES_ENDING[prompt_config.approach]}"
 
-    return prompt
+def get_prompts(pairs, prompt_config, add_roles=False):
+    """returns the prompts for pairs of sets, as `get_prompt` would return
+    them one by one (dynamic k-shot examples are drawn for each pair)"""
+    if prompt_config.is_fixed_shots or not prompt_config.k_shot:
+        return get_prompt_template(prompt_config, add_roles).render_batch(
+            pairs
+        )
+    return [get_prompt(A, B, prompt_config, add_roles) for A, B in pairs]
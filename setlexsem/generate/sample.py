@@ -36,17 +36,23 @@ import warnings
 
 # FIXME make sampler for semantic collections of words.
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from operator import itemgetter
 from typing import List, Optional, Set, Union
 
-import nltk
-from nltk.corpus import wordnet as wn
-from nltk.corpus import words
+import numpy as np
 
 from setlexsem.constants import PATH_DATA_ROOT
-
-ENGLISH_WORDS = list(set(w.lower() for w in words.words()))
+from setlexsem.generate.vocabulary import (
+    WORDNET_PARTS_OF_SPEECH,
+    edit_distance,
+    get_deciles,
+    get_english_words,
+    get_hyponym_sets,
+    get_wordnet,
+)
+from setlexsem.generate.word_index import get_word_index
 
 LOGGER = logging.getLogger(__name__)
 
@@ -57,6 +63,13 @@ warnings.filterwarnings(
 )
 
 
+def __getattr__(name):
+    # `ENGLISH_WORDS` is loaded on first access (see `vocabulary`)
+    if name == "ENGLISH_WORDS":
+        return get_english_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def make_sampler_name_from_hps(sampler_hps):
     """
     Create a formatted string name for a sampler based on its
@@ -87,6 +100,39 @@ def make_sampler_name_from_hps(sampler_hps):
     return "_".join(components)
 
 
+def get_random_state(random_state):
+    """
+    Get the state of a random number generator as a JSON-serializable list.
+
+    Parameters
+    ----------
+    random_state : Random
+        Random number generator.
+
+    Returns
+    -------
+    list
+        The version, the internal state and the next Gaussian value.
+    """
+    version, internal_state, gauss_next = random_state.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def set_random_state(random_state, state):
+    """
+    Restore the state of a random number generator.
+
+    Parameters
+    ----------
+    random_state : Random
+        Random number generator.
+    state : list
+        State returned by `get_random_state`.
+    """
+    version, internal_state, gauss_next = state
+    random_state.setstate((version, tuple(internal_state), gauss_next))
+
+
 class Sampler:
     """
     Base class for samplers.
@@ -185,6 +231,28 @@ class Sampler:
             "overlap_fraction": self.get_overlap_fraction(),
         }
 
+    def get_state(self):
+        """
+        Get the state of the sampler, so that it can resume sampling later.
+
+        Returns
+        -------
+        dict
+            JSON-serializable state of the sampler.
+        """
+        return {"random_state": get_random_state(self.random_state)}
+
+    def set_state(self, state):
+        """
+        Restore a state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            State of the sampler.
+        """
+        set_random_state(self.random_state, state["random_state"])
+
     def get_decile_group(self):
         return None
 
@@ -253,6 +321,9 @@ class BasicWordSampler(Sampler):
         (satellite adjective), wn.ADV (adverb), wn.NOUN, or wn.VERB.
     random_state : Random, optional
         Random number generator.
+    word_index : WordIndex, optional
+        Precomputed index of `words` (the index of the English words is used
+        by default).
     """
 
     def __init__(
@@ -263,30 +334,40 @@ class BasicWordSampler(Sampler):
         item_len=None,
         pos: Optional[str] = None,
         random_state=None,
+        word_index=None,
     ):
         super().__init__(
             m_A, m_B, item_len=item_len, random_state=random_state
         )
 
-        words = ENGLISH_WORDS if not words else words
+        if not words:
+            words = get_english_words()
+            word_index = get_word_index("english", words)
 
         if pos:
-            wn_parts_of_speech = {
-                wn.ADJ,
-                wn.ADJ_SAT,
-                wn.ADV,
-                wn.NOUN,
-                wn.VERB,
-            }
-            if pos not in wn_parts_of_speech:
+            if pos not in WORDNET_PARTS_OF_SPEECH:
                 raise ValueError(
-                    f"'pos' must be one of {wn_parts_of_speech}, not '{pos}'."
+                    f"'pos' must be one of {WORDNET_PARTS_OF_SPEECH}, "
+                    f"not '{pos}'."
                 )
+
+        if self.item_len is not None:
+            assert self.item_len >= 1, "item_len should be greater than 0"
+
+        if word_index is not None:
+            # the words are already grouped by length and part of speech
+            self.possible_options = word_index.get(
+                item_len=self.item_len, pos=pos or None
+            )
+            return
+
+        if pos:
             LOGGER.debug(
                 f"Dictionary size before filtering by {pos} {len(words)}."
             )
             # Reduce dictionary to those lemmata with at least one synset
             # having the given part of speech.
+            wn = get_wordnet()
             words = [word for word in words if len(wn.synsets(word, pos=pos))]
             LOGGER.debug(
                 f"Dictionary size after filtering by {pos} {len(words)}."
@@ -295,7 +376,6 @@ class BasicWordSampler(Sampler):
         if self.item_len is None:
             self.possible_options = words
         else:
-            assert self.item_len >= 1, "item_len should be greater than 0"
             self.possible_options = filter_words(words, self.item_len)
 
     def __call__(self):
@@ -324,6 +404,100 @@ class BasicWordSampler(Sampler):
         return "words"
 
 
+def sample_unique_integers(rng, n_rows, m, low, high):
+    """
+    Sample rows of m distinct integers from [low, high).
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator.
+    n_rows : int
+        Number of rows to sample.
+    m : int
+        Number of distinct integers in each row.
+    low : int
+        Lowest integer (inclusive).
+    high : int
+        Highest integer (exclusive).
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array of shape (n_rows, m).
+    """
+    n_values = high - low
+    if m > n_values:
+        raise ValueError(
+            f"Cannot sample {m} distinct values out of {n_values}"
+        )
+    if n_values <= 8 * m:
+        # dense: the m smallest of n_values random keys are a random subset
+        keys = rng.random((n_rows, n_values))
+        return low + np.argpartition(keys, m - 1, axis=1)[:, :m]
+
+    # sparse: draw with replacement and redraw the rows with duplicates
+    rows = rng.integers(low, high, size=(n_rows, m))
+    while True:
+        sorted_rows = np.sort(rows, axis=1)
+        has_duplicates = (sorted_rows[:, 1:] == sorted_rows[:, :-1]).any(
+            axis=1
+        )
+        n_duplicates = int(has_duplicates.sum())
+        if not n_duplicates:
+            return rows
+        rows[has_duplicates] = rng.integers(low, high, size=(n_duplicates, m))
+
+
+class SetBatch:
+    """
+    Columnar batch of pairs of sets of numbers.
+
+    Parameters
+    ----------
+    A : numpy.ndarray
+        Integer array of shape (k, m_A), with one set A per row.
+    B : numpy.ndarray
+        Integer array of shape (k, m_B), with one set B per row.
+    """
+
+    def __init__(self, A, B):
+        assert len(A) == len(B), "A and B must have the same number of rows"
+        self.A = A
+        self.B = B
+
+    def __len__(self):
+        return len(self.A)
+
+    def __iter__(self):
+        """
+        Iterate over the pairs as Python sets.
+
+        Yields
+        ------
+        tuple of set
+            Sets A and B of each pair.
+        """
+        for A, B in zip(self.A.tolist(), self.B.tolist()):
+            yield set(A), set(B)
+
+    def to_dict(self):
+        """
+        Convert the batch to columns, as saved by `save_generated_sets`.
+
+        Returns
+        -------
+        dict
+            Run numbers and sets A and B, by column.
+        """
+        A, B = zip(*self) if len(self) else ((), ())
+        return {
+            "experiment_run": list(range(len(self))),
+            "A": list(A),
+            "B": list(B),
+        }
+
+
 class BasicNumberSampler(Sampler):
     """
     Sampler for numbers.
@@ -390,6 +564,30 @@ class BasicNumberSampler(Sampler):
         B = set(self.random_state.sample(self.possible_options, self.m_B))
         return A, B
 
+    def sample_batch(self, k):
+        """
+        Sample k pairs of sets of numbers at once.
+
+        The pairs are drawn with a NumPy generator seeded from `random_state`,
+        so they are reproducible but differ from k calls of the sampler.
+
+        Parameters
+        ----------
+        k : int
+            Number of pairs to sample.
+
+        Returns
+        -------
+        SetBatch
+            The k pairs of sets, as integer arrays.
+        """
+        rng = np.random.default_rng(self.random_state.getrandbits(64))
+        low = self.possible_options.start
+        high = self.possible_options.stop
+        A = sample_unique_integers(rng, k, self.m_A, low, high)
+        B = sample_unique_integers(rng, k, self.m_B, low, high)
+        return SetBatch(A, B)
+
     def get_members_type(self):
         """
         Get the type of members in the sampled sets.
@@ -421,7 +619,7 @@ class BasicNumberSampler(Sampler):
         dict
             Dictionary containing sampler parameters.
         """
-        return super().to_dict().update({"n": self.n})
+        return {**super().to_dict(), "n": self.n}
 
 
 class OverlapSampler(Sampler):
@@ -438,6 +636,15 @@ class OverlapSampler(Sampler):
         must also be in the larger set.
     overlap_n : int, optional
         Number of overlapping items.
+
+    Notes
+    -----
+    If the base sampler draws from a flat population of items (numbers or
+    words), the pairs are constructed directly: m_A + (m_B - overlap_n)
+    distinct items are drawn once, the first m_A make A, and B is overlap_n
+    items of A plus the remaining items. Otherwise (e.g., for sets of
+    hyponyms), pairs are drawn from the base sampler until one has the
+    overlap.
     """
 
     def __init__(
@@ -475,20 +682,113 @@ class OverlapSampler(Sampler):
                 )
         else:
             self.overlap_n = overlap_n
+            if self.overlap_n > m_small:
+                raise ValueError(
+                    f"overlap_n ({self.overlap_n}) should be at most the size "
+                    f"of the smaller set ({m_small})"
+                )
 
-        self.nonoverlap_n = max(
-            0,
-            (
-                m_large - self.overlap_n
-                if self.m_A <= self.m_B
-                else m_large - self.overlap_n - self.m_B
-            ),
-        )
+        # items of B that are not in A
+        self.nonoverlap_n = self.m_B - self.overlap_n
+
+    def get_population(self):
+        """
+        Get the items that the base sampler draws from.
+
+        Returns
+        -------
+        sequence or None
+            Distinct items (numbers or words), or None if the base sampler
+            does not draw items from a flat population.
+        """
+        if isinstance(self.sampler, (BasicNumberSampler, BasicWordSampler)):
+            return self.sampler.possible_options
+        return None
+
+    def check_population(self, population):
+        if self.m_A + self.nonoverlap_n > len(population):
+            raise StopIteration(
+                "Not enough possible options to make non-overlapping sets."
+                " Reduce the constraints or increase overlap fraction|n."
+            )
 
     def __call__(self):
         """
         Sample two sets with specified overlap.
 
+        Returns
+        -------
+        tuple of set
+            Two sets with specified overlap.
+
+        Raises
+        ------
+        StopIteration
+            If there are not enough items to make the sets (or, for base
+            samplers without a population, if unable to create sets with
+            specified overlap after 100 attempts).
+        """
+        population = self.get_population()
+        if population is None:
+            return self.sample_by_rejection()
+
+        self.check_population(population)
+        items = self.random_state.sample(
+            population, self.m_A + self.nonoverlap_n
+        )
+        A = items[: self.m_A]
+        B = self.random_state.sample(A, self.overlap_n) + items[self.m_A :]
+        return set(A), set(B)
+
+    def sample_batch(self, k):
+        """
+        Sample k pairs of sets with specified overlap at once.
+
+        The pairs are drawn with a NumPy generator seeded from `random_state`,
+        so they are reproducible but differ from k calls of the sampler.
+
+        Parameters
+        ----------
+        k : int
+            Number of pairs to sample.
+
+        Returns
+        -------
+        SetBatch
+            The k pairs of sets, as arrays.
+
+        Raises
+        ------
+        ValueError
+            If the base sampler does not draw from a flat population.
+        """
+        population = self.get_population()
+        if population is None:
+            raise ValueError(
+                f"{self.sampler.__class__.__name__} cannot sample in batches"
+            )
+        self.check_population(population)
+
+        rng = np.random.default_rng(self.random_state.getrandbits(64))
+        rows = sample_unique_integers(
+            rng, k, self.m_A + self.nonoverlap_n, 0, len(population)
+        )
+        A = rows[:, : self.m_A]
+        # a random subset of each A (argpartition does not shuffle A)
+        overlap = np.argsort(rng.random((k, self.m_A)), axis=1)
+        overlap = np.take_along_axis(A, overlap[:, : self.overlap_n], axis=1)
+        B = np.concatenate([overlap, rows[:, self.m_A :]], axis=1)
+
+        if isinstance(population, range):
+            start, step = population.start, population.step
+            return SetBatch(start + step * A, start + step * B)
+        population = np.asarray(population, dtype=object)
+        return SetBatch(population[A], population[B])
+
+    def sample_by_rejection(self):
+        """
+        Sample pairs from the base sampler until one has the overlap.
+
         Returns
         -------
         tuple of set
@@ -551,11 +851,37 @@ class OverlapSampler(Sampler):
     def get_overlap_fraction(self):
         return self.overlap_fraction
 
+    def get_state(self):
+        """
+        Get the state of the sampler and of its base sampler.
+
+        Returns
+        -------
+        dict
+            JSON-serializable state of the sampler.
+        """
+        state = super().get_state()
+        state["sampler"] = self.sampler.get_state()
+        return state
+
+    def set_state(self, state):
+        """
+        Restore a state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            State of the sampler.
+        """
+        super().set_state(state)
+        self.sampler.set_state(state["sampler"])
+
 
 def get_clean_hyponyms(
     random_state,
     save_json=0,
     filename=os.path.join(PATH_DATA_ROOT, "hyponyms.json"),
+    n_jobs=1,
 ):
     """
     Get a list of clean hyponyms and optionally save them to a JSON file.
@@ -569,14 +895,18 @@ def get_clean_hyponyms(
     filename : str, optional
         Path to save the JSON file. Default is "hyponyms.json" in
         PATH_DATA_ROOT.
+    n_jobs : int, optional
+        Number of processes that clean the hyponym sets. Default is 1.
 
     Returns
     -------
     list
         List of clean hyponym sets.
     """
-    hyperhypo = list(find_hypernyms_and_hyponyms())
-    clean_hyponyms = postprocess_hyponym_sets(hyperhypo, random_state)
+    hyperhypo = find_hypernyms_and_hyponyms()
+    clean_hyponyms = postprocess_hyponym_sets(
+        hyperhypo, random_state, n_jobs=n_jobs
+    )
 
     if save_json:
         with open(filename, "w") as f:
@@ -585,7 +915,7 @@ def get_clean_hyponyms(
     return clean_hyponyms
 
 
-def postprocess_hyponym_sets(hyperhypo, random_state):
+def postprocess_hyponym_sets(hyperhypo, random_state, n_jobs=1):
     """
     Process hyponym sets to clean and simplify the lexical forms.
 
@@ -594,37 +924,67 @@ def postprocess_hyponym_sets(hyperhypo, random_state):
     `Synset.lemma_names()`). Some lemma names are simple variations of each
     other. We aggressively filter them out.
 
+    Each hypernym gets its own random state, seeded by `random_state` and
+    its name, so the result does not depend on `n_jobs`.
+
     Parameters
     ----------
-    hyperhypo : list
-        List of hypernym-hyponym pairs.
+    hyperhypo : iterable
+        Hypernym-hyponym pairs.
     random_state : RandomState
         Random state for shuffling.
+    n_jobs : int, optional
+        Number of processes. Default is 1.
 
     Returns
     -------
     list
         Cleaned list of hyponym sets.
     """
+    seed = random_state.getrandbits(64)
+    # plain strings, so that the tasks are cheap to send to the processes
+    tasks = (
+        (
+            f"{seed}-{hyper.name()}",
+            [
+                hypo.lemma_names()
+                for hypo in sorted(hypolist, key=lambda hypo: hypo.name())
+            ],
+        )
+        for hyper, hypolist in hyperhypo
+    )
+    if n_jobs == 1:
+        return list(map(clean_hyponym_set, tasks))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(clean_hyponym_set, tasks, chunksize=256))
+
+
+def clean_hyponym_set(task):
+    """
+    Clean the lemma names of the hyponyms of one hypernym.
+
+    Parameters
+    ----------
+    task : tuple
+        Seed of the hypernym and the lemma names of each of its hyponyms.
+
+    Returns
+    -------
+    list
+        Clean hyponym set.
+    """
+    seed, hyponym_lemma_names = task
+    random_state = random.Random(seed)
     clean_hyponyms = []
-    for hyper, hypolist in hyperhypo:
-        clean_hyponyms.append([])
-        for hypo in hypolist:
-            # hypo is one synset of a hyponym associated with a particular
-            # hypernym
-            lemma_names = hypo.lemma_names()
-            # Remove lemmata with small edit distances between one another.
-            try:
-                lemma_names = remove_similar_lemmata(
-                    lemma_names, random_state
-                )
-                simple_lemma_names = list(
-                    filter(is_lemma_simple, lemma_names)
-                )
-                if len(simple_lemma_names):
-                    clean_hyponyms[-1].extend(simple_lemma_names)
-            except StopIteration:
-                pass
+    for lemma_names in hyponym_lemma_names:
+        # Remove lemmata with small edit distances between one another.
+        try:
+            lemma_names = remove_similar_lemmata(lemma_names, random_state)
+            simple_lemma_names = list(filter(is_lemma_simple, lemma_names))
+            if len(simple_lemma_names):
+                clean_hyponyms.extend(simple_lemma_names)
+        except StopIteration:
+            pass
     return clean_hyponyms
 
 
@@ -709,7 +1069,24 @@ class DeceptiveWordSampler(Sampler):
         max_set_size = max(self.m_A, self.m_B)
         f = partial(by_length, min_length=max_set_size)
         # filtered hyponyms
-        self.possible_options = list(filter(f, self.clean_hyponyms))
+        # copies, since the sets of the options are removed once sampled
+        self.possible_options = list(
+            map(list, filter(f, self.clean_hyponyms))
+        )
+        self.index_options()
+
+    def index_options(self):
+        """
+        Map each option to the first option equal to it.
+
+        `list.remove` removes the first equal option, so this tells which
+        option a draw removes without searching the list.
+        """
+        first_index = {}
+        self.first_equal_option = [
+            first_index.setdefault(tuple(options), i)
+            for i, options in enumerate(self.possible_options)
+        ]
 
     def __call__(self):
         """
@@ -721,15 +1098,22 @@ class DeceptiveWordSampler(Sampler):
             Two sets of sampled words.
         """
         if not self.with_replacement:
-            # When we're not using replacement, the selected set of words is
-            # removed from the set of options. So when we're not using
-            # replacement, make a defensive copy, so we don't end up with an
-            # empty list of options.
-            possible_options = list(self.possible_options)
+            # The set of words selected for A is not an option for B. Rather
+            # than removing it from a copy of the options, draw the index of
+            # B among the other options: the draws are the same.
+            n_options = len(self.possible_options)
+            if n_options < 2:
+                raise IndexError("Cannot choose from an empty sequence")
+            i = self.random_state.randrange(n_options)
+            A = self.shuffle_hyponyms(self.possible_options[i], self.m_A)
+            j = self.random_state.randrange(n_options - 1)
+            if j >= self.first_equal_option[i]:
+                j += 1
+            B = self.shuffle_hyponyms(self.possible_options[j], self.m_B)
         else:
             possible_options = self.possible_options
-        A = self.choose_hyponyms(possible_options, self.m_A)
-        B = self.choose_hyponyms(possible_options, self.m_B)
+            A = self.choose_hyponyms(possible_options, self.m_A)
+            B = self.choose_hyponyms(possible_options, self.m_B)
         if self.swap_set_elements:
             A, B = self.mix_sets(A, B, subset_size=self.swap_n)
         return A, B
@@ -745,12 +1129,10 @@ class DeceptiveWordSampler(Sampler):
 
         Returns
         -------
-        list
-            List of hyponym sets.
+        tuple of tuple of str
+            Hyponym sets, loaded once per process and shared (read-only).
         """
-        with open(filename) as f:
-            hyponyms = json.load(f)
-        return hyponyms
+        return get_hyponym_sets(filename)
 
     def choose_hyponyms(
         self, hyponyms, set_size, with_replacement=False, normalize=True
@@ -772,13 +1154,35 @@ class DeceptiveWordSampler(Sampler):
         set
             Set of chosen hyponyms.
         """
-        hyponym_list = list(self.random_state.choice(hyponyms))
+        if not hyponyms:
+            raise IndexError("Cannot choose from an empty sequence")
+        # the same draw as `random_state.choice`; the chosen set is removed
+        # by its index rather than by searching the list for an equal set
+        i = self.random_state.randrange(len(hyponyms))
+        hyponym_list = list(hyponyms[i])
         if not with_replacement:
-            hyponyms.remove(hyponym_list)
+            del hyponyms[i]
+        return self.shuffle_hyponyms(hyponym_list, set_size)
+
+    def shuffle_hyponyms(self, hyponyms, set_size):
+        """
+        Return a random subset of a set of hyponyms.
+
+        Parameters
+        ----------
+        hyponyms : list
+            Set of hyponyms (not modified).
+        set_size : int
+            Size of the subset.
+
+        Returns
+        -------
+        set
+            Random subset of the hyponyms.
+        """
+        hyponym_list = list(hyponyms)
         self.random_state.shuffle(hyponym_list)
-        prepared = hyponym_list[:set_size]
-        prepared = set(prepared)
-        return prepared
+        return set(hyponym_list[:set_size])
 
     def mix_sets(self, A, B, subset_size=None):
         """
@@ -840,6 +1244,51 @@ class DeceptiveWordSampler(Sampler):
     def get_subset_size(self):
         return self.subset_size
 
+    def get_state(self):
+        """
+        Get the state of the random number generators and, if the sampled
+        options are removed (`with_replacement`), the options left.
+
+        Returns
+        -------
+        dict
+            JSON-serializable state of the sampler.
+        """
+        state = super().get_state()
+        state["random_state_mix_sets"] = (
+            None
+            if self.random_state_mix_sets is None
+            else get_random_state(self.random_state_mix_sets)
+        )
+        if self.with_replacement:
+            # a copy: the next draws remove options from the list
+            state["possible_options"] = [
+                list(options) for options in self.possible_options
+            ]
+        return state
+
+    def set_state(self, state):
+        """
+        Restore a state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            State of the sampler.
+        """
+        super().set_state(state)
+        if state["random_state_mix_sets"] is not None:
+            if self.random_state_mix_sets is None:
+                self.random_state_mix_sets = random.Random()
+            set_random_state(
+                self.random_state_mix_sets, state["random_state_mix_sets"]
+            )
+        if "possible_options" in state:
+            self.possible_options = [
+                list(options) for options in state["possible_options"]
+            ]
+            self.index_options()
+
     def make_filename(self):
         """
         Create a string for the parameters of the generated data.
@@ -890,6 +1339,9 @@ class DecileWordSampler(BasicWordSampler):
             words=self.deciles,
             item_len=item_len,
             random_state=random_state,
+            word_index=get_word_index(
+                f"decile-{self.decile_num}", self.deciles
+            ),
         )
 
     def load_deciles(self):
@@ -898,12 +1350,11 @@ class DecileWordSampler(BasicWordSampler):
 
         Returns
         -------
-        dict
-            Dictionary of word frequency deciles.
+        Mapping of str to tuple of str
+            Word frequency deciles, loaded once per process and shared
+            (read-only).
         """
-        with open(f"{PATH_DATA_ROOT}/deciles.json", "rt") as fh:
-            deciles = json.load(fh)
-        return deciles
+        return get_deciles()
 
     def get_members_type(self):
         """
@@ -1033,14 +1484,16 @@ def remove_substring_lemmata(lemma_names):
         Filtered list of lemma names without substrings.
     """
     substring_lemmata = set()
-    # Ensure uniqueness and defensively copy.
-    lemma_names = list(set(lemma_names))
+    # Ensure uniqueness and defensively copy (in a fixed order, not in the
+    # order of the set, which changes with the hash seed).
+    lemma_names = sorted(set(lemma_names))
     # Sort by length, so lemma 2 is never a substring of lemma 1.
     lemma_names.sort(key=len)
     for i, lemma_name1 in enumerate(lemma_names):
-        for j, lemma_name2 in enumerate(lemma_names[i + 1 :]):  # noqa: E203
+        for lemma_name2 in lemma_names[i + 1 :]:  # noqa: E203
             if lemma_name1 in lemma_name2:
                 substring_lemmata.add(lemma_name1)
+                break
     lemma_names_without_substrings = [
         ln for ln in lemma_names if ln not in substring_lemmata
     ]
@@ -1068,12 +1521,88 @@ def make_edit_distance_queue(lemma_names):
     distances = defaultdict(list)
     for i, lemma_name1 in enumerate(lemma_names):
         for j, lemma_name2 in enumerate(lemma_names[i + 1 :]):  # noqa: E203
-            distance = nltk.edit_distance(lemma_name1, lemma_name2)
+            distance = edit_distance(lemma_name1, lemma_name2)
             distances[distance].append([lemma_name1, lemma_name2])
     queue = sorted(distances.items(), key=itemgetter(0))
     return queue
 
 
+def bounded_edit_distance(s1, s2, max_distance):
+    """
+    Levenshtein distance between two strings, if at most max_distance.
+
+    Same as `edit_distance` for distances up to max_distance, but stops as
+    soon as the distance is known to be larger.
+
+    Parameters
+    ----------
+    s1 : str
+        First string.
+    s2 : str
+        Second string.
+    max_distance : int
+        Largest distance of interest.
+
+    Returns
+    -------
+    int
+        Edit distance, or max_distance + 1 if it is larger than max_distance.
+    """
+    if abs(len(s1) - len(s2)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current = [i]
+        for j, c2 in enumerate(s2, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (c1 != c2),
+                )
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+def find_similar_lemmata(lemma_names, min_distance):
+    """
+    Find the pairs of lemmata closer than the minimum edit distance.
+
+    The edit distance of two lemmata is at least the difference of their
+    lengths, so it is only computed if that difference is small enough, and
+    only up to min_distance.
+
+    Parameters
+    ----------
+    lemma_names : list
+        List of lemma names.
+    min_distance : int
+        Minimum edit distance.
+
+    Returns
+    -------
+    dict
+        Edit distance of each pair (i, j) of lemmata, with i < j, such that
+        the distance is less than min_distance. The pairs are in the order of
+        `make_edit_distance_queue`.
+    """
+    distances = {}
+    for i, lemma_name1 in enumerate(lemma_names):
+        for j in range(i + 1, len(lemma_names)):
+            lemma_name2 = lemma_names[j]
+            if abs(len(lemma_name1) - len(lemma_name2)) >= min_distance:
+                continue
+            distance = bounded_edit_distance(
+                lemma_name1, lemma_name2, min_distance - 1
+            )
+            if distance < min_distance:
+                distances[i, j] = distance
+    return distances
+
+
 def remove_similar_lemmata(
     lemma_names, random_state, min_distance=3, max_iteration=4
 ):
@@ -1103,27 +1632,45 @@ def remove_similar_lemmata(
     """
     lemma_names = list(lemma_names)
     lemma_names = remove_substring_lemmata(lemma_names)
-    queue = make_edit_distance_queue(lemma_names)
+    # The distances do not change when a lemma is removed, so they are
+    # computed once, and only the pairs of the removed lemma are dropped.
+    # The draws are the same as with `make_edit_distance_queue`.
+    similar_pairs = find_similar_lemmata(lemma_names, min_distance)
+    removed = set()
     iteration = 0
-    while len(queue) and (queue[0][0] < min_distance):
+    while len(similar_pairs):
         if iteration > max_iteration:
             raise StopIteration()
 
         # Remove one lemma at random from the least edit-distance pairs.
+        least_distance = min(similar_pairs.values())
         # A random lemmata pair.
-        lemmata_pair = random_state.choice(queue[0][1])
+        lemmata_pair = random_state.choice(
+            [
+                pair
+                for pair, distance in similar_pairs.items()
+                if distance == least_distance
+            ]
+        )
         # A random lemma from the pair.
         lemma_to_remove = random_state.choice(lemmata_pair)
-        lemma_names.remove(lemma_to_remove)
-
-        queue = make_edit_distance_queue(lemma_names)
+        removed.add(lemma_to_remove)
+        similar_pairs = {
+            pair: distance
+            for pair, distance in similar_pairs.items()
+            if lemma_to_remove not in pair
+        }
 
         iteration += 1
 
-    return lemma_names
+    return [
+        lemma_name
+        for i, lemma_name in enumerate(lemma_names)
+        if i not in removed
+    ]
 
 
-def get_hyponyms(synset):
+def get_hyponyms(synset, memo=None):
     """
     Get all the hyponyms of this synset.
 
@@ -1131,39 +1678,50 @@ def get_hyponyms(synset):
     ----------
     synset : Synset
         The synset to get hyponyms for.
+    memo : dict, optional
+        Hyponyms of the synsets already visited. Share it between calls to
+        compute the hyponyms of each synset of the hierarchy only once.
 
     Returns
     -------
     set
-        Set of all hyponyms.
+        Set of all hyponyms. It is stored in `memo`: do not modify it.
     """
-    hyponyms = set()
+    if memo is None:
+        memo = {}
+    if synset in memo:
+        return memo[synset]
+    # guards against cycles in the hierarchy
+    memo[synset] = set()
+    hyponyms = set(synset.hyponyms())
     for hyponym in synset.hyponyms():
-        hyponyms |= set(get_hyponyms(hyponym))
-    return hyponyms | set(synset.hyponyms())
+        hyponyms |= get_hyponyms(hyponym, memo)
+    memo[synset] = hyponyms
+    return hyponyms
+
+
+# synsets whose hyponyms include themselves
+CYCLIC_HYPERNYMS = {"restrain.v.01", "inhibit.v.04"}
 
 
 def find_hypernyms_and_hyponyms():
     """
     Find hypernym-hyponym pairs, along with their distance.
 
+    The hyponyms of each synset are computed once, bottom-up, and reused
+    by all of its hypernyms.
+
     Yields
     ------
     tuple
         (hypernym, hyponyms) pairs.
     """
-    for synset in wn.all_synsets():
+    memo = {}
+    for synset in get_wordnet().all_synsets():
+        if synset.name() in CYCLIC_HYPERNYMS:
+            continue
         # Find all the hyponyms of this synset.
-        if f"{synset}" not in [
-            "Synset('restrain.v.01')",
-            "Synset('inhibit.v.04')",
-        ]:
-            hyponyms = get_hyponyms(synset)
-        # else:
-        #     warnings.warn(
-        #         f"Recursion error getting hyponyms of {synset}", UserWarning
-        #     )
-
+        hyponyms = get_hyponyms(synset, memo)
         if len(hyponyms):
             yield synset, hyponyms
 
@@ -1,12 +1,20 @@
 # coding: utf-8
 
+import ast
+import fcntl
+import hashlib
+import json
 import logging
+import numbers
 import os
+import shutil
+from contextlib import contextmanager
+from itertools import chain
 
 import pandas as pd
 
 from setlexsem.constants import PATH_DATA_ROOT
-from setlexsem.generate.sample import Sampler
+from setlexsem.generate.sample import Sampler, SetBatch
 from setlexsem.utils import get_data_filename
 
 # define the logger
@@ -14,6 +22,290 @@ logging.basicConfig()
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(level=logging.INFO)
 
+# formats of the generated data, in order of preference when loading
+DATA_FORMATS = ("parquet", "csv")
+
+# number of runs of the datasets that are not in the registry
+DEFAULT_NUM_RUNS_STORED = 10000
+
+REGISTRY_VERSION = 1
+REGISTRY_FILENAME = "registry.json"
+# sampling of the sets run by run, from the seeded sampler: the first k runs
+# of a dataset are the dataset of k runs (not so for batches or shards)
+SEQUENTIAL_SAMPLING = "sequential"
+
+
+def import_pyarrow():
+    """Import pyarrow, which is an optional dependency"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "The Parquet format requires pyarrow: "
+            "pip install 'setlexsem[parquet]'"
+        ) from e
+    return pyarrow
+
+
+def get_item_type(pa, sets):
+    """Get the Arrow type of the items from the first non-empty set (the
+    type reported by the sampler, e.g., "overlapping_BasicNumberSampler",
+    does not always say whether the items are numbers)"""
+    for items in sets:
+        for item in items:
+            if isinstance(item, numbers.Integral):
+                return pa.int64()
+            return pa.string()
+    return pa.string()
+
+
+def make_sets_table(df_data, sampler: Sampler, random_seed, num_runs):
+    """Make an Arrow table of the sets, with typed list columns for A and B
+    and the sampler parameters in the schema metadata"""
+    pa = import_pyarrow()
+    item_type = get_item_type(pa, chain(df_data["A"], df_data["B"]))
+    table = pa.table(
+        {
+            "experiment_run": pa.array(
+                df_data["experiment_run"], type=pa.int64()
+            ),
+            "A": pa.array(
+                [sorted(A) for A in df_data["A"]], type=pa.list_(item_type)
+            ),
+            "B": pa.array(
+                [sorted(B) for B in df_data["B"]], type=pa.list_(item_type)
+            ),
+        }
+    )
+    metadata = {
+        "sampler": sampler.to_dict(),
+        "random_seed": random_seed,
+        "num_runs": num_runs,
+    }
+    return table.replace_schema_metadata(
+        {"setlexsem": json.dumps(metadata, default=str)}
+    )
+
+
+def parse_set(raw_set):
+    """Parse the string representation of a set, e.g., "{1, 2}" """
+    content = raw_set[1:-1]
+    if raw_set[:1] == "{" and raw_set[-1:] == "}":
+        # sets of numbers are by far the most common: skip literal_eval
+        try:
+            return set(map(int, content.split(",")))
+        except ValueError:
+            pass
+    return ast.literal_eval(raw_set)
+
+
+def read_sets_csv(path_data, start=0, stop=None, chunksize=1000):
+    """Read the sets of a CSV file, chunk by chunk, as pairs of Python
+    sets"""
+    chunks = pd.read_csv(
+        path_data,
+        usecols=["A", "B"],
+        skiprows=range(1, start + 1),
+        nrows=None if stop is None else max(stop - start, 0),
+        chunksize=chunksize,
+    )
+    for chunk in chunks:
+        yield from zip(
+            map(parse_set, chunk["A"].tolist()),
+            map(parse_set, chunk["B"].tolist()),
+        )
+
+
+def read_sets_table(path_data, start=0, stop=None, chunksize=1000):
+    """Read the sets of a Parquet file, batch by batch, as pairs of Python
+    sets. Only the row groups from `start` on are read."""
+    pa = import_pyarrow()
+    parquet_file = pa.parquet.ParquetFile(path_data)
+    stop = parquet_file.metadata.num_rows if stop is None else stop
+
+    # skip the row groups before start
+    row_groups = []
+    first_row = 0
+    for i in range(parquet_file.num_row_groups):
+        num_rows = parquet_file.metadata.row_group(i).num_rows
+        if first_row + num_rows > start or row_groups:
+            row_groups.append(i)
+        else:
+            first_row += num_rows
+    if not row_groups:
+        return
+
+    row = first_row
+    batches = parquet_file.iter_batches(
+        batch_size=chunksize, row_groups=row_groups, columns=["A", "B"]
+    )
+    for batch in batches:
+        if row >= stop:
+            break
+        begin = max(start - row, 0)
+        end = min(stop - row, batch.num_rows)
+        row += batch.num_rows
+        if begin >= end:
+            continue
+        batch = batch.slice(begin, end - begin)
+        A_column = batch.column("A").to_pylist()
+        B_column = batch.column("B").to_pylist()
+        for A, B in zip(A_column, B_column):
+            yield set(A), set(B)
+
+
+def read_sets_metadata(path_data):
+    """Read the sampler parameters, seed and number of runs of a Parquet
+    file of sets"""
+    pa = import_pyarrow()
+    metadata = pa.parquet.read_schema(path_data).metadata or {}
+    return json.loads(metadata.get(b"setlexsem", b"{}"))
+
+
+def make_dataset_key(sampler: Sampler, random_seed):
+    """Canonical hash of the sampler parameters and the seed of a dataset"""
+    content = {
+        "sampler_class": type(sampler).__name__,
+        "sampler": sampler.to_dict(),
+        "name": sampler.make_filename(),
+        "random_seed": random_seed,
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def get_registry_path():
+    return os.path.join(PATH_DATA_ROOT, REGISTRY_FILENAME)
+
+
+def read_registry():
+    """Read the registry of generated datasets (empty if there is none)"""
+    path_registry = get_registry_path()
+    if os.path.exists(path_registry):
+        with open(path_registry, "r") as f:
+            registry = json.load(f)
+        if registry.get("version") == REGISTRY_VERSION:
+            return registry
+        LOGGER.warning(f"Ignoring the outdated registry at {path_registry}")
+    return {"version": REGISTRY_VERSION, "datasets": {}}
+
+
+@contextmanager
+def lock_registry():
+    """Hold an exclusive lock on the registry, across processes"""
+    path_registry = get_registry_path()
+    os.makedirs(os.path.dirname(path_registry), exist_ok=True)
+    with open(f"{path_registry}.lock", "w") as f_lock:
+        fcntl.flock(f_lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f_lock, fcntl.LOCK_UN)
+
+
+def write_registry(registry):
+    path_registry = get_registry_path()
+    os.makedirs(os.path.dirname(path_registry), exist_ok=True)
+    path_tmp = f"{path_registry}.{os.getpid()}.tmp"
+    with open(path_tmp, "w") as f:
+        json.dump(registry, f, indent=2, sort_keys=True)
+    os.replace(path_tmp, path_registry)
+
+
+def register_dataset(
+    sampler: Sampler,
+    random_seed,
+    path_data,
+    num_runs,
+    n_sets,
+    data_format,
+    sampling=SEQUENTIAL_SAMPLING,
+):
+    """Add a saved dataset to the registry, under the key of its sampler and
+    seed (see `make_dataset_key`). Paths are relative to the data root.
+
+    The registry is locked while it is read and rewritten, so that the
+    datasets saved by concurrent processes are all registered."""
+    key = make_dataset_key(sampler, random_seed)
+    path = os.path.relpath(path_data, PATH_DATA_ROOT)
+    with lock_registry():
+        registry = read_registry()
+        entries = [
+            entry
+            for entry in registry["datasets"].get(key, [])
+            if entry["path"] != path
+        ]
+        entries.append(
+            {
+                "path": path,
+                "data_format": data_format,
+                "num_runs": num_runs,
+                "n_sets": n_sets,
+                "sampling": sampling,
+                "sampler": sampler.to_dict(),
+                "random_seed": random_seed,
+            }
+        )
+        registry["datasets"][key] = entries
+        write_registry(registry)
+
+
+def can_serve(entry, num_runs):
+    """Whether a registered dataset has the first `num_runs` runs of the
+    dataset of `num_runs` runs (the whole dataset if num_runs is None)"""
+    if num_runs is None or entry["num_runs"] == num_runs:
+        return True
+    # a prefix is only the smaller dataset if no run was skipped
+    return (
+        entry["sampling"] == SEQUENTIAL_SAMPLING
+        and entry["n_sets"] == entry["num_runs"]
+        and entry["num_runs"] > num_runs
+    )
+
+
+def find_dataset(sampler: Sampler, random_seed, num_runs=None, sampling=None):
+    """Find a saved dataset of the sampler and seed in the registry.
+
+    A dataset of more runs, sampled sequentially, serves the smaller
+    datasets: its first `num_runs` rows. Sequential datasets are preferred,
+    then datasets with fewer runs (or, if `num_runs` is None, the dataset of
+    `DEFAULT_NUM_RUNS_STORED` runs, then the largest), then Parquet files
+    (see `DATA_FORMATS`). Entries whose file was removed are ignored.
+
+    Returns the registry entry (with the absolute `path` of the file), or
+    None if no saved dataset has the runs.
+    """
+    entries = read_registry()["datasets"].get(
+        make_dataset_key(sampler, random_seed), []
+    )
+    candidates = [
+        {**entry, "path": os.path.join(PATH_DATA_ROOT, entry["path"])}
+        for entry in entries
+        if (sampling is None or entry["sampling"] == sampling)
+        and can_serve(entry, num_runs)
+    ]
+    if num_runs is None:
+        # the full dataset, by default
+        get_size_rank = lambda entry: (
+            entry["num_runs"] != DEFAULT_NUM_RUNS_STORED,
+            -entry["num_runs"],
+        )
+    else:
+        get_size_rank = lambda entry: entry["num_runs"]
+    candidates.sort(
+        key=lambda entry: (
+            entry["sampling"] != SEQUENTIAL_SAMPLING,
+            get_size_rank(entry),
+            DATA_FORMATS.index(entry["data_format"]),
+        )
+    )
+    for entry in candidates:
+        if os.path.exists(entry["path"]):
+            return entry
+    return None
+
 
 def save_generated_sets(
     set_list,
@@ -22,14 +314,22 @@ def save_generated_sets(
     num_runs: int,
     overwrite=False,
     rename_sampler=None,
+    data_format="csv",
 ):
-    """Save generated data from the sampler"""
+    """Save generated data from the sampler, as CSV (sets as strings) or as
+    Parquet (sets as typed lists, see `make_sets_table`)"""
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"data_format must be one of {DATA_FORMATS}")
     # prepare filenames and check if the file exist
     filename = get_data_filename(
-        sampler.make_filename(), random_seed, num_runs
+        sampler.make_filename(), random_seed, num_runs, extension=data_format
     )
 
     # convert to dataframe
+    sampling = SEQUENTIAL_SAMPLING
+    if isinstance(set_list, SetBatch):
+        sampling = "batch"
+        set_list = set_list.to_dict()
     df_data = pd.DataFrame(set_list)
 
     # prepare folder structure
@@ -44,31 +344,192 @@ def save_generated_sets(
 
     # save data if it does not exist or we are overwriting
     if not os.path.exists(path_data) or overwrite:
-        df_data.to_csv(path_data, index=False)
+        write_sets_file(
+            df_data, path_data, data_format, sampler, random_seed, num_runs
+        )
+        register_dataset(
+            sampler,
+            random_seed,
+            path_data,
+            num_runs,
+            len(df_data),
+            data_format,
+            sampling=sampling,
+        )
         LOGGER.info(f"Saving results to {path_data}")
     else:
         LOGGER.info(f"Data already exists at {path_data}, skipping...")
 
 
-def load_generated_data(
-    sampler: Sampler, random_seed, num_runs_data_stored_at=10000
+def write_sets_file(
+    df_data, path_data, data_format, sampler, random_seed, num_runs
 ):
-    """Load generated data from the sampler as a generator iterator"""
-    # prepare filenames and check if the file exist
+    """Write the sets atomically, as CSV or Parquet"""
+    path_tmp = f"{path_data}.{os.getpid()}.tmp"
+    if data_format == "parquet":
+        table = make_sets_table(df_data, sampler, random_seed, num_runs)
+        import_pyarrow().parquet.write_table(table, path_tmp)
+    else:
+        df_data.to_csv(path_tmp, index=False)
+    os.replace(path_tmp, path_data)
+
+
+def save_generated_shards(
+    shards,
+    sampler: Sampler,
+    random_seed: int,
+    num_runs: int,
+    overwrite=False,
+    data_format="csv",
+):
+    """Save the shards of generated data, their manifest, and the merged
+    data (as `save_generated_sets` would save it)
+
+    Each shard is a dict with its `index`, `seed`, range of runs (`start`,
+    `stop`) and `sets` (as returned by `make_sets_from_sampler`). The shards
+    are written to a `.shards` folder next to the merged file, along with
+    `manifest.json`; the merged file is the concatenation of the shard
+    files, in the order of the manifest.
+    """
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"data_format must be one of {DATA_FORMATS}")
     filename = get_data_filename(
-        sampler.make_filename(), random_seed, num_runs_data_stored_at
+        sampler.make_filename(), random_seed, num_runs, extension=data_format
     )
+    path_save_folder = os.path.join(
+        PATH_DATA_ROOT, sampler.get_members_type()
+    )
+    path_data = os.path.join(path_save_folder, filename)
+    if os.path.exists(path_data) and not overwrite:
+        LOGGER.info(f"Data already exists at {path_data}, skipping...")
+        return
 
-    # prepare path to filename
-    path_data = os.path.join(
-        PATH_DATA_ROOT, sampler.get_members_type(), filename
+    path_shards = os.path.splitext(path_data)[0] + ".shards"
+    os.makedirs(path_shards, exist_ok=True)
+    manifest = {
+        "sampler": sampler.to_dict(),
+        "random_seed": random_seed,
+        "num_runs": num_runs,
+        "data_format": data_format,
+        "shards": [],
+    }
+    for shard in shards:
+        shard_filename = f"shard-{shard['index']:05d}.{data_format}"
+        write_sets_file(
+            pd.DataFrame(shard["sets"], columns=["experiment_run", "A", "B"]),
+            os.path.join(path_shards, shard_filename),
+            data_format,
+            sampler,
+            random_seed,
+            num_runs,
+        )
+        manifest["shards"].append(
+            {
+                "index": shard["index"],
+                "seed": shard["seed"],
+                "start": shard["start"],
+                "stop": shard["stop"],
+                "n_sets": len(shard["sets"]),
+                "path": shard_filename,
+            }
+        )
+    path_manifest = os.path.join(path_shards, "manifest.json")
+    with open(path_manifest + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(path_manifest + ".tmp", path_manifest)
+
+    merge_generated_shards(path_manifest, path_data, sampler)
+    register_dataset(
+        sampler,
+        random_seed,
+        path_data,
+        num_runs,
+        sum(shard["n_sets"] for shard in manifest["shards"]),
+        data_format,
+        sampling=f"shards-{len(manifest['shards'])}",
     )
+    LOGGER.info(f"Saving {len(shards)} shards and results to {path_data}")
 
-    # check if the file exists
-    if os.path.exists(path_data):
-        df_data = pd.read_csv(path_data)
-        generator = ((row["A"], row["B"]) for _, row in df_data.iterrows())
-        return iter(generator)
+
+def merge_generated_shards(path_manifest, path_data, sampler: Sampler):
+    """Concatenate the shard files of a manifest into one file"""
+    with open(path_manifest, "r") as f:
+        manifest = json.load(f)
+    path_shards = os.path.dirname(path_manifest)
+    paths = [
+        os.path.join(path_shards, shard["path"])
+        for shard in manifest["shards"]
+    ]
+    path_tmp = f"{path_data}.{os.getpid()}.tmp"
+    if manifest["data_format"] == "parquet":
+        pa = import_pyarrow()
+        table = pa.concat_tables(pa.parquet.read_table(p) for p in paths)
+        pa.parquet.write_table(table, path_tmp)
     else:
-        LOGGER.error(f"Data not found at {path_data}, skipping...")
-        return iter([])  # Return an empty iterator
+        # the shards have the same header: keep the first one
+        with open(path_tmp, "w") as f_out:
+            for i, path in enumerate(paths):
+                with open(path, "r") as f_in:
+                    header = f_in.readline()
+                    if i == 0:
+                        f_out.write(header)
+                    shutil.copyfileobj(f_in, f_out)
+    os.replace(path_tmp, path_data)
+
+
+def load_generated_data(
+    sampler: Sampler,
+    random_seed,
+    num_runs_data_stored_at=None,
+    start=0,
+    stop=None,
+    chunksize=1000,
+):
+    """Load generated data from the sampler as a generator iterator of pairs
+    of sets. The file is read in chunks, from run `start` (inclusive) to run
+    `stop` (exclusive), so that resumed or sharded runs can start mid-file.
+
+    The dataset is looked up in the registry (see `find_dataset`), so a
+    larger dataset serves the first `stop` runs. If it is not registered,
+    or if `num_runs_data_stored_at` is given, the file is found by its name
+    (by default, that of a dataset of `DEFAULT_NUM_RUNS_STORED` runs).
+    """
+    if num_runs_data_stored_at is None:
+        dataset = find_dataset(sampler, random_seed, num_runs=stop)
+        if dataset is not None:
+            read_sets = (
+                read_sets_table
+                if dataset["data_format"] == "parquet"
+                else read_sets_csv
+            )
+            return read_sets(
+                dataset["path"], start=start, stop=stop, chunksize=chunksize
+            )
+        num_runs_data_stored_at = DEFAULT_NUM_RUNS_STORED
+
+    for data_format in DATA_FORMATS:
+        # prepare filenames and check if the file exist
+        filename = get_data_filename(
+            sampler.make_filename(),
+            random_seed,
+            num_runs_data_stored_at,
+            extension=data_format,
+        )
+
+        # prepare path to filename
+        path_data = os.path.join(
+            PATH_DATA_ROOT, sampler.get_members_type(), filename
+        )
+
+        # check if the file exists
+        if not os.path.exists(path_data):
+            continue
+        read_sets = (
+            read_sets_table if data_format == "parquet" else read_sets_csv
+        )
+        return read_sets(
+            path_data, start=start, stop=stop, chunksize=chunksize
+        )
+
+    LOGGER.error(f"Data not found at {path_data}, skipping...")
+    return iter([])  # Return an empty iterator
@@ -0,0 +1,253 @@
+"""
+Corpora shared by the samplers and the prompts, loaded on first use.
+
+Importing NLTK (which imports SciPy) and lowercasing its ~235k English words
+takes seconds, so the generators do not do it at import time. The corpora are
+loaded the first time they are needed, and once per process. If the compiled
+vocabulary artifact exists (see `setlexsem.prepare.vocabulary_artifact`), the
+words are read from it instead of NLTK, and the hyponym groups and deciles
+too, unless their JSON file changed since the artifact was compiled.
+
+The hyponym groups and the deciles are also parsed once per process (and
+again only if their file changes), and shared, read-only, by the samplers.
+`get_load_counts` tells how many times each file was actually parsed.
+
+    >>> from setlexsem.generate.vocabulary import get_english_words
+    >>> english_words = get_english_words()  # loads NLTK words
+    >>> english_words is get_english_words()
+    True
+"""
+
+import json
+import logging
+import os
+from collections import Counter
+from functools import lru_cache
+from types import MappingProxyType
+
+from setlexsem.constants import PATH_DATA_ROOT
+from setlexsem.prepare.vocabulary_artifact import (
+    PATH_VOCABULARY_ARTIFACT,
+    VocabularyArtifact,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# WordNet part-of-speech tags: wn.ADJ, wn.ADJ_SAT, wn.ADV, wn.NOUN, wn.VERB
+WORDNET_PARTS_OF_SPEECH = {"a", "s", "r", "n", "v"}
+
+PATH_HYPONYMS = os.path.join(PATH_DATA_ROOT, "hyponyms.json")
+PATH_DECILES = os.path.join(PATH_DATA_ROOT, "deciles.json")
+
+# files loaded by this process: (path, part) -> (mtime, frozen content)
+_SHARED_FILES = {}
+# number of times each file was loaded, by (path, part)
+_LOAD_COUNTS = Counter()
+# stale JSON files already warned about: (path, mtime)
+_STALE_WARNINGS = set()
+
+
+def load_english_words_from_nltk():
+    """
+    Load the lowercase English words of NLTK.
+
+    Returns
+    -------
+    list of str
+        Sorted English words (sorted, so that the samples do not depend on
+        the hash seed).
+    """
+    from nltk.corpus import words
+
+    return sorted(set(w.lower() for w in words.words()))
+
+
+@lru_cache(maxsize=None)
+def get_vocabulary_artifact(path_artifact=PATH_VOCABULARY_ARTIFACT):
+    """
+    Get the compiled vocabulary artifact, memory-mapped once per process.
+
+    Returns
+    -------
+    VocabularyArtifact or None
+        The artifact, or None if it was not compiled (or is outdated).
+    """
+    if not os.path.exists(path_artifact):
+        return None
+    try:
+        return VocabularyArtifact(path_artifact)
+    except ValueError as e:
+        LOGGER.warning(f"Ignoring the vocabulary artifact: {e}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_english_words():
+    """
+    Get the lowercase English words of NLTK.
+
+    Returns
+    -------
+    list of str
+        Sorted English words. Do not modify it: it is shared.
+    """
+    artifact = get_vocabulary_artifact()
+    if artifact is not None:
+        return artifact.get_english_words()
+    return load_english_words_from_nltk()
+
+
+def get_wordnet():
+    """
+    Get the WordNet corpus reader of NLTK.
+
+    Returns
+    -------
+    LazyCorpusLoader
+        `nltk.corpus.wordnet`.
+    """
+    from nltk.corpus import wordnet
+
+    return wordnet
+
+
+def edit_distance(s1, s2):
+    """
+    Levenshtein distance between two strings (`nltk.edit_distance`).
+
+    Parameters
+    ----------
+    s1 : str
+        First string.
+    s2 : str
+        Second string.
+
+    Returns
+    -------
+    int
+        Edit distance.
+    """
+    from nltk import edit_distance
+
+    return edit_distance(s1, s2)
+
+
+def freeze(obj):
+    """Make a read-only copy of parsed JSON (lists become tuples)"""
+    if isinstance(obj, dict):
+        return MappingProxyType(
+            {key: freeze(val) for key, val in obj.items()}
+        )
+    if isinstance(obj, list):
+        return tuple(freeze(val) for val in obj)
+    return obj
+
+
+def read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_shared(path, load=read_json, part=None):
+    """
+    Load a file once per process, and again only if it was modified.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    load : callable, optional
+        Function that parses the file, given its path.
+    part : str, optional
+        Name of the part of the file that `load` returns, if it does not
+        return the whole file.
+
+    Returns
+    -------
+    object
+        Read-only content of the file (see `freeze`), shared by all callers.
+    """
+    key = (os.path.abspath(path), part)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _SHARED_FILES.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    LOGGER.debug(f"Loading {path}" + (f" ({part})" if part else ""))
+    content = freeze(load(path))
+    _SHARED_FILES[key] = (mtime, content)
+    _LOAD_COUNTS[key] += 1
+    return content
+
+
+def get_load_counts():
+    """
+    Get the number of times each shared file was loaded by this process.
+
+    Returns
+    -------
+    dict
+        Number of loads, by (absolute path, part). The part is None for
+        whole files.
+    """
+    return dict(_LOAD_COUNTS)
+
+
+def use_artifact(artifact, part, path):
+    """Whether to read a part of the artifact rather than its JSON file:
+    not if the file changed since the artifact was compiled."""
+    if artifact is None or not artifact.header[f"has_{part}"]:
+        return False
+    if artifact.is_source_fresh(part, path):
+        return True
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    if key not in _STALE_WARNINGS:
+        _STALE_WARNINGS.add(key)
+        LOGGER.warning(
+            f"{path} changed since {artifact.path} was compiled: reading "
+            "it instead (run scripts/make_vocabulary_artifact.py)"
+        )
+    return False
+
+
+def get_hyponym_sets(path=PATH_HYPONYMS):
+    """
+    Get the hyponym groups of `hyponyms.json` (or of the artifact).
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the JSON file of hyponym groups.
+
+    Returns
+    -------
+    tuple of tuple of str
+        Hyponym groups. They are shared: copy them before modifying them.
+    """
+    artifact = get_vocabulary_artifact()
+    if path == PATH_HYPONYMS and use_artifact(artifact, "hyponyms", path):
+        return load_shared(
+            artifact.path, lambda _: artifact.get_hyponyms(), part="hyponyms"
+        )
+    return load_shared(path)
+
+
+def get_deciles(path=PATH_DECILES):
+    """
+    Get the words of each decile of `deciles.json` (or of the artifact).
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the JSON file of deciles.
+
+    Returns
+    -------
+    Mapping of str to tuple of str
+        Words of each decile. They are shared and read-only.
+    """
+    artifact = get_vocabulary_artifact()
+    if path == PATH_DECILES and use_artifact(artifact, "deciles", path):
+        return load_shared(
+            artifact.path, lambda _: artifact.get_deciles(), part="deciles"
+        )
+    return load_shared(path)
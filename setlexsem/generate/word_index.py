@@ -0,0 +1,274 @@
+"""
+Index of the words that the word samplers draw from.
+
+Samplers of words filter a vocabulary by word length and, optionally, by
+WordNet part of speech. Filtering ~235k words (and looking up their synsets)
+for every sampler is slow, so the groups are computed once, saved next to the
+other caches and shared by all the samplers of a process.
+
+A saved index holds the positions of the words of each group in the
+vocabulary, as arrays in the layout of the vocabulary artifact (see
+`setlexsem.prepare.vocabulary_artifact`). It is memory-mapped, so the
+processes of a grid share its pages, and a group is only turned into words
+when a sampler asks for it.
+
+    >>> from setlexsem.generate.vocabulary import get_english_words
+    >>> from setlexsem.generate.word_index import get_word_index
+    >>> index = get_word_index("english", get_english_words())
+    >>> words_of_length_5 = index.get(item_len=5)
+
+The order of the words in each group is the order of the vocabulary, so the
+samplers draw the same words with or without the index.
+"""
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from setlexsem.constants import PATH_CACHE_ROOT
+from setlexsem.generate.vocabulary import get_wordnet
+from setlexsem.prepare.vocabulary_artifact import map_arrays, write_arrays
+
+LOGGER = logging.getLogger(__name__)
+
+WORD_INDEX_MAGIC = b"SLSWIDX\0"
+WORD_INDEX_VERSION = 2
+PATH_WORD_INDEX_ROOT = os.path.join(PATH_CACHE_ROOT, "word_index")
+
+# word indexes of this process, by name
+_WORD_INDEXES = {}
+
+
+def make_fingerprint(words):
+    """
+    Hash a vocabulary, so that an index is never used for other words.
+
+    Parameters
+    ----------
+    words : list of str
+        Vocabulary.
+
+    Returns
+    -------
+    str
+        Hex digest of the words, in order.
+    """
+    return hashlib.sha1("\n".join(words).encode("utf-8")).hexdigest()
+
+
+class WordIndex:
+    """
+    Words of a vocabulary grouped by length and by part of speech.
+
+    Groups by part of speech are computed (with WordNet) the first time they
+    are requested. New groups are saved to `path` if it is given.
+
+    Parameters
+    ----------
+    words : list of str
+        Vocabulary.
+    path : str, optional
+        File where the index is saved.
+    positions : dict, optional
+        Positions of the words of each group in `words`, as arrays by group
+        name ("length-<n>" or "pos-<tag>"), e.g., loaded from `path`.
+    """
+
+    def __init__(self, words, path=None, positions=None):
+        self.words = words
+        self.path = path
+        self.fingerprint = make_fingerprint(words)
+        if positions is None:
+            positions = self.group_by_length(words)
+        self.positions = positions
+        # words of the groups that were requested, by group name
+        self._groups = {}
+        self._filtered = {}
+
+    @staticmethod
+    def group_by_length(words):
+        by_length = {}
+        for i, word in enumerate(words):
+            by_length.setdefault(f"length-{len(word)}", []).append(i)
+        return {
+            name: np.array(group, dtype=np.int32)
+            for name, group in by_length.items()
+        }
+
+    @property
+    def max_length(self):
+        return max(
+            (
+                int(name[len("length-") :])
+                for name in self.positions
+                if name.startswith("length-")
+            ),
+            default=0,
+        )
+
+    def get_group(self, name):
+        """Get the words of a group (an empty list if there is no such
+        group)"""
+        if name not in self._groups:
+            words = self.words
+            positions = self.positions.get(name)
+            self._groups[name] = (
+                []
+                if positions is None
+                else [words[i] for i in positions.tolist()]
+            )
+        return self._groups[name]
+
+    def get_pos(self, pos):
+        """
+        Get the words with at least one synset of the part of speech.
+
+        Parameters
+        ----------
+        pos : str
+            A WordNet part-of-speech tag.
+
+        Returns
+        -------
+        list of str
+            Words of that part of speech.
+        """
+        name = f"pos-{pos}"
+        if name not in self.positions:
+            LOGGER.info(f"Indexing the words by part of speech: {pos}")
+            wn = get_wordnet()
+            self.positions[name] = np.array(
+                [
+                    i
+                    for i, word in enumerate(self.words)
+                    if len(wn.synsets(word, pos=pos))
+                ],
+                dtype=np.int32,
+            )
+            self.save()
+        return self.get_group(name)
+
+    def get(self, item_len=None, pos=None):
+        """
+        Get the words of a length and of a part of speech.
+
+        Parameters
+        ----------
+        item_len : int, optional
+            Length of the words.
+        pos : str, optional
+            A WordNet part-of-speech tag.
+
+        Returns
+        -------
+        list of str
+            Words in vocabulary order. Do not modify it: it is shared.
+
+        Raises
+        ------
+        AssertionError
+            If item_len is less than 1 or greater than the longest word.
+        """
+        if item_len is None:
+            return self.words if pos is None else self.get_pos(pos)
+
+        assert item_len >= 1, "N should be greater than 0"
+        assert item_len <= self.max_length, (
+            f"item_len (={item_len}) should be less than "
+            f"the length of the longest word ({self.max_length})"
+        )
+        if pos is None:
+            return self.get_group(f"length-{item_len}")
+
+        key = (item_len, pos)
+        if key not in self._filtered:
+            self._filtered[key] = [
+                word for word in self.get_pos(pos) if len(word) == item_len
+            ]
+        return self._filtered[key]
+
+    def save(self):
+        """Save the index atomically (if it has a path)"""
+        if self.path is None:
+            return
+        write_arrays(
+            self.path,
+            WORD_INDEX_MAGIC,
+            {"version": WORD_INDEX_VERSION, "fingerprint": self.fingerprint},
+            self.positions,
+        )
+
+    @classmethod
+    def load(cls, words, path):
+        """
+        Load (memory-map) the index of the words from `path`, or build and
+        save it.
+
+        Parameters
+        ----------
+        words : list of str
+            Vocabulary.
+        path : str
+            File of the index.
+
+        Returns
+        -------
+        WordIndex
+            Index of the words.
+        """
+        fingerprint = make_fingerprint(words)
+        if os.path.exists(path):
+            try:
+                header, arrays = map_arrays(
+                    path, WORD_INDEX_MAGIC, "word index"
+                )
+            except ValueError:
+                header, arrays = {}, {}
+            if (
+                header.get("version") == WORD_INDEX_VERSION
+                and header.get("fingerprint") == fingerprint
+            ):
+                return cls(words, path=path, positions=arrays)
+            LOGGER.info(f"Rebuilding the outdated word index at {path}")
+
+        index = cls(words, path=path)
+        index.save()
+        return index
+
+
+def get_word_index(name, words, path_root=""):
+    """
+    Get the index of a vocabulary, loaded once per process.
+
+    Parameters
+    ----------
+    name : str
+        Name of the vocabulary (e.g., "english" or "decile-3").
+    words : list of str
+        Vocabulary.
+    path_root : str, optional
+        Folder of the saved indexes (by default, `PATH_WORD_INDEX_ROOT`).
+        None to keep the index in memory.
+
+    Returns
+    -------
+    WordIndex
+        Index of the words.
+    """
+    if path_root == "":
+        path_root = PATH_WORD_INDEX_ROOT
+    index = _WORD_INDEXES.get(name)
+    if index is None or index.words is not words:
+        if index is not None and index.fingerprint == make_fingerprint(words):
+            # same vocabulary, loaded again
+            return index
+        if path_root is None:
+            index = WordIndex(words)
+        else:
+            index = WordIndex.load(
+                words, os.path.join(path_root, f"{name}.idx")
+            )
+        _WORD_INDEXES[name] = index
+    return index
@@ -1,10 +1,21 @@
-import glob
+"""
+Streaming ingestion of the English unigrams of the Google Books Ngram corpus.
+
+Each letter file is decompressed as it is downloaded (or read, if `source`
+is a local folder), filtered by year and count, and aggregated into counts
+per term, in one pass and without temporary files. The letter files are
+processed in parallel, and the counts are written as a frequency table: one
+`term<TAB>count` line per term, sorted by term.
+"""
+
 import gzip
 import logging
 import os
-import shutil
-import tempfile
+import string
 import urllib.request
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 # Set up logging
 logging.basicConfig(
@@ -12,79 +23,210 @@ logging.basicConfig(
 )
 LOGGER = logging.getLogger(__name__)
 
-
-def download_files(language, output_dir):
-    domain = "http://storage.googleapis.com"
-    path = "books/ngrams/books"
-    baseurl = f"{domain}/{path}/googlebooks-{language}-all-1gram-20120701"
-
-    for char in range(ord("a"), ord("z") + 1):
-        url = f"{baseurl}-{chr(char)}.gz"
-        filename = os.path.join(output_dir, os.path.basename(url))
-        urllib.request.urlretrieve(url, filename)
-
-
-def filter_file(
-    gzip_path, start_year, end_year, min_word_count, min_book_count
+GOOGLE_NGRAMS_URL = "http://storage.googleapis.com/books/ngrams/books"
+
+
+def get_unigram_paths(source, language="eng", letters=string.ascii_lowercase):
+    """
+    Get the URLs (or paths) of the unigram files, one per letter.
+
+    Parameters
+    ----------
+    source : str
+        Base URL of the corpus, or a local folder with the same file names.
+    language : str, optional
+        Language of the corpus.
+    letters : str, optional
+        First letters of the files.
+
+    Returns
+    -------
+    list of str
+        URLs or paths of the gzip files.
+    """
+    return [
+        f"{source.rstrip('/')}/googlebooks-{language}-all-1gram-20120701-"
+        f"{letter}.gz"
+        for letter in letters
+    ]
+
+
+def open_source(path):
+    """Open a URL or a local file for reading bytes"""
+    if "://" in path:
+        return urllib.request.urlopen(path)
+    return open(path, "rb")
+
+
+def count_terms(
+    path,
+    start_year,
+    end_year,
+    min_word_count,
+    min_book_count,
+    words=None,
 ):
-    output_path = gzip_path.replace(".gz", ".filtered")
-    with gzip.open(gzip_path, "rt") as f_in, open(output_path, "w") as f_out:
+    """
+    Sum the counts of each term of a unigram file over the years.
+
+    Parameters
+    ----------
+    path : str
+        URL or path of a gzip unigram file.
+    start_year : int
+        First year to count.
+    end_year : int
+        Last year to count.
+    min_word_count : int
+        Minimum number of occurrences in a year.
+    min_book_count : int
+        Minimum number of books in a year.
+    words : set of str, optional
+        Only count these terms.
+
+    Returns
+    -------
+    Counter
+        Number of occurrences of each term.
+    """
+    counts = Counter()
+    with open_source(path) as f_raw, gzip.open(
+        f_raw, "rt", encoding="utf-8"
+    ) as f_in:
         for line in f_in:
             parts = line.split()
-            if len(parts) >= 4:
-                year, word_count, book_count = map(int, parts[1:4])
-                if (
-                    start_year <= year <= end_year
-                    and word_count >= min_word_count
-                    and book_count >= min_book_count
-                ):
-                    f_out.write(line)
-
-
-def make_term_frequencies_file(output_path="frequencies.txt"):
-    language = "eng"
-    start_year = 2008
-    end_year = 2008
-    min_word_count = 1
-    min_book_count = 1
-
-    with tempfile.TemporaryDirectory() as tempdir:
-        LOGGER.info(
-            f"Downloading Google Books Ngram corpus files to {tempdir}..."
-        )
-        download_files(language, tempdir)
-        LOGGER.info("... done")
-
-        LOGGER.info("Filtering terms in downloaded files...")
-        for gzip_path in glob.glob(os.path.join(tempdir, "*.gz")):
-            LOGGER.info(f"    => {gzip_path}")
-            filter_file(
-                gzip_path,
-                start_year,
-                end_year,
-                min_word_count,
-                min_book_count,
-            )
-        LOGGER.info("... done")
-
-        LOGGER.info("Writing frequencies.txt to current directory...")
-        with open("frequencies.txt", "wb") as output_path:
-            for filtered_file in glob.glob(
-                os.path.join(tempdir, "*.filtered")
+            if len(parts) < 4:
+                continue
+            term = parts[0]
+            if words is not None and term not in words:
+                continue
+            year, word_count, book_count = map(int, parts[1:4])
+            if (
+                start_year <= year <= end_year
+                and word_count >= min_word_count
+                and book_count >= min_book_count
             ):
-                with open(filtered_file, "rb") as infile:
-                    shutil.copyfileobj(infile, output_path)
-        LOGGER.info("... done")
-
-    LOGGER.info(f"Temporary directory {tempdir} has been deleted.")
-
-
-def get_term_frequencies(term_frequency_output_path="frequencies.txt"):
-    make_term_frequencies_file(output_path=term_frequency_output_path)
-    with open(term_frequency_output_path, "rt") as fh:
-        # The frequencies.txt file is about 140MB in memory.
-        term_frequencies = [line.strip() for line in fh.readlines()]
-        return term_frequencies
+                counts[term] += word_count
+    LOGGER.info(f"    => {path} ({len(counts)} terms)")
+    return counts
+
+
+def write_frequency_table(counts, output_path):
+    """
+    Write term counts as a frequency table, atomically.
+
+    Parameters
+    ----------
+    counts : dict
+        Number of occurrences of each term.
+    output_path : str
+        Path of the table.
+    """
+    path_tmp = f"{output_path}.{os.getpid()}.tmp"
+    with open(path_tmp, "w", encoding="utf-8") as f:
+        for term in sorted(counts):
+            f.write(f"{term}\t{counts[term]}\n")
+    os.replace(path_tmp, output_path)
+
+
+def read_frequency_table(path, words=None):
+    """
+    Read a frequency table.
+
+    Parameters
+    ----------
+    path : str
+        Path of the table.
+    words : set of str, optional
+        Only read these terms.
+
+    Returns
+    -------
+    dict
+        Number of occurrences of each term.
+    """
+    counts = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            term, count = line.rstrip("\n").split("\t")
+            if words is None or term in words:
+                counts[term] = int(count)
+    return counts
+
+
+def make_term_frequencies_file(
+    output_path="frequencies.tsv",
+    source=GOOGLE_NGRAMS_URL,
+    words=None,
+    n_jobs=None,
+    language="eng",
+    letters=string.ascii_lowercase,
+    start_year=2008,
+    end_year=2008,
+    min_word_count=1,
+    min_book_count=1,
+):
+    """
+    Count the terms of the unigram files and write the frequency table.
+
+    Parameters
+    ----------
+    output_path : str, optional
+        Path of the frequency table.
+    source : str, optional
+        Base URL of the corpus, or a local folder with the same file names.
+    words : set of str, optional
+        Only count these terms (e.g., the NLTK English words).
+    n_jobs : int, optional
+        Number of files processed at once. Default is the number of CPUs.
+    language : str, optional
+        Language of the corpus.
+    letters : str, optional
+        First letters of the files to process.
+    start_year, end_year : int, optional
+        Years to count.
+    min_word_count, min_book_count : int, optional
+        Minimum numbers of occurrences and of books in a year.
+
+    Returns
+    -------
+    Counter
+        Number of occurrences of each term.
+    """
+    paths = get_unigram_paths(source, language=language, letters=letters)
+    count = partial(
+        count_terms,
+        start_year=start_year,
+        end_year=end_year,
+        min_word_count=min_word_count,
+        min_book_count=min_book_count,
+        words=words,
+    )
+
+    LOGGER.info(f"Counting terms in {len(paths)} files of {source}...")
+    counts = Counter()
+    if n_jobs == 1:
+        for file_counts in map(count, paths):
+            counts.update(file_counts)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for file_counts in executor.map(count, paths):
+                counts.update(file_counts)
+    LOGGER.info("... done")
+
+    LOGGER.info(f"Writing {len(counts)} term frequencies to {output_path}...")
+    write_frequency_table(counts, output_path)
+    LOGGER.info("... done")
+    return counts
+
+
+def get_term_frequencies(
+    term_frequency_output_path="frequencies.tsv", **kwargs
+):
+    """Make the frequency table (see `make_term_frequencies_file`)"""
+    return make_term_frequencies_file(
+        output_path=term_frequency_output_path, **kwargs
+    )
 
 
 if __name__ == "__main__":
@@ -1,27 +1,63 @@
 """
 Helper functions for partitioning words according to their frequencies. See
 uses of these functions in `scripts/make_percentiles.py`.
+
+The words and their counts are held as aligned NumPy arrays, so that the
+partitions for several k (e.g., deciles and quintiles) are computed from a
+single load of the frequency table.
 """
 
+import csv
 import math
 from collections import defaultdict
 from operator import itemgetter
-from typing import Set
+from typing import Iterable, Set
 
 import numpy as np
+import pandas as pd
 
 
 def get_counts_dict_from_google_books(words: Set[str], ngram_path: str):
-    """Get a dictionary mapping words to their frequencies."""
+    """Get a dictionary mapping words to their frequencies. The file is
+    either a frequency table (`term<TAB>count`, see
+    `setlexsem.prepare.download`) or filtered Google Books Ngram lines."""
     words_to_counts = {}
     with open(ngram_path, "rt") as fh:
         for line in fh:
-            token, year, count, num_books = line.split()
+            parts = line.split()
+            if len(parts) == 2:
+                token, count = parts
+            else:
+                token, year, count, num_books = parts
             if token in words:
                 words_to_counts[token] = int(count)
     return words_to_counts
 
 
+def get_counts_from_google_books(words: Set[str], ngram_path: str):
+    """Same as `get_counts_dict_from_google_books`, but read with pandas and
+    returned as aligned arrays of words and counts (in the order of the
+    dictionary)."""
+    df = pd.read_csv(
+        ngram_path,
+        sep="\t",
+        header=None,
+        dtype=str,
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE,
+    )
+    # frequency table (term, count) or n-grams (term, year, count, books)
+    df = df[[0, 1 if df.shape[1] == 2 else 2]]
+    df.columns = ["word", "count"]
+    df = df[df["word"].isin(words)]
+    # as in a dictionary: the first position and the last count of a word
+    df = df.groupby("word", sort=False)["count"].last()
+    return (
+        df.index.to_numpy(dtype=object),
+        df.to_numpy().astype(np.int64),
+    )
+
+
 def remove_outliers(words_to_counts, to_remove=50):
     word_count_items = list(words_to_counts.items())
     # Sort in ascending order according to the second item (zero-indexed).
@@ -43,22 +79,77 @@ def normalize_counts(words_to_counts):
         words_to_counts[word] /= max_count
 
 
-def make_percentiles(words_to_counts, k, remove_outliers=False):
-    partition = defaultdict(list)
+def normalize_log_counts(counts):
+    """Vectorized `normalize_counts`: (log(count) - min) / max, where min
+    and max are those of the log counts."""
+    log_counts = np.log(np.asarray(counts, dtype=np.float64))
+    return (log_counts - log_counts.min()) / log_counts.max()
 
-    if remove_outliers:
-        # Remove the 50 most frequent words.
-        words_to_counts = remove_outliers(words_to_counts)
-    # Normalize counts to [0, 1].
-    normalize_counts(words_to_counts)
 
+def partition_by_bins(words, values, k):
+    """Partition words by the k-percentile bin of their values in [0, 1].
+    The bins are in order of first appearance and the words keep their
+    order, as in `make_percentiles`."""
     step_size = k / 100
     bins = np.arange(0, 1, step_size)
-    assignments = np.digitize(
-        list(words_to_counts.values()), bins, right=False
+    assignments = np.digitize(values, bins, right=False)
+    # group the words by bin, keeping their order within each bin
+    order = np.argsort(assignments, kind="stable")
+    bin_ids, starts = np.unique(assignments[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    # bins in order of their first word
+    by_first_word = np.argsort(order[starts])
+    return {
+        int(bin_ids[i]): words[order[starts[i] : ends[i]]].tolist()
+        for i in by_first_word.tolist()
+    }
+
+
+def make_percentile_partitions(
+    words, counts, ks: Iterable[int], remove_outliers=False, to_remove=50
+):
+    """
+    Partition words into k-percentiles of their normalized log counts, for
+    several k at once.
+
+    Parameters
+    ----------
+    words : array-like of str
+        Words.
+    counts : array-like of int
+        Count of each word (aligned with `words`).
+    ks : iterable of int
+        The k-th percentiles to make (1 is percentile, 10 is decile, etc.).
+    remove_outliers : bool, optional
+        Whether to remove the `to_remove` most frequent words first.
+    to_remove : int, optional
+        Number of outliers to remove.
+
+    Returns
+    -------
+    dict
+        Partition (bin -> list of words) of each k, as `make_percentiles`
+        would return it.
+    """
+    words = np.asarray(words, dtype=object)
+    counts = np.asarray(counts, dtype=np.int64)
+    if remove_outliers:
+        # as `remove_outliers`: sorted by count, without the most frequent
+        order = np.argsort(counts, kind="stable")
+        order = order[: max(len(order) - to_remove, 0)]
+        words, counts = words[order], counts[order]
+    values = normalize_log_counts(counts)
+    return {k: partition_by_bins(words, values, k) for k in ks}
+
+
+def make_percentiles(words_to_counts, k, remove_outliers=False):
+    partition = defaultdict(list)
+    partition.update(
+        make_percentile_partitions(
+            list(words_to_counts.keys()),
+            list(words_to_counts.values()),
+            [k],
+            remove_outliers=remove_outliers,
+        )[k]
     )
-    assignments = assignments.tolist()
-    words_to_bins = dict(zip(words_to_counts.keys(), assignments))
-    for word, assignment in words_to_bins.items():
-        partition[assignment].append(word)
     return partition
@@ -0,0 +1,336 @@
+"""
+Compiled vocabulary artifact for the word samplers. See
+`scripts/make_vocabulary_artifact.py`.
+
+The artifact is a single binary file holding the English words of NLTK, the
+frequency deciles (`deciles.json`) and the hyponym groups (`hyponyms.json`).
+Every string is stored once, in a string table, and the collections are
+arrays of integer ids into it:
+
+    magic (8 bytes) | header length (uint64) | JSON header | arrays
+
+The header has the version of the format, the dtype, shape and offset of
+each array, and the size, mtime and hash of the JSON files the groups were
+compiled from, so that the samplers can tell when the artifact is stale. The
+file is memory-mapped, so loading it takes milliseconds and the worker
+processes of a grid share its pages. `write_arrays` and `map_arrays` write and
+map files of this layout (the word indexes use it too).
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from setlexsem.constants import PATH_DATA_ROOT
+
+VOCABULARY_ARTIFACT_MAGIC = b"SLSVOCAB"
+VOCABULARY_ARTIFACT_VERSION = 2
+PATH_VOCABULARY_ARTIFACT = os.path.join(PATH_DATA_ROOT, "vocabulary.bin")
+
+# arrays are aligned, so that they can be viewed without copies
+ALIGNMENT = 8
+
+
+class StringTable:
+    """Interns strings: each distinct string gets one integer id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, strings):
+        ids = []
+        for string in strings:
+            if "\n" in string:
+                raise ValueError(f"Cannot store a newline: {string!r}")
+            if string not in self.ids:
+                self.ids[string] = len(self.strings)
+                self.strings.append(string)
+            ids.append(self.ids[string])
+        return np.array(ids, dtype=np.int32)
+
+
+def flatten_groups(table, groups):
+    """Return the ids of the concatenated groups and the group offsets"""
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(group) for group in groups])
+    ids = [table.intern(group) for group in groups]
+    return (
+        np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32),
+        offsets,
+    )
+
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def describe_source(path):
+    """Size, mtime and hash of a source file of the artifact"""
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": hash_file(path),
+    }
+
+
+def write_arrays(path, magic, header, arrays):
+    """
+    Write a JSON header and arrays to `path` (atomically).
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to write.
+    magic : bytes
+        First 8 bytes of the file.
+    header : dict
+        JSON-serializable header. The dtype, shape and offset of each array
+        are added to it, under "arrays".
+    arrays : dict
+        numpy arrays, by name.
+    """
+    header = dict(header, arrays={})
+    # offsets are relative to the end of the header
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % ALIGNMENT)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    path_tmp = f"{path}.{os.getpid()}.tmp"
+    with open(path_tmp, "wb") as f:
+        f.write(magic)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for array in arrays.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGNMENT))
+    os.replace(path_tmp, path)
+
+
+def map_arrays(path, magic, description):
+    """
+    Memory-map a file written by `write_arrays`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    magic : bytes
+        Expected first 8 bytes of the file.
+    description : str
+        What the file is, for the error message.
+
+    Returns
+    -------
+    tuple of dict
+        The header, and read-only views of the arrays by name.
+
+    Raises
+    ------
+    ValueError
+        If the file does not start with `magic`.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    magic_length = len(magic)
+    if bytes(buffer[:magic_length]) != magic:
+        raise ValueError(f"Not a {description}: {path}")
+    header_length = int(
+        buffer[magic_length : magic_length + 8].view(np.uint64)[0]
+    )
+    data_start = magic_length + 8 + header_length
+    header = json.loads(bytes(buffer[magic_length + 8 : data_start]))
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        start = data_start + spec["offset"]
+        arrays[name] = buffer[start : start + count * dtype.itemsize].view(
+            dtype
+        )
+    return header, arrays
+
+
+def compile_vocabulary_artifact(
+    path_artifact, english_words, deciles=None, hyponyms=None, sources=None
+):
+    """
+    Compile the vocabulary, deciles and hyponym groups into one artifact.
+
+    Parameters
+    ----------
+    path_artifact : str
+        Path of the artifact to write.
+    english_words : list of str
+        English words, in sampling order.
+    deciles : dict, optional
+        Words of each decile, as in `deciles.json`.
+    hyponyms : list of list of str, optional
+        Hyponym groups, as in `hyponyms.json`.
+    sources : dict, optional
+        Paths of the files of the groups, by name ("deciles", "hyponyms").
+    """
+    table = StringTable()
+    decile_names = list(deciles or {})
+    arrays = {"english": table.intern(english_words)}
+    arrays["decile_words"], arrays["decile_offsets"] = flatten_groups(
+        table, [deciles[name] for name in decile_names]
+    )
+    arrays["hyponym_words"], arrays["hyponym_offsets"] = flatten_groups(
+        table, hyponyms or []
+    )
+    arrays["strings"] = np.frombuffer(
+        "\n".join(table.strings).encode("utf-8"), dtype=np.uint8
+    )
+
+    header = {
+        "version": VOCABULARY_ARTIFACT_VERSION,
+        "n_strings": len(table.strings),
+        "deciles": decile_names,
+        "has_deciles": deciles is not None,
+        "has_hyponyms": hyponyms is not None,
+        "sources": {
+            name: describe_source(path)
+            for name, path in (sources or {}).items()
+        },
+    }
+    write_arrays(path_artifact, VOCABULARY_ARTIFACT_MAGIC, header, arrays)
+
+
+class VocabularyArtifact:
+    """
+    Read-only, memory-mapped view of a compiled vocabulary artifact.
+
+    Parameters
+    ----------
+    path_artifact : str
+        Path of the artifact.
+
+    Raises
+    ------
+    ValueError
+        If the file is not an artifact of the current version.
+    """
+
+    def __init__(self, path_artifact=PATH_VOCABULARY_ARTIFACT):
+        self.path = path_artifact
+        self.header, self.arrays = map_arrays(
+            path_artifact, VOCABULARY_ARTIFACT_MAGIC, "vocabulary artifact"
+        )
+        if self.header["version"] != VOCABULARY_ARTIFACT_VERSION:
+            raise ValueError(
+                f"Vocabulary artifact version {self.header['version']} is "
+                f"not {VOCABULARY_ARTIFACT_VERSION}: {path_artifact}"
+            )
+        self._strings = None
+        # freshness of the source files, by (name, size, mtime)
+        self._fresh = {}
+
+    @property
+    def strings(self):
+        """The string table (decoded on first use)"""
+        if self._strings is None:
+            data = self.arrays["strings"].tobytes().decode("utf-8")
+            self._strings = data.split("\n") if data else []
+        return self._strings
+
+    def get_words(self, ids):
+        strings = self.strings
+        return [strings[i] for i in ids.tolist()]
+
+    def get_groups(self, name):
+        words = self.arrays[f"{name}_words"]
+        offsets = self.arrays[f"{name}_offsets"].tolist()
+        return [
+            self.get_words(words[start:end])
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+    def get_english_words(self):
+        """
+        Get the English words.
+
+        Returns
+        -------
+        list of str
+            English words, in sampling order.
+        """
+        return self.get_words(self.arrays["english"])
+
+    def get_deciles(self):
+        """
+        Get the words of each decile.
+
+        Returns
+        -------
+        dict or None
+            Words of each decile, as in `deciles.json` (None if not
+            compiled).
+        """
+        if not self.header["has_deciles"]:
+            return None
+        return dict(zip(self.header["deciles"], self.get_groups("decile")))
+
+    def get_hyponyms(self):
+        """
+        Get the hyponym groups.
+
+        Returns
+        -------
+        list of list of str or None
+            Hyponym groups, as in `hyponyms.json` (None if not compiled).
+        """
+        if not self.header["has_hyponyms"]:
+            return None
+        return self.get_groups("hyponym")
+
+    def is_source_fresh(self, name, path):
+        """
+        Check that a source file is the one the artifact was compiled from.
+
+        Parameters
+        ----------
+        name : str
+            Name of the groups ("deciles" or "hyponyms").
+        path : str
+            Path of the JSON file of the groups.
+
+        Returns
+        -------
+        bool
+            False if the file was not recorded or changed since (it is only
+            hashed if its mtime changed). True if it does not exist.
+        """
+        if not os.path.exists(path):
+            return True
+        source = self.header["sources"].get(name)
+        if source is None:
+            return False
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) == (
+            source["size"],
+            source["mtime_ns"],
+        ):
+            return True
+        key = (name, stat.st_size, stat.st_mtime_ns)
+        if key not in self._fresh:
+            self._fresh[key] = (
+                stat.st_size == source["size"]
+                and hash_file(path) == source["sha256"]
+            )
+        return self._fresh[key]
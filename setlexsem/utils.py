@@ -40,6 +40,14 @@ def read_yaml(path_to_yaml):
         return None
 
 
+def save_csv_atomically(df, path_csv):
+    """Save a dataframe so that `path_csv` is either complete or untouched,
+    even if the process is killed (or another process reads it) midway."""
+    path_tmp = f"{path_csv}.{os.getpid()}.tmp"
+    df.to_csv(path_tmp, index=False)
+    os.replace(path_tmp, path_csv)
+
+
 def read_study_names():
     """Read existing study names"""
     study_names = []
@@ -104,10 +112,12 @@ def get_prompt_file_path(sampler_hp, prompt_hp, random_seed):
     return experiment_folder_structure, filename_experiment
 
 
-def get_data_filename(sampler_name, random_seed_value, num_runs):
+def get_data_filename(
+    sampler_name, random_seed_value, num_runs, extension="csv"
+):
     """Get the filename for the generated data"""
 
-    return f"{sampler_name}_S-{random_seed_value}_Runs-{num_runs}.csv"
+    return f"{sampler_name}_S-{random_seed_value}_Runs-{num_runs}.{extension}"
 
 
 def create_param_format(sampler_name, random_seed_value):
@@ -25,5 +25,6 @@ setup(
     extras_require={
         "dev": ["check-manifest", "flake8", "black"],
         "test": ["pytest", "coverage"],
+        "parquet": ["pyarrow"],
     },
 )
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def word_index_root(tmp_path_factory):
+    """Save the word indexes of the samplers in a temporary folder rather
+    than in the cache of the repository"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        path_root = tmp_path_factory.mktemp("word_index")
+        monkeypatch.setattr(
+            "setlexsem.generate.word_index.PATH_WORD_INDEX_ROOT",
+            str(path_root),
+        )
+        yield path_root
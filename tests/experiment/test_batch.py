@@ -0,0 +1,137 @@
+import json
+import os
+import random
+
+import pytest
+
+from setlexsem.experiment.batch import (
+    export_batch_experiment,
+    import_batch_experiment,
+    make_batch_name,
+    read_manifest,
+)
+from setlexsem.experiment.experiment import iter_prompts, run_experiment
+from setlexsem.generate.prompt import PromptConfig, get_ground_truth
+from setlexsem.generate.sample import BasicNumberSampler
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+NUM_RUNS = 10
+
+
+class FakeLM:
+    temperature = 0
+    top_k = 1
+    top_p = 1
+
+    def get_model_owner(self):
+        return "anthropic"
+
+    def get_model_name(self):
+        return MODEL_ID
+
+
+def make_samples():
+    """Return identical (A, B, prompt) samples on every call"""
+    sampler = BasicNumberSampler(
+        n=100, m_A=2, m_B=4, random_state=random.Random(292)
+    )
+    prompt_config = PromptConfig(
+        operation="union",
+        k_shot=1,
+        type="formal_language",
+        approach="baseline",
+        sampler=sampler,
+    )
+    return iter_prompts(sampler, prompt_config, NUM_RUNS), prompt_config
+
+
+def write_fake_output(path_batch, name, answer):
+    """Simulate the output of a Bedrock batch-inference job"""
+    path_output = os.path.join(path_batch, "output", "job-id")
+    os.makedirs(path_output)
+    path_input = os.path.join(path_batch, "input", f"{name}.jsonl")
+    with open(path_input) as f_in, open(
+        os.path.join(path_output, f"{name}.jsonl.out"), "w"
+    ) as f_out:
+        for line in f_in:
+            record = json.loads(line)
+            record["modelOutput"] = {
+                "content": [{"type": "text", "text": answer(record)}]
+            }
+            f_out.write(json.dumps(record) + "\n")
+
+
+def test_make_batch_name():
+    assert (
+        make_batch_name(
+            "/results/S/numbers/union/baseline/K-1.csv", "/results"
+        )
+        == "S__numbers__union__baseline__K-1"
+    )
+
+
+def test_export_batch_experiment(tmp_path):
+    samples, _ = make_samples()
+    n_records = export_batch_experiment(
+        str(tmp_path), "exp", samples, FakeLM(), metadata={"k": 1}
+    )
+    assert n_records == NUM_RUNS
+    with open(tmp_path / "input" / "exp.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["recordId"] for r in records] == [
+        f"{i:011d}" for i in range(NUM_RUNS)
+    ]
+    assert records[0]["modelInput"]["temperature"] == 0
+    manifest = read_manifest(str(tmp_path))
+    assert manifest["model_id"] == MODEL_ID
+    assert manifest["experiments"]["exp"] == {"num_records": NUM_RUNS, "k": 1}
+
+
+def test_import_batch_experiment_matches_run_experiment(tmp_path):
+    samples, _ = make_samples()
+    export_batch_experiment(str(tmp_path), "exp", samples, FakeLM())
+    write_fake_output(str(tmp_path), "exp", lambda record: "set()")
+
+    samples, prompt_config = make_samples()
+    results, logs = import_batch_experiment(
+        str(tmp_path), "exp", samples, FakeLM(), prompt_config
+    )
+
+    sampler = BasicNumberSampler(
+        n=100, m_A=2, m_B=4, random_state=random.Random(292)
+    )
+    prompt_config.sampler = sampler
+    expected_results, expected_logs = run_experiment(
+        FakeLM(), sampler, prompt_config, num_runs=NUM_RUNS, debug_no_lm=True
+    )
+    assert results == expected_results
+    assert logs == expected_logs
+
+
+def test_import_batch_experiment_scores_answers(tmp_path):
+    samples, _ = make_samples()
+    samples = list(samples)
+    export_batch_experiment(str(tmp_path), "exp", samples, FakeLM())
+    answers = {
+        f"{i:011d}": get_ground_truth("union", A, B)
+        for i, (A, B, _) in enumerate(samples)
+    }
+    write_fake_output(
+        str(tmp_path),
+        "exp",
+        lambda record: f"<answer>{answers[record['recordId']]}</answer>",
+    )
+    _, prompt_config = make_samples()
+    results, logs = import_batch_experiment(
+        str(tmp_path), "exp", samples, FakeLM(), prompt_config
+    )
+    assert results == NUM_RUNS
+    assert all(log["llm_vs_gt"] for log in logs)
+
+
+def test_import_batch_experiment_without_output(tmp_path):
+    samples, prompt_config = make_samples()
+    with pytest.raises(FileNotFoundError):
+        import_batch_experiment(
+            str(tmp_path), "exp", samples, FakeLM(), prompt_config
+        )
@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from setlexsem.experiment.rate_limit import (
+    AdaptiveConcurrencyLimiter,
+    RateLimiter,
+    get_backoff_delay,
+    is_retryable_error,
+    is_throttling_error,
+)
+
+
+class ThrottlingError(Exception):
+    """Mimics botocore's ClientError"""
+
+    response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class RateLimitError(Exception):
+    """Mimics openai's RateLimitError"""
+
+    status_code = 429
+
+
+class ValidationError(Exception):
+    response = {"Error": {"Code": "ValidationException"}}
+
+
+def test_error_classification():
+    assert is_throttling_error(ThrottlingError())
+    assert is_throttling_error(RateLimitError())
+    assert is_retryable_error(ThrottlingError())
+    assert not is_retryable_error(ValidationError())
+    assert not is_retryable_error(ValueError())
+
+
+def test_backoff_delay_is_bounded():
+    random_state = random.Random(17)
+    for attempt in range(10):
+        delay = get_backoff_delay(
+            attempt, base_delay=1, max_delay=8, random_state=random_state
+        )
+        assert 0 <= delay <= min(8, 2**attempt)
+
+
+@patch("setlexsem.experiment.rate_limit.time.sleep")
+def test_rate_limiter_retries_throttled_calls(mock_sleep):
+    func = Mock(side_effect=[ThrottlingError(), RateLimitError(), "set()"])
+    rate_limiter = RateLimiter(max_concurrency=4, max_retries=2)
+    assert rate_limiter(func, "prompt") == "set()"
+    assert func.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert rate_limiter.concurrency.limit < 4
+
+
+@patch("setlexsem.experiment.rate_limit.time.sleep")
+def test_rate_limiter_gives_up(mock_sleep):
+    rate_limiter = RateLimiter(max_retries=1)
+    with pytest.raises(ThrottlingError):
+        rate_limiter(Mock(side_effect=ThrottlingError()))
+    with pytest.raises(ValidationError):
+        rate_limiter(Mock(side_effect=ValidationError()))
+    assert mock_sleep.call_count == 1
+
+
+def test_adaptive_concurrency_aimd():
+    limiter = AdaptiveConcurrencyLimiter(max_concurrency=8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.limit == 1
+
+
+def test_rate_limiter_shares_budget():
+    budget = threading.BoundedSemaphore(2)
+    rate_limiters = [
+        RateLimiter(max_concurrency=4, budget=budget) for _ in range(3)
+    ]
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def func():
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+    threads = [
+        threading.Thread(target=rate_limiters[i % 3], args=(func,))
+        for i in range(12)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert in_flight[1] <= 2
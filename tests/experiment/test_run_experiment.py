@@ -0,0 +1,188 @@
+import os
+import random
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from setlexsem.experiment.experiment import (
+    CheckpointLog,
+    map_in_order,
+    run_experiment,
+)
+from setlexsem.generate.prompt import PromptConfig
+from setlexsem.generate.sample import BasicNumberSampler, DeceptiveWordSampler
+
+
+class FakeLM:
+    """Answers with an empty set after a random delay"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(random.random() / 100)
+        with self.lock:
+            self.in_flight -= 1
+        return f"<answer>{{}}</answer> {len(prompt)}"
+
+    def get_model_owner(self):
+        return "anthropic"
+
+    def get_model_name(self):
+        return "anthropic.claude-3-haiku-20240307-v1:0"
+
+
+def make_prompt_config(sampler):
+    return PromptConfig(
+        operation="union",
+        k_shot=0,
+        type="formal_language",
+        approach="baseline",
+        sampler=sampler,
+    )
+
+
+class CrashingLM(FakeLM):
+    """Fails after `n_calls` calls"""
+
+    def __init__(self, n_calls):
+        super().__init__()
+        self.n_calls = n_calls
+
+    def __call__(self, prompt):
+        if self.n_calls == 0:
+            raise RuntimeError("Crash")
+        self.n_calls -= 1
+        return super().__call__(prompt)
+
+
+def make_number_sampler():
+    return BasicNumberSampler(
+        n=100, m_A=2, m_B=4, random_state=random.Random(292)
+    )
+
+
+def make_deceptive_sampler():
+    # each draw removes the two hyponym groups it used
+    groups = [[f"word{i}-{j}" for j in range(6)] for i in range(60)]
+    with patch(
+        "setlexsem.generate.sample.get_hyponym_sets", return_value=groups
+    ):
+        return DeceptiveWordSampler(
+            m_A=3,
+            m_B=3,
+            random_state=random.Random(292),
+            with_replacement=True,
+        )
+
+
+def run_with_workers(
+    max_workers,
+    lm=None,
+    checkpoint_path=None,
+    make_sampler=make_number_sampler,
+):
+    sampler = make_sampler()
+    return run_experiment(
+        lm or FakeLM(),
+        sampler,
+        make_prompt_config(sampler),
+        num_runs=20,
+        max_workers=max_workers,
+        checkpoint_path=checkpoint_path,
+        fsync_every=3,
+    )
+
+
+def test_map_in_order_keeps_input_order():
+    items = list(range(50))
+
+    def slow_square(x):
+        time.sleep(random.random() / 1000)
+        return x * x
+
+    assert list(map_in_order(slow_square, items, max_in_flight=8)) == [
+        x * x for x in items
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [2, 4, 8])
+def test_concurrent_run_matches_sequential_run(max_workers):
+    _, logs_sequential = run_with_workers(1)
+    _, logs_concurrent = run_with_workers(max_workers)
+    assert logs_concurrent == logs_sequential
+
+
+def test_concurrent_run_bounds_in_flight_calls():
+    lm = FakeLM()
+    run_with_workers(3, lm=lm)
+    assert 1 <= lm.max_in_flight <= 3
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_run_resumes_from_checkpoint(tmp_path, max_workers):
+    path_checkpoint = str(tmp_path / "results.csv.partial.jsonl")
+    expected = run_with_workers(1)
+
+    with pytest.raises(RuntimeError):
+        run_with_workers(
+            max_workers, lm=CrashingLM(7), checkpoint_path=path_checkpoint
+        )
+    with open(path_checkpoint) as f:
+        n_completed = len(f.readlines())
+    assert 1 <= n_completed <= 7
+    # the samplers resume from the state saved at the last fsync
+    checkpoint = CheckpointLog(path_checkpoint)
+    assert checkpoint.read_state()["n_records"] <= n_completed
+
+    lm = CrashingLM(20 - n_completed)
+    assert (
+        run_with_workers(max_workers, lm=lm, checkpoint_path=path_checkpoint)
+        == expected
+    )
+    assert lm.n_calls == 0
+
+    checkpoint.remove()
+    assert not os.listdir(tmp_path)
+
+
+def test_checkpoint_drops_torn_line(tmp_path):
+    path_checkpoint = tmp_path / "results.csv.partial.jsonl"
+    run_with_workers(1, checkpoint_path=str(path_checkpoint))
+    lines = path_checkpoint.read_text().splitlines(keepends=True)
+    path_checkpoint.write_text("".join(lines[:5]) + lines[5][:10])
+
+    checkpoint = CheckpointLog(str(path_checkpoint))
+    assert len(checkpoint.read()) == 5
+    assert path_checkpoint.read_text() == "".join(lines[:5])
+
+
+@pytest.mark.parametrize("max_workers", [2, 4])
+def test_deceptive_run_resumes_from_checkpoint(tmp_path, max_workers):
+    path_checkpoint = str(tmp_path / "results.csv.partial.jsonl")
+    expected = run_with_workers(1, make_sampler=make_deceptive_sampler)
+
+    with pytest.raises(RuntimeError):
+        run_with_workers(
+            max_workers,
+            lm=CrashingLM(8),
+            checkpoint_path=path_checkpoint,
+            make_sampler=make_deceptive_sampler,
+        )
+    # the saved options are those left right after the saved run
+    assert CheckpointLog(path_checkpoint).read_state()["n_records"] >= 3
+    assert (
+        run_with_workers(
+            max_workers,
+            checkpoint_path=path_checkpoint,
+            make_sampler=make_deceptive_sampler,
+        )
+        == expected
+    )
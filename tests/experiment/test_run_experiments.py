@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from setlexsem.experiment.run_experiments import run_grid
+from setlexsem.generate.generate_prompts import make_hps_prompt
+from setlexsem.generate.generate_sets import (
+    get_sampler,
+    make_hps_set,
+    make_sets_from_sampler,
+)
+from setlexsem.generate.utils_io import save_generated_sets
+
+
+def make_settings(path_results):
+    return {
+        "account_number": "123456789012",
+        "model_name": "anthropic.claude-3-haiku-20240307-v1:0",
+        "max_workers": 1,
+        "response_cache": None,
+        "study_name": "test_grid",
+        "path_results": str(path_results),
+        "n_run": 5,
+        "random_seed": 292,
+        "load_generated_data": False,
+        "load_last_run": False,
+        "debug_no_lm": True,
+        "save_files": True,
+        "batch_export": None,
+        "batch_import": None,
+        "show_progress": False,
+    }
+
+
+def make_hps(k_shot=0):
+    return [
+        (hp_set, hp_prompt)
+        for hp_set in make_hps_set(
+            set_types=["numbers"], n=[100], m_A=[2, 4], m_B=[4]
+        )
+        for hp_prompt in make_hps_prompt(
+            ["union", "intersection"],
+            [k_shot],
+            ["formal_language"],
+            ["baseline"],
+        )
+    ]
+
+
+def read_results(path_results):
+    results = {}
+    for root, _, files in os.walk(path_results):
+        for filename in files:
+            if not filename.endswith(".csv"):
+                continue
+            path = os.path.join(root, filename)
+            results[os.path.relpath(path, path_results)] = pd.read_csv(path)
+    return results
+
+
+def test_run_grid_in_parallel_matches_serial(tmp_path):
+    hps = make_hps()
+    statuses = run_grid(hps, make_settings(tmp_path / "serial"))
+    assert statuses == {"saved": len(hps)}
+
+    statuses = run_grid(
+        hps,
+        make_settings(tmp_path / "parallel"),
+        grid_workers=2,
+        lm_concurrency=2,
+    )
+    assert statuses == {"saved": len(hps)}
+
+    serial = read_results(tmp_path / "serial")
+    parallel = read_results(tmp_path / "parallel")
+    assert len(serial) == len(hps)
+    assert serial.keys() == parallel.keys()
+    for name, df in serial.items():
+        pd.testing.assert_frame_equal(df, parallel[name])
+    # no temporary file is left behind
+    assert not any(name.endswith(".tmp") for name in serial)
+
+    # existing results are skipped
+    statuses = run_grid(hps, make_settings(tmp_path / "serial"))
+    assert statuses == {"skipped": len(hps)}
+
+
+@pytest.mark.parametrize("load_generated_data", [False, True])
+def test_run_grid_resumes_last_run(
+    tmp_path, monkeypatch, load_generated_data
+):
+    monkeypatch.setattr(
+        "setlexsem.generate.utils_io.PATH_DATA_ROOT", str(tmp_path / "data")
+    )
+    hps = make_hps()[:1]
+    hp_set = hps[0][0]
+    if load_generated_data:
+        sampler = get_sampler(hp_set, random.Random(292))
+        save_generated_sets(
+            make_sets_from_sampler(sampler, num_runs=5), sampler, 292, 5
+        )
+
+    settings = make_settings(tmp_path / "full")
+    settings["load_generated_data"] = load_generated_data
+    assert run_grid(hps, settings) == {"saved": 1}
+    ((name, df_full),) = read_results(tmp_path / "full").items()
+
+    # an interrupted run saved only the first runs
+    settings = make_settings(tmp_path / "resumed")
+    settings["load_generated_data"] = load_generated_data
+    settings["load_last_run"] = True
+    path_results = tmp_path / "resumed" / name
+    os.makedirs(path_results.parent)
+    df_full.iloc[:3].to_csv(path_results, index=False)
+    assert run_grid(hps, settings) == {"saved": 1}
+
+    df_resumed = pd.read_csv(path_results)
+    pd.testing.assert_frame_equal(df_resumed, df_full)
+
+
+@pytest.mark.parametrize("saved_state", [True, False])
+def test_run_grid_extends_saved_runs(tmp_path, monkeypatch, saved_state):
+    # the k-shot examples are sampled too
+    hps = make_hps(k_shot=2)[:1]
+    settings = make_settings(tmp_path / "full")
+    assert run_grid(hps, settings) == {"saved": 1}
+    ((name, df_full),) = read_results(tmp_path / "full").items()
+
+    settings = make_settings(tmp_path / "extended")
+    settings["n_run"] = 3
+    assert run_grid(hps, settings) == {"saved": 1}
+    path_state = tmp_path / "extended" / f"{name}.state.json"
+    assert json.loads(path_state.read_text())["n_records"] == 3
+    if saved_state:
+        # the samplers are restored rather than sampled again
+        monkeypatch.setattr(
+            "setlexsem.experiment.run_experiments.iter_prompts", None
+        )
+    else:
+        path_state.unlink()
+    settings["n_run"] = 5
+    settings["load_last_run"] = True
+    assert run_grid(hps, settings) == {"saved": 1}
+
+    df_extended = pd.read_csv(tmp_path / "extended" / name)
+    pd.testing.assert_frame_equal(df_extended, df_full)
+    assert json.loads(path_state.read_text())["n_records"] == 5
+
+
+def test_run_grid_incompatible_last_run(tmp_path):
+    hps = make_hps()[:1]
+    assert run_grid(hps, make_settings(tmp_path)) == {"saved": 1}
+    ((name, df_full),) = read_results(tmp_path).items()
+
+    # the last completed run is not the one of the sampler
+    df_last_run = df_full.iloc[:3].copy()
+    df_last_run.loc[2, "set_A"] = "{-1, -2}"
+    df_last_run.to_csv(tmp_path / name, index=False)
+    settings = make_settings(tmp_path)
+    settings["load_last_run"] = True
+    assert run_grid(hps, settings) == {"failed": 1}
+
+
+def test_run_grid_in_parallel_logs_cache_stats(tmp_path, caplog):
+    settings = make_settings(tmp_path / "results")
+    settings["response_cache"] = str(tmp_path / "lm_responses.sqlite")
+    with caplog.at_level(logging.INFO):
+        statuses = run_grid(make_hps(), settings, grid_workers=2)
+    assert statuses == {"saved": len(make_hps())}
+    assert "LM response cache: {'hits': 0, 'misses': 0" in caplog.text
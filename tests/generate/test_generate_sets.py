@@ -6,8 +6,11 @@ import pytest
 
 from setlexsem.generate.generate_sets import (
     generate_set_pair,
+    get_shard_ranges,
+    get_shard_seed,
     make_sets,
     make_sets_from_sampler,
+    make_shards,
     parse_set_pair,
 )
 
@@ -122,3 +125,61 @@ def test_make_sets_overlap_fraction():
         overlap = len(s["A"].intersection(s["B"]))
         expected_overlap = int(hps["overlap_fraction"] * hps["m_A"])
         assert overlap == expected_overlap
+
+
+def test_parse_set_pair_accepts_sets():
+    assert parse_set_pair({1, 2}, "{3}") == ({1, 2}, {3})
+
+
+def test_get_shard_ranges():
+    assert get_shard_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert get_shard_ranges(2, 3) == [(0, 0), (0, 1), (1, 2)]
+
+
+def test_get_shard_seed():
+    assert get_shard_seed(292, 0) == get_shard_seed(292, 0)
+    assert get_shard_seed(292, 0) != get_shard_seed(292, 1)
+    assert get_shard_seed(292, 1) != get_shard_seed(293, 1)
+
+
+@pytest.mark.parametrize("batch_sampling", [False, True])
+def test_make_shards_independent_of_workers(batch_sampling):
+    hp_sets = [
+        {"set_types": "numbers", "n": 100, "m_A": 3, "m_B": 3},
+        {"set_types": "numbers", "n": 100, "m_A": 2, "m_B": 4},
+    ]
+    for hp_set in hp_sets:
+        hp_set["overlap_fraction"] = None
+
+    results = [
+        list(
+            make_shards(
+                hp_sets,
+                num_runs=10,
+                seed_value=292,
+                n_shards=4,
+                n_workers=n_workers,
+                batch_sampling=batch_sampling,
+            )
+        )
+        for n_workers in [1, 3]
+    ]
+    assert results[0] == results[1]
+
+    for hp_set, shards in results[0]:
+        assert [shard["index"] for shard in shards] == [0, 1, 2, 3]
+        runs = [ds["experiment_run"] for s in shards for ds in s["sets"]]
+        assert runs == list(range(10))
+        for ds in (ds for s in shards for ds in s["sets"]):
+            assert len(ds["A"]) == hp_set["m_A"]
+            assert len(ds["B"]) == hp_set["m_B"]
+
+
+def test_make_shards_failing_configuration():
+    hp_sets = [
+        {"set_types": "numbers", "n": 2, "m_A": 3, "m_B": 3},
+    ]
+    hp_sets[0]["overlap_fraction"] = None
+    ((hp_set, error),) = make_shards(hp_sets, 4, 292, 2, n_workers=1)
+    assert hp_set == hp_sets[0]
+    assert isinstance(error, Exception)
@@ -1,7 +1,22 @@
+import json
+import random
+from unittest.mock import patch
+
 import pytest
 
 from setlexsem.generate.sample import (  # Adjust import as necessary
+    BasicNumberSampler,
+    BasicWordSampler,
+    DeceptiveWordSampler,
+    OverlapSampler,
+    bounded_edit_distance,
+    find_hypernyms_and_hyponyms,
+    get_hyponyms,
+    make_edit_distance_queue,
     make_sampler_name_from_hps,
+    postprocess_hyponym_sets,
+    remove_similar_lemmata,
+    remove_substring_lemmata,
 )
 
 
@@ -74,3 +89,286 @@ from setlexsem.generate.sample import (  # Adjust import as necessary
 )
 def test_make_sampler_name_from_hps(sampler_hps, expected):
     assert make_sampler_name_from_hps(sampler_hps) == expected
+
+
+def test_sampler_state_round_trip():
+    sampler = OverlapSampler(
+        BasicNumberSampler(
+            n=100, m_A=4, m_B=6, random_state=random.Random(292)
+        ),
+        overlap_fraction=0.5,
+    )
+    for _ in range(3):
+        sampler()
+    state = json.loads(json.dumps(sampler.get_state()))
+    expected = [sampler() for _ in range(5)]
+
+    restored = OverlapSampler(
+        BasicNumberSampler(n=100, m_A=4, m_B=6, random_state=random.Random()),
+        overlap_fraction=0.5,
+    )
+    restored.set_state(state)
+    assert [restored() for _ in range(5)] == expected
+
+
+@pytest.mark.parametrize(
+    "n, m_A, m_B, item_len",
+    [(10, 8, 10, None), (1000, 3, 5, None), (None, 4, 2, 2)],
+)
+def test_basic_number_sampler_sample_batch(n, m_A, m_B, item_len):
+    sampler = BasicNumberSampler(
+        n=n,
+        m_A=m_A,
+        m_B=m_B,
+        item_len=item_len,
+        random_state=random.Random(7),
+    )
+    batch = sampler.sample_batch(500)
+    assert batch.A.shape == (500, m_A)
+    assert batch.B.shape == (500, m_B)
+    for A, B in batch:
+        assert len(A) == m_A and len(B) == m_B
+        assert A.union(B) <= set(sampler.possible_options)
+        assert all(type(x) is int for x in A)
+
+    # seeded by the sampler's random state
+    same_seed = BasicNumberSampler(
+        n=n,
+        m_A=m_A,
+        m_B=m_B,
+        item_len=item_len,
+        random_state=random.Random(7),
+    )
+    assert list(same_seed.sample_batch(500)) == list(batch)
+
+
+def test_set_batch_to_dict():
+    sampler = BasicNumberSampler(
+        n=100, m_A=2, m_B=3, random_state=random.Random(7)
+    )
+    batch = sampler.sample_batch(3)
+    columns = batch.to_dict()
+    assert columns["experiment_run"] == [0, 1, 2]
+    assert list(zip(columns["A"], columns["B"])) == list(batch)
+
+
+@pytest.mark.parametrize(
+    "n, m_A, m_B, overlap_fraction",
+    # the last two used to fail: m_A > m_B, and a nearly exhausted range
+    [(100, 4, 6, 0.5), (12, 6, 6, 1.0), (20, 8, 4, 0.5), (10, 5, 5, 0.0)],
+)
+def test_overlap_sampler_constructs_overlap(n, m_A, m_B, overlap_fraction):
+    sampler = OverlapSampler(
+        BasicNumberSampler(
+            n=n, m_A=m_A, m_B=m_B, random_state=random.Random(7)
+        ),
+        overlap_fraction=overlap_fraction,
+    )
+    for _ in range(200):
+        A, B = sampler()
+        assert len(A) == m_A and len(B) == m_B
+        assert len(A & B) == sampler.overlap_n
+        assert (A | B) <= set(range(n))
+
+    batch = sampler.sample_batch(200)
+    for A, B in batch:
+        assert len(A) == m_A and len(B) == m_B
+        assert len(A & B) == sampler.overlap_n
+
+
+def test_overlap_sampler_of_words_batch():
+    words = ["tree", "cat", "house", "dog", "bird", "apple", "sky", "sea"]
+    sampler = OverlapSampler(
+        BasicWordSampler(
+            m_A=3, m_B=4, words=words, random_state=random.Random(7)
+        ),
+        overlap_fraction=2 / 3,
+    )
+    for A, B in sampler.sample_batch(50):
+        assert len(A) == 3 and len(B) == 4 and len(A & B) == 2
+        assert (A | B) <= set(words)
+
+
+def test_overlap_sampler_not_enough_options():
+    sampler = OverlapSampler(
+        BasicNumberSampler(n=5, m_A=4, m_B=4, random_state=random.Random(7)),
+        overlap_fraction=0.5,
+    )
+    with pytest.raises(StopIteration):
+        sampler()
+    with pytest.raises(ValueError):
+        OverlapSampler(BasicNumberSampler(n=10, m_A=4, m_B=2), overlap_n=3)
+
+
+def sample_deceptive_by_removal(sampler):
+    """Reference draw: remove A's option from a copy of the options"""
+    possible_options = list(sampler.possible_options)
+    sets = []
+    for set_size in (sampler.m_A, sampler.m_B):
+        hyponym_list = list(sampler.random_state.choice(possible_options))
+        possible_options.remove(hyponym_list)
+        sets.append(sampler.shuffle_hyponyms(hyponym_list, set_size))
+    return tuple(sets)
+
+
+def test_deceptive_sampler_draws_as_if_removing():
+    rng = random.Random(5)
+    groups = [
+        [f"w{i}-{j}" for j in range(rng.randint(4, 9))] for i in range(30)
+    ]
+    # duplicate groups: list.remove drops the first one
+    groups += [list(groups[3]), list(groups[17]), list(groups[3])]
+    with patch(
+        "setlexsem.generate.sample.get_hyponym_sets", return_value=groups
+    ):
+        sampler = DeceptiveWordSampler(
+            m_A=3, m_B=4, random_state=random.Random(11)
+        )
+        reference = DeceptiveWordSampler(
+            m_A=3, m_B=4, random_state=random.Random(11)
+        )
+    for _ in range(2000):
+        assert sampler() == sample_deceptive_by_removal(reference)
+    assert sampler.possible_options == reference.possible_options
+
+
+def test_deceptive_sampler_removes_drawn_option_by_index():
+    rng = random.Random(3)
+    groups = [
+        [f"w{i}-{j}" for j in range(rng.randint(4, 9))] for i in range(20)
+    ]
+    with patch(
+        "setlexsem.generate.sample.get_hyponym_sets", return_value=groups
+    ):
+        sampler = DeceptiveWordSampler(
+            m_A=3, m_B=4, random_state=random.Random(11)
+        )
+    options = list(sampler.possible_options)
+    random_state = random.Random(11)
+    for _ in range(len(groups)):
+        i = random_state.randrange(len(options))
+        hyponym_list = list(options.pop(i))
+        random_state.shuffle(hyponym_list)
+        expected = set(hyponym_list[:3])
+        assert (
+            sampler.choose_hyponyms(sampler.possible_options, 3) == expected
+        )
+        assert sampler.possible_options == options
+    with pytest.raises(IndexError):
+        sampler.choose_hyponyms(sampler.possible_options, 3)
+
+
+class FakeSynset:
+    def __init__(self, name, lemma_names, hyponyms=()):
+        self._name = name
+        self._lemma_names = lemma_names
+        self._hyponyms = list(hyponyms)
+
+    def name(self):
+        return self._name
+
+    def lemma_names(self):
+        return list(self._lemma_names)
+
+    def hyponyms(self):
+        return list(self._hyponyms)
+
+
+def make_fake_hierarchy():
+    cat = FakeSynset("cat.n.01", ["cat", "true_cat"])
+    dog = FakeSynset("dog.n.01", ["dog", "domestic_dog", "canis"])
+    pup = FakeSynset("puppy.n.01", ["puppy", "pup"])
+    dog._hyponyms.append(pup)
+    pet = FakeSynset("pet.n.01", ["pet"], [cat, dog])
+    carnivore = FakeSynset("carnivore.n.01", ["carnivore"], [cat, dog])
+    animal = FakeSynset("animal.n.01", ["animal", "beast"], [pet, carnivore])
+    # restrain.v.01 is its own hyponym in WordNet
+    restrain = FakeSynset("restrain.v.01", ["restrain"])
+    restrain._hyponyms.append(restrain)
+    return [animal, pet, carnivore, cat, dog, pup, restrain]
+
+
+def test_get_hyponyms_is_memoized():
+    animal, pet, carnivore, cat, dog, pup, _ = make_fake_hierarchy()
+    memo = {}
+    assert get_hyponyms(animal, memo) == {pet, carnivore, cat, dog, pup}
+    assert memo[pet] == {cat, dog, pup}
+    assert get_hyponyms(dog, memo) is memo[dog]
+
+
+def test_find_hypernyms_and_hyponyms_skips_cycles():
+    synsets = make_fake_hierarchy()
+    with patch("setlexsem.generate.sample.get_wordnet") as get_wordnet:
+        get_wordnet.return_value.all_synsets.return_value = synsets
+        hyperhypo = dict(
+            (hyper.name(), hypo)
+            for hyper, hypo in find_hypernyms_and_hyponyms()
+        )
+    assert list(hyperhypo) == [
+        "animal.n.01",
+        "pet.n.01",
+        "carnivore.n.01",
+        "dog.n.01",
+    ]
+
+
+def test_postprocess_hyponym_sets_does_not_depend_on_n_jobs():
+    synsets = make_fake_hierarchy()
+    with patch("setlexsem.generate.sample.get_wordnet") as get_wordnet:
+        get_wordnet.return_value.all_synsets.return_value = synsets
+        hyperhypo = list(find_hypernyms_and_hyponyms())
+    serial = postprocess_hyponym_sets(hyperhypo, random.Random(0))
+    parallel = postprocess_hyponym_sets(
+        reversed(hyperhypo), random.Random(0), n_jobs=2
+    )
+    assert serial == parallel[::-1]
+    assert serial[-1] == ["puppy"]
+
+
+def remove_similar_lemmata_by_queue(
+    lemma_names, random_state, min_distance=3, max_iteration=4
+):
+    """Reference: recompute the whole queue after each removal"""
+    lemma_names = remove_substring_lemmata(list(lemma_names))
+    queue = make_edit_distance_queue(lemma_names)
+    iteration = 0
+    while len(queue) and (queue[0][0] < min_distance):
+        if iteration > max_iteration:
+            raise StopIteration()
+        lemmata_pair = random_state.choice(queue[0][1])
+        lemma_names.remove(random_state.choice(lemmata_pair))
+        queue = make_edit_distance_queue(lemma_names)
+        iteration += 1
+    return lemma_names
+
+
+def test_remove_similar_lemmata_matches_queue():
+    rng = random.Random(3)
+    for seed in range(300):
+        lemma_names = [
+            "".join(rng.choice("abc") for _ in range(rng.randint(2, 7)))
+            for _ in range(rng.randint(1, 14))
+        ]
+        try:
+            expected = remove_similar_lemmata_by_queue(
+                lemma_names, random.Random(seed)
+            )
+        except StopIteration:
+            with pytest.raises(StopIteration):
+                remove_similar_lemmata(lemma_names, random.Random(seed))
+            continue
+        assert (
+            remove_similar_lemmata(lemma_names, random.Random(seed))
+            == expected
+        )
+
+
+@pytest.mark.parametrize(
+    "s1, s2, distance",
+    [("food", "foo", 1), ("thing", "farthing", 3), ("", "abc", 3)],
+)
+def test_bounded_edit_distance(s1, s2, distance):
+    assert bounded_edit_distance(s1, s2, 5) == distance
+    assert bounded_edit_distance(s1, s2, distance) == distance
+    assert bounded_edit_distance(s1, s2, distance - 1) == distance
+    assert bounded_edit_distance(s1, s2, 0) == min(distance, 1)
@@ -0,0 +1,248 @@
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from setlexsem.generate import utils_io
+from setlexsem.generate.generate_sets import (
+    make_sets_from_sampler,
+    make_shards,
+)
+from setlexsem.generate.sample import (
+    BasicNumberSampler,
+    BasicWordSampler,
+    OverlapSampler,
+)
+from setlexsem.generate.utils_io import (
+    find_dataset,
+    load_generated_data,
+    make_dataset_key,
+    parse_set,
+    read_sets_metadata,
+    save_generated_sets,
+    save_generated_shards,
+)
+
+WORDS = ["tree", "cat", "house", "dog", "bird", "apple", "sky", "sea"]
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "setlexsem.generate.utils_io.PATH_DATA_ROOT", str(tmp_path)
+    )
+    return tmp_path
+
+
+def make_samplers():
+    return [
+        BasicNumberSampler(
+            n=100, m_A=3, m_B=4, random_state=random.Random(1)
+        ),
+        BasicWordSampler(
+            m_A=2, m_B=3, words=WORDS, random_state=random.Random(1)
+        ),
+        OverlapSampler(
+            BasicNumberSampler(
+                n=100, m_A=3, m_B=4, random_state=random.Random(1)
+            ),
+            overlap_n=2,
+        ),
+    ]
+
+
+@pytest.mark.parametrize("data_format", ["csv", "parquet"])
+@pytest.mark.parametrize("sampler", make_samplers())
+def test_generated_sets_round_trip(data_root, sampler, data_format):
+    if data_format == "parquet":
+        pytest.importorskip("pyarrow")
+    set_list = make_sets_from_sampler(sampler, num_runs=5)
+    save_generated_sets(set_list, sampler, 7, 5, data_format=data_format)
+
+    expected = [(s["A"], s["B"]) for s in set_list]
+    assert list(load_generated_data(sampler, 7, 5)) == expected
+    # random access, read in small chunks
+    for start, stop in [(2, None), (1, 4), (4, 5), (5, None), (3, 3)]:
+        assert (
+            list(
+                load_generated_data(
+                    sampler, 7, 5, start=start, stop=stop, chunksize=2
+                )
+            )
+            == expected[start:stop]
+        )
+
+
+def test_parquet_metadata(data_root):
+    pytest.importorskip("pyarrow")
+    sampler = make_samplers()[0]
+    batch = sampler.sample_batch(4)
+    save_generated_sets(batch, sampler, 7, 4, data_format="parquet")
+    path = data_root / "numbers" / "N-100_MA-3_MB-4_L-None_S-7_Runs-4.parquet"
+    metadata = read_sets_metadata(str(path))
+    assert metadata["sampler"] == sampler.to_dict()
+    assert metadata["sampler"]["n"] == 100
+    assert (metadata["random_seed"], metadata["num_runs"]) == (7, 4)
+    # parquet is preferred to csv
+    save_generated_sets(batch, sampler, 7, 4, data_format="csv")
+    assert list(load_generated_data(sampler, 7, 4)) == list(batch)
+
+
+def test_load_generated_data_missing(data_root):
+    assert list(load_generated_data(make_samplers()[0], 7, 5)) == []
+
+
+def test_parquet_random_access_across_row_groups(data_root):
+    pa = pytest.importorskip("pyarrow")
+    sampler = make_samplers()[0]
+    batch = sampler.sample_batch(50)
+    save_generated_sets(batch, sampler, 7, 50, data_format="parquet")
+    path = (
+        data_root / "numbers" / "N-100_MA-3_MB-4_L-None_S-7_Runs-50.parquet"
+    )
+    # rewrite with several row groups
+    pa.parquet.write_table(
+        pa.parquet.read_table(str(path)), str(path), row_group_size=8
+    )
+    expected = list(batch)
+    for start, stop in [(0, None), (8, 16), (13, 41), (49, None)]:
+        assert (
+            list(
+                load_generated_data(
+                    sampler, 7, 50, start=start, stop=stop, chunksize=3
+                )
+            )
+            == expected[start:stop]
+        )
+
+
+@pytest.mark.parametrize(
+    "raw_set, expected",
+    [
+        ("{1, 22, -3}", {1, 22, -3}),
+        ("{'a', 'b c'}", {"a", "b c"}),
+        ("set()", set()),
+    ],
+)
+def test_parse_set(raw_set, expected):
+    assert parse_set(raw_set) == expected
+
+
+@pytest.mark.parametrize("data_format", ["csv", "parquet"])
+def test_save_generated_shards(data_root, data_format):
+    if data_format == "parquet":
+        pytest.importorskip("pyarrow")
+    hp_set = {
+        "set_types": "numbers",
+        "n": 100,
+        "m_A": 3,
+        "m_B": 4,
+        "overlap_fraction": None,
+    }
+    sampler = BasicNumberSampler(
+        n=100, m_A=3, m_B=4, random_state=random.Random(7)
+    )
+    ((_, shards),) = make_shards([hp_set], 10, 7, 3, n_workers=1)
+    save_generated_shards(shards, sampler, 7, 10, data_format=data_format)
+
+    (path_data,) = (data_root / "numbers").glob(f"*.{data_format}")
+    path_shards = path_data.with_suffix(".shards")
+    with open(path_shards / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["num_runs"] == 10
+    assert [s["start"] for s in manifest["shards"]] == [0, 3, 6]
+    assert [s["n_sets"] for s in manifest["shards"]] == [3, 3, 4]
+    for shard in manifest["shards"]:
+        assert (path_shards / shard["path"]).exists()
+
+    # the merged data are the shards, in order
+    expected = [(ds["A"], ds["B"]) for s in shards for ds in s["sets"]]
+    assert list(load_generated_data(sampler, 7, 10)) == expected
+    assert list(load_generated_data(sampler, 7, 10, start=5, stop=8)) == (
+        expected[5:8]
+    )
+
+
+def test_registry_serves_prefixes(data_root):
+    sampler = make_samplers()[0]
+    set_list = make_sets_from_sampler(sampler, num_runs=20)
+    save_generated_sets(set_list, sampler, 7, 20)
+
+    dataset = find_dataset(sampler, 7, num_runs=5)
+    assert dataset["num_runs"] == 20
+    assert dataset["n_sets"] == 20
+    assert find_dataset(sampler, 7, num_runs=30) is None
+    assert find_dataset(sampler, 8, num_runs=5) is None
+
+    # the first runs of the larger dataset are the smaller dataset
+    smaller = make_samplers()[0]
+    expected = [(s["A"], s["B"]) for s in make_sets_from_sampler(smaller, 5)]
+    assert list(load_generated_data(sampler, 7, stop=5)) == expected
+
+    # the file is gone: the dataset is not served anymore
+    os.remove(dataset["path"])
+    assert find_dataset(sampler, 7, num_runs=5) is None
+
+
+def test_registry_batch_is_not_a_prefix(data_root):
+    sampler = make_samplers()[0]
+    save_generated_sets(sampler.sample_batch(20), sampler, 7, 20)
+    assert find_dataset(sampler, 7, num_runs=5) is None
+    assert find_dataset(sampler, 7, num_runs=20)["sampling"] == "batch"
+
+
+def test_make_dataset_key():
+    samplers = make_samplers()
+    other = BasicNumberSampler(
+        n=100, m_A=3, m_B=4, random_state=random.Random(2)
+    )
+    # the key does not depend on the state of the sampler
+    assert make_dataset_key(samplers[0], 7) == make_dataset_key(other, 7)
+    assert make_dataset_key(samplers[0], 7) != make_dataset_key(other, 8)
+    assert make_dataset_key(samplers[0], 7) != make_dataset_key(
+        samplers[1], 7
+    )
+
+
+def test_registry_prefers_parquet_and_full_dataset(data_root):
+    pytest.importorskip("pyarrow")
+    sampler = make_samplers()[0]
+    for num_runs in [20, 10]:
+        set_list = make_sets_from_sampler(make_samplers()[0], num_runs)
+        for data_format in ["csv", "parquet"]:
+            save_generated_sets(
+                set_list, sampler, 7, num_runs, data_format=data_format
+            )
+
+    dataset = find_dataset(sampler, 7, num_runs=5)
+    assert (dataset["num_runs"], dataset["data_format"]) == (10, "parquet")
+    dataset = find_dataset(sampler, 7)
+    assert (dataset["num_runs"], dataset["data_format"]) == (20, "parquet")
+
+
+def register_in_process(data_root, num_runs):
+    utils_io.PATH_DATA_ROOT = data_root
+    sampler = make_samplers()[0]
+    utils_io.register_dataset(
+        sampler,
+        7,
+        os.path.join(data_root, f"{num_runs}.csv"),
+        num_runs,
+        0,
+        "csv",
+    )
+
+
+def test_register_dataset_concurrently(data_root):
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(
+            executor.map(
+                register_in_process, [str(data_root)] * 16, range(1, 17)
+            )
+        )
+    (entries,) = utils_io.read_registry()["datasets"].values()
+    assert sorted(entry["num_runs"] for entry in entries) == list(
+        range(1, 17)
+    )
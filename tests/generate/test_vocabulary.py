@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from setlexsem.generate import prompt, sample
+from setlexsem.generate.vocabulary import (
+    get_deciles,
+    get_english_words,
+    get_hyponym_sets,
+    get_load_counts,
+)
+
+
+def test_import_does_not_load_nltk():
+    code = (
+        "import sys\n"
+        "import setlexsem.generate.generate_prompts\n"
+        "assert 'nltk' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_english_words_are_shared():
+    english_words = get_english_words()
+    assert english_words is get_english_words()
+    assert sample.ENGLISH_WORDS is english_words
+    assert prompt.ENGLISH_WORDS is english_words
+    assert english_words == sorted(set(english_words))
+
+
+def test_shared_files_are_loaded_once(tmp_path):
+    path = tmp_path / "hyponyms.json"
+    path.write_text(json.dumps([["cat", "dog"], ["oak", "elm", "fir"]]))
+    key = (str(path), None)
+
+    hyponyms = get_hyponym_sets(str(path))
+    assert hyponyms == (("cat", "dog"), ("oak", "elm", "fir"))
+    assert get_hyponym_sets(str(path)) is hyponyms
+    assert get_load_counts()[key] == 1
+
+    # modified files are loaded again
+    path.write_text(json.dumps([["ant", "bee"]]))
+    os.utime(path, ns=(0, 0))
+    assert get_hyponym_sets(str(path)) == (("ant", "bee"),)
+    assert get_load_counts()[key] == 2
+
+
+def test_shared_files_are_read_only(tmp_path):
+    path = tmp_path / "deciles.json"
+    path.write_text(json.dumps({"1": ["cat"], "2": ["dog", "oak"]}))
+    deciles = get_deciles(str(path))
+    assert deciles["2"] == ("dog", "oak")
+    with pytest.raises(TypeError):
+        deciles["3"] = ("elm",)
@@ -0,0 +1,86 @@
+import random
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from setlexsem.generate.sample import (
+    ENGLISH_WORDS,
+    BasicWordSampler,
+    filter_words,
+)
+from setlexsem.generate.word_index import WordIndex, get_word_index
+
+WORDS = ["tree", "cat", "house", "dog", "bird", "apple", "sky"]
+
+
+def test_word_index_matches_filter_words():
+    index = WordIndex(WORDS)
+    for item_len in (3, 4, 5):
+        assert index.get(item_len=item_len) == filter_words(WORDS, item_len)
+    assert index.get() is WORDS
+    with pytest.raises(AssertionError):
+        index.get(item_len=6)
+
+
+def test_word_index_is_saved_and_loaded(tmp_path):
+    path = str(tmp_path / "words.idx")
+    index = WordIndex.load(WORDS, path)
+    with patch("setlexsem.generate.word_index.get_wordnet") as get_wordnet:
+        mock_wn = get_wordnet.return_value
+        mock_wn.synsets.side_effect = lambda word, pos: (
+            [word] if word in {"cat", "dog"} else []
+        )
+        assert index.get(pos="n") == ["cat", "dog"]
+        assert index.get(item_len=3, pos="n") == ["cat", "dog"]
+        assert mock_wn.synsets.call_count == len(WORDS)
+
+    # the groups by part of speech are not computed again
+    loaded = WordIndex.load(WORDS, path)
+    assert loaded.get(pos="n") == ["cat", "dog"]
+    assert loaded.get(item_len=4) == ["tree", "bird"]
+
+    # the saved groups are memory-mapped
+    assert isinstance(loaded.positions["pos-n"], np.memmap)
+
+    # another vocabulary does not reuse the saved index
+    other = WordIndex.load(WORDS[:3], path)
+    assert other.get(item_len=4) == ["tree"]
+    assert "pos-n" not in WordIndex.load(WORDS[:3], path).positions
+
+
+def test_word_index_rebuilds_unreadable_file(tmp_path):
+    path = tmp_path / "words.idx"
+    # e.g., an index saved as JSON by a previous version
+    path.write_text('{"version": 1}')
+    index = WordIndex.load(WORDS, str(path))
+    assert index.get(item_len=3) == ["cat", "dog", "sky"]
+    assert WordIndex.load(WORDS, str(path)).get(item_len=5) == [
+        "house",
+        "apple",
+    ]
+
+
+def test_get_word_index_is_memoized(tmp_path):
+    index = get_word_index("test", WORDS, path_root=str(tmp_path))
+    assert get_word_index("test", WORDS, path_root=str(tmp_path)) is index
+    assert (
+        get_word_index("test", list(WORDS), path_root=str(tmp_path)) is index
+    )
+
+
+def test_basic_word_sampler_uses_index():
+    sampler = BasicWordSampler(
+        m_A=2, m_B=3, item_len=5, random_state=random.Random(7)
+    )
+    assert sampler.possible_options == filter_words(ENGLISH_WORDS, 5)
+    sampler_without_index = BasicWordSampler(
+        m_A=2,
+        m_B=3,
+        words=list(ENGLISH_WORDS),
+        item_len=5,
+        random_state=random.Random(7),
+    )
+    assert [sampler() for _ in range(5)] == [
+        sampler_without_index() for _ in range(5)
+    ]
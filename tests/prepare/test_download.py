@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+
+from setlexsem.prepare.download import (
+    get_unigram_paths,
+    make_term_frequencies_file,
+    read_frequency_table,
+)
+from setlexsem.prepare.percentiles import get_counts_dict_from_google_books
+
+UNIGRAMS = {
+    "a": [
+        "apple\t2007\t50\t10",
+        "apple\t2008\t30\t12",
+        "apple\t2009\t20\t5",
+        "ant\t2008\t4\t1",
+        "Apple\t2008\t7\t2",
+    ],
+    "b": [
+        "bird\t2008\t9\t3",
+        "bird\t2008\t1\t1",
+        "bee_NOUN\t2008\t5\t2",
+        "malformed line",
+    ],
+}
+
+
+@pytest.fixture
+def ngrams_dir(tmp_path):
+    """Local copy of the corpus layout, in place of the remote host"""
+    for path in get_unigram_paths(str(tmp_path), letters="ab"):
+        letter = path[-4]
+        with gzip.open(path, "wt") as f:
+            f.write("\n".join(UNIGRAMS[letter]) + "\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_make_term_frequencies_file(ngrams_dir, tmp_path, n_jobs):
+    output_path = str(tmp_path / "frequencies.tsv")
+    counts = make_term_frequencies_file(
+        output_path=output_path,
+        source=str(ngrams_dir),
+        letters="ab",
+        n_jobs=n_jobs,
+    )
+    expected = {"apple": 30, "ant": 4, "Apple": 7, "bird": 10, "bee_NOUN": 5}
+    assert counts == expected
+    assert read_frequency_table(output_path) == expected
+    with open(output_path) as f:
+        assert f.readline() == "Apple\t7\n"
+
+    # the percentiles read the table like the filtered n-grams
+    words = {"apple", "bird", "bee"}
+    assert get_counts_dict_from_google_books(words, output_path) == {
+        "apple": 30,
+        "bird": 10,
+    }
+
+
+def test_make_term_frequencies_file_filters(ngrams_dir, tmp_path):
+    counts = make_term_frequencies_file(
+        output_path=str(tmp_path / "frequencies.tsv"),
+        source=str(ngrams_dir),
+        letters="ab",
+        words={"apple", "ant"},
+        start_year=2007,
+        end_year=2009,
+        min_book_count=5,
+        n_jobs=1,
+    )
+    assert counts == {"apple": 100}
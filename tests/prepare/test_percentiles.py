@@ -0,0 +1,68 @@
+import random
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from setlexsem.prepare.download import write_frequency_table
+from setlexsem.prepare.percentiles import (
+    get_counts_dict_from_google_books,
+    get_counts_from_google_books,
+    make_percentile_partitions,
+    make_percentiles,
+    normalize_counts,
+)
+
+
+def make_percentiles_by_dict(words_to_counts, k):
+    """Reference: the word-by-word implementation"""
+    words_to_counts = dict(words_to_counts)
+    normalize_counts(words_to_counts)
+    bins = np.arange(0, 1, k / 100)
+    assignments = np.digitize(list(words_to_counts.values()), bins).tolist()
+    partition = defaultdict(list)
+    for word, assignment in zip(words_to_counts, assignments):
+        partition[assignment].append(word)
+    return partition
+
+
+@pytest.fixture
+def words_to_counts():
+    rng = random.Random(0)
+    return {f"word{i}": int(10 ** rng.uniform(0, 7)) + 1 for i in range(2000)}
+
+
+def test_make_percentiles_matches_dict(words_to_counts):
+    for k in (1, 5, 10, 20):
+        expected = make_percentiles_by_dict(words_to_counts, k)
+        actual = make_percentiles(words_to_counts, k)
+        assert actual == expected
+        # same order of the bins, as written to the JSON files
+        assert list(actual) == list(expected)
+
+
+def test_make_percentile_partitions_several_k(words_to_counts):
+    partitions = make_percentile_partitions(
+        list(words_to_counts), list(words_to_counts.values()), [10, 20]
+    )
+    assert partitions[10] == make_percentiles(words_to_counts, 10)
+    assert len(partitions[20]) <= 5
+    assert sorted(sum(partitions[20].values(), [])) == sorted(words_to_counts)
+
+
+def test_make_percentiles_remove_outliers(words_to_counts):
+    partition = make_percentiles(words_to_counts, 10, remove_outliers=True)
+    most_frequent = sorted(words_to_counts, key=words_to_counts.get)[-50:]
+    words = sum(partition.values(), [])
+    assert len(words) == len(words_to_counts) - 50
+    assert not set(most_frequent) & set(words)
+
+
+def test_get_counts_from_google_books(words_to_counts, tmp_path):
+    path = str(tmp_path / "frequencies.tsv")
+    write_frequency_table(words_to_counts, path)
+    words = set(list(words_to_counts)[::3])
+    expected = get_counts_dict_from_google_books(words, path)
+    words_array, counts = get_counts_from_google_books(words, path)
+    assert dict(zip(words_array.tolist(), counts.tolist())) == expected
+    assert words_array.tolist() == list(expected)
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from setlexsem.generate import vocabulary
+from setlexsem.generate.vocabulary import (
+    get_hyponym_sets,
+    get_vocabulary_artifact,
+)
+from setlexsem.prepare.vocabulary_artifact import (
+    VocabularyArtifact,
+    compile_vocabulary_artifact,
+)
+
+WORDS = ["apple", "bird", "cat", "dog", "héllo", "sky", "tree"]
+DECILES = {"1": ["cat", "dog"], "2": ["tree"], "3": []}
+HYPONYMS = [["cat", "dog", "bird"], ["apple", "tree"]]
+
+
+def test_vocabulary_artifact_round_trip(tmp_path):
+    path = str(tmp_path / "vocabulary.bin")
+    compile_vocabulary_artifact(
+        path, WORDS, deciles=DECILES, hyponyms=HYPONYMS
+    )
+    artifact = VocabularyArtifact(path)
+    assert artifact.get_english_words() == WORDS
+    assert artifact.get_deciles() == DECILES
+    assert artifact.get_hyponyms() == HYPONYMS
+    # each word is stored once
+    assert len(artifact.strings) == len(WORDS)
+    assert all(
+        isinstance(array, np.memmap) for array in artifact.arrays.values()
+    )
+
+
+def test_vocabulary_artifact_without_groups(tmp_path):
+    path = str(tmp_path / "vocabulary.bin")
+    compile_vocabulary_artifact(path, WORDS)
+    artifact = VocabularyArtifact(path)
+    assert artifact.get_english_words() == WORDS
+    assert artifact.get_deciles() is None
+    assert artifact.get_hyponyms() is None
+
+
+def test_vocabulary_artifact_rejects_other_files(tmp_path):
+    path = tmp_path / "vocabulary.bin"
+    path.write_bytes(b"not an artifact")
+    with pytest.raises(ValueError, match="Not a vocabulary artifact"):
+        VocabularyArtifact(str(path))
+    # the samplers fall back to NLTK and the JSON files
+    assert get_vocabulary_artifact(str(path)) is None
+    assert get_vocabulary_artifact(str(tmp_path / "missing.bin")) is None
+
+
+def test_vocabulary_artifact_sources(tmp_path):
+    path_hyponyms = tmp_path / "hyponyms.json"
+    path_hyponyms.write_text(json.dumps(HYPONYMS))
+    path = str(tmp_path / "vocabulary.bin")
+    compile_vocabulary_artifact(
+        path, WORDS, hyponyms=HYPONYMS, sources={"hyponyms": path_hyponyms}
+    )
+    artifact = VocabularyArtifact(path)
+    assert artifact.is_source_fresh("hyponyms", str(path_hyponyms))
+    # not recorded, or missing
+    assert not artifact.is_source_fresh("deciles", str(path_hyponyms))
+    assert artifact.is_source_fresh("hyponyms", str(tmp_path / "missing"))
+
+    # touched, but the same content
+    os.utime(path_hyponyms, ns=(0, 0))
+    assert artifact.is_source_fresh("hyponyms", str(path_hyponyms))
+    # rebuilt
+    path_hyponyms.write_text(json.dumps(HYPONYMS[:1]))
+    assert not artifact.is_source_fresh("hyponyms", str(path_hyponyms))
+
+
+def test_stale_artifact_falls_back_to_json(tmp_path, monkeypatch, caplog):
+    path_hyponyms = tmp_path / "hyponyms.json"
+    path_hyponyms.write_text(json.dumps(HYPONYMS))
+    path = str(tmp_path / "vocabulary.bin")
+    compile_vocabulary_artifact(
+        path, WORDS, hyponyms=HYPONYMS, sources={"hyponyms": path_hyponyms}
+    )
+    artifact = VocabularyArtifact(path)
+    monkeypatch.setattr(vocabulary, "PATH_HYPONYMS", str(path_hyponyms))
+    monkeypatch.setattr(
+        vocabulary, "get_vocabulary_artifact", lambda: artifact
+    )
+    assert get_hyponym_sets(str(path_hyponyms)) == (
+        ("cat", "dog", "bird"),
+        ("apple", "tree"),
+    )
+
+    path_hyponyms.write_text(json.dumps([["sea", "sky"]]))
+    with caplog.at_level(logging.WARNING):
+        assert get_hyponym_sets(str(path_hyponyms)) == (("sea", "sky"),)
+    assert "changed since" in caplog.text
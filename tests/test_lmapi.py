@@ -1,4 +1,16 @@
-from setlexsem.experiment.lmapi import parse_lm_response
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from setlexsem.experiment.lmapi import (
+    PRICING_PER_TOKEN,
+    SUPPORTED_MODELS,
+    BedrockClientPool,
+    EnvCredentialProvider,
+    LMClass,
+    ResponseCache,
+    StaticCredentialProvider,
+    parse_lm_response,
+)
 
 
 def test_parse_lm_response():
@@ -34,6 +46,147 @@ def test_parse_lm_response():
     assert result_obj == {"F-I-C.-S", 1, 5, "he_llo"}
 
 
+def test_env_credential_provider(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "key")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "secret")
+    monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+    assert EnvCredentialProvider()() == {
+        "AccessKeyId": "key",
+        "SecretAccessKey": "secret",
+        "SessionToken": None,
+    }
+
+
+@patch("setlexsem.experiment.lmapi.boto3.client")
+def test_bedrock_client_pool_reuses_client(mock_client):
+    provider = StaticCredentialProvider("key", "secret")
+    lm = LMClass(
+        "anthropic.claude-3-haiku-20240307-v1:0",
+        credential_provider=provider,
+    )
+    client = lm.bedrock_clients.get_client()
+    assert lm.bedrock_clients.get_client() is client
+    assert mock_client.call_count == 1
+    assert mock_client.call_args.kwargs["aws_access_key_id"] == "key"
+
+
+@patch("setlexsem.experiment.lmapi.boto3.client")
+def test_bedrock_client_pool_refreshes_expiring_credentials(mock_client):
+    mock_client.side_effect = lambda **kwargs: object()
+    soon = datetime.now(timezone.utc) + timedelta(seconds=60)
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    pool = BedrockClientPool(
+        StaticCredentialProvider(
+            "key", "secret", expiration=soon.isoformat()
+        ),
+        refresh_margin_secs=300,
+    )
+    client = pool.get_client()
+    assert pool.get_client() is not client
+    assert mock_client.call_count == 2
+
+    pool = BedrockClientPool(
+        StaticCredentialProvider("key", "secret", expiration=later),
+        refresh_margin_secs=300,
+    )
+    client = pool.get_client()
+    assert pool.get_client() is client
+
+
+def test_response_cache_hits_and_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    key_params = dict(
+        model_id="anthropic.claude-3-haiku-20240307-v1:0",
+        temperature=0,
+        top_k=1,
+        top_p=1,
+    )
+    key = ResponseCache.make_key(prompt="prompt", **key_params)
+    assert key != ResponseCache.make_key(prompt="other prompt", **key_params)
+    assert cache.get(key) is None
+    cache.put(key, "<answer>{1}</answer>")
+    assert cache.get(key) == "<answer>{1}</answer>"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    cache.close()
+
+    # the responses persist on disk
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get(key) == "<answer>{1}</answer>"
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.get("a")
+    cache.put("c", "12345")
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    assert cache.get("c") == "12345"
+
+
+def test_response_cache_keeps_total_size(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_size_bytes=10)
+    other = ResponseCache(path, max_size_bytes=10)
+    cache.put("a", "123")
+    cache.put("a", "1234")
+    assert cache.get_total_size() == 4
+    # the writes of another connection to the same cache count
+    other.put("b", "12345")
+    assert cache.get_total_size() == 9
+    cache.put("c", "12")
+    assert len(cache) == 2
+    assert cache.get_total_size() == 7
+    cache.close()
+    other.close()
+
+    # the total is not recomputed when the cache is opened again
+    cache = ResponseCache(path, max_size_bytes=10)
+    assert cache.get_total_size() == 7
+
+
+@patch("setlexsem.experiment.lmapi.boto3.client")
+def test_lm_class_uses_response_cache(mock_client, tmp_path):
+    lm = LMClass(
+        "anthropic.claude-3-haiku-20240307-v1:0",
+        credential_provider=StaticCredentialProvider("key", "secret"),
+        cache=ResponseCache(str(tmp_path / "cache.sqlite")),
+    )
+    with patch.object(LMClass, "call_lm", return_value="set()") as call_lm:
+        assert lm("prompt") == "set()"
+        assert lm("prompt") == "set()"
+    assert call_lm.call_count == 1
+    assert lm.cache.stats()["hits"] == 1
+
+
+@patch("setlexsem.experiment.lmapi.boto3.client")
+def test_lm_class_shares_the_model_rate(mock_client):
+    lm = LMClass(
+        "anthropic.claude-3-haiku-20240307-v1:0",
+        credential_provider=StaticCredentialProvider("key", "secret"),
+    )
+    assert lm.rate_limiter.bucket.rate == 10
+    # one of four processes that call the same model
+    lm = LMClass(
+        "anthropic.claude-3-haiku-20240307-v1:0",
+        credential_provider=StaticCredentialProvider("key", "secret"),
+        rate_share=1 / 4,
+    )
+    assert lm.rate_limiter.bucket.rate == 2.5
+    assert lm.rate_limiter.concurrency.max_concurrency == 16
+
+
+def test_model_configs_match_supported_models():
+    # a misspelled model would run without its rate limit
+    for model_name, model_config in PRICING_PER_TOKEN.items():
+        assert model_name in SUPPORTED_MODELS
+        assert model_config["rate_limit"]["requests_per_second"] > 0
+
+
 if __name__ == "__main__":
     test_parse_lm_response()
     print("All tests passed for lm parser!")
@@ -2,6 +2,15 @@ import random
 
 import pytest
 
+from setlexsem.generate.prompt import (
+    PROMPT_TEMPLATES_ENDING,
+    PromptConfig,
+    PromptTemplate,
+    get_prompt,
+    get_prompts,
+    make_k_shot,
+    make_shot,
+)
 from setlexsem.generate.sample import BasicNumberSampler, BasicWordSampler
 
 
@@ -82,3 +91,119 @@ def test_smoke_sample_words(m_A, m_B, item_len, random_state):
         assert (
             len(b) == item_len
         ), f"member {b} in B is not of length {item_len}"
+
+
+def make_prompt_config(sampler, is_fixed_shots=True, k_shot=3):
+    return PromptConfig(
+        k_shot=k_shot,
+        type="formal_language",
+        approach="baseline",
+        sampler=sampler,
+        operation="union",
+        is_fixed_shots=is_fixed_shots,
+    )
+
+
+def test_fixed_k_shot_is_cached(n, m_A, m_B, random_state):
+    sampler = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random_state
+    )
+    prompt_config = make_prompt_config(sampler)
+    block = make_k_shot(prompt_config)
+    assert make_k_shot(prompt_config) is block
+    assert block.count("- If set A is") == 3
+
+    # the examples are sampled with the seed 13121
+    reference = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random.Random(13121)
+    )
+    for _ in range(3):
+        assert make_shot("union", *reference()) in block
+
+
+def test_fixed_k_shot_does_not_reset_sampler(n, m_A, m_B):
+    # the k-shot sampler is the sampler of the prompts
+    sampler = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random.Random(5)
+    )
+    reference = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random.Random(5)
+    )
+    prompt_config = make_prompt_config(sampler.create_sampler_for_k_shot())
+    for _ in range(3):
+        A, B = sampler()
+        assert (A, B) == reference()
+        get_prompt(A, B, prompt_config)
+
+
+def test_dynamic_k_shot(n, m_A, m_B, random_state):
+    sampler = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random_state
+    )
+    prompt_config = make_prompt_config(sampler, is_fixed_shots=False)
+    assert make_k_shot(prompt_config) != make_k_shot(prompt_config)
+    assert make_k_shot(make_prompt_config(sampler, k_shot=0)) == ""
+
+
+def test_prompt_template(n, m_A, m_B, random_state):
+    sampler = BasicNumberSampler(
+        n=n, m_A=m_A, m_B=m_B, random_state=random_state
+    )
+    prompt_config = make_prompt_config(sampler)
+    pairs = [sampler() for _ in range(5)]
+    A, B = pairs[0]
+
+    prompt = get_prompt(A, B, prompt_config, add_roles=True)
+    assert prompt.startswith(
+        "\n\nHuman: You are given two sets. "
+        f"Set A is ({', '.join(map(str, A))}). "
+        f"Set B is ({', '.join(map(str, B))})."
+    )
+    assert make_k_shot(prompt_config) in prompt
+    assert prompt.endswith(
+        f"\n\nAssistant: {PROMPT_TEMPLATES_ENDING['baseline']}"
+    )
+
+    template = PromptTemplate(
+        "formal_language", "baseline", "union", make_k_shot(prompt_config)
+    )
+    assert template.render_batch(pairs) == [
+        template.render(A, B) for A, B in pairs
+    ]
+    assert get_prompts(pairs, prompt_config) == [
+        get_prompt(A, B, prompt_config) for A, B in pairs
+    ]
+
+    with pytest.raises(AssertionError):
+        PromptTemplate("formal_language", "undefined", "union")
+
+
+def test_get_prompts_dynamic_k_shot(n, m_A, m_B):
+    pairs = [({1, 2}, {2, 3}), ({4}, {5, 6})]
+    prompts = [
+        get_prompts(
+            pairs,
+            make_prompt_config(
+                BasicNumberSampler(
+                    n=n, m_A=m_A, m_B=m_B, random_state=random.Random(3)
+                ),
+                is_fixed_shots=False,
+            ),
+        ),
+        [
+            get_prompt(A, B, prompt_config)
+            for prompt_config in [
+                make_prompt_config(
+                    BasicNumberSampler(
+                        n=n, m_A=m_A, m_B=m_B, random_state=random.Random(3)
+                    ),
+                    is_fixed_shots=False,
+                )
+            ]
+            for A, B in pairs
+        ],
+    ]
+    assert prompts[0] == prompts[1]
+    assert prompts[0][0].split("<examples>")[1] != (
+        prompts[0][1].split("<examples>")[1]
+    )
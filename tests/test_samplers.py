@@ -1,3 +1,4 @@
+import json
 import random
 import string
 import types
@@ -227,6 +228,30 @@ def test_deceptive_word_sampler_random_state():
     assert B1 == B2
 
 
+def test_deceptive_word_sampler_state():
+    """
+    Verify that a restored sampler continues where the original one was.
+    """
+    sampler1 = DeceptiveWordSampler(
+        m_A=4,
+        m_B=4,
+        random_state=random.Random(17),
+        swap_set_elements=True,
+        random_state_mix_sets=random.Random(18),
+    )
+    sampler1()
+    state = json.loads(json.dumps(sampler1.get_state()))
+    sampler2 = DeceptiveWordSampler(
+        m_A=4,
+        m_B=4,
+        random_state=random.Random(0),
+        swap_set_elements=True,
+        random_state_mix_sets=random.Random(0),
+    )
+    sampler2.set_state(state)
+    assert [sampler1() for _ in range(3)] == [sampler2() for _ in range(3)]
+
+
 def test_basic_word_sampler_user_provided_words():
     """
     Verify that words are sampled from the user-provided words.